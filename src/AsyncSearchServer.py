@@ -0,0 +1,161 @@
+# SPDX-License-Identifier: BSD-3-Clause
+#
+# Copyright (c) 2021 Vít Labuda. All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without modification, are permitted provided that the
+# following conditions are met:
+#  1. Redistributions of source code must retain the above copyright notice, this list of conditions and the following
+#     disclaimer.
+#  2. Redistributions in binary form must reproduce the above copyright notice, this list of conditions and the
+#     following disclaimer in the documentation and/or other materials provided with the distribution.
+#  3. Neither the name of the copyright holder nor the names of its contributors may be used to endorse or promote
+#     products derived from this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES,
+# INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+# SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+# SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY,
+# WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+
+from __future__ import annotations
+from typing import Set, Iterable, Dict, Any, Tuple, Union, Callable
+import time
+import asyncio
+import logging
+import socket
+from Settings import Settings
+from ClientMessageHandler import ClientMessageHandler
+from CoordinatorMessageHandler import CoordinatorMessageHandler
+from SearchWorkerPool import SearchWorkerPool
+from OverloadedResponse import OverloadedResponse
+from ServerStatistics import ServerStatistics
+from CloseConnectionException import CloseConnectionException
+from msgess.msgess import MsgESS
+from msgess.asyncmsgess import AsyncMsgESS
+
+
+# Serves the client connections using an asyncio event loop in a single thread, so idle and slow connections are
+#  cheap; the messages are handled (i.e. the searches are performed) by the search worker pool.
+class AsyncSearchServer:
+    _STOP_TIMEOUT: float = 30.0  # in seconds; for how long the connections are waited for when the server is stopping
+    _STOPPING_RECEIVE_TIMEOUT: float = 0.001  # in seconds; see _handle_client()
+
+    class _ClientConnection:
+        def __init__(self, task: asyncio.Task):
+            self.task: asyncio.Task = task
+            self.is_waiting_for_message: bool = False
+            self.stop_requested: bool = False
+
+    def __init__(self, logger: logging.Logger, client_message_handler: Union[ClientMessageHandler, CoordinatorMessageHandler], search_worker_pool: SearchWorkerPool, server_statistics: ServerStatistics, server_socket: socket.socket):
+        self._logger: logging.Logger = logger
+        self._client_message_handler: Union[ClientMessageHandler, CoordinatorMessageHandler] = client_message_handler
+        self._search_worker_pool: SearchWorkerPool = search_worker_pool
+        self._server_statistics: ServerStatistics = server_statistics
+        self._server_socket: socket.socket = server_socket
+
+        self._connections: Set[AsyncSearchServer._ClientConnection] = set()
+
+    # Serves the clients until one of the stop signals is received. The wakeup callback is called by the event loop
+    #  whenever the wakeup file descriptor becomes readable (see SearchServerMain._run_in_main_thread()).
+    def serve(self, stop_signals: Iterable[int], wakeup_fd: int, wakeup_callback: Callable[[], None]) -> None:
+        asyncio.run(self._serve(stop_signals, wakeup_fd, wakeup_callback))
+
+    async def _serve(self, stop_signals: Iterable[int], wakeup_fd: int, wakeup_callback: Callable[[], None]) -> None:
+        loop = asyncio.get_running_loop()
+
+        stop_event = asyncio.Event()
+        for signal_number in stop_signals:
+            loop.add_signal_handler(signal_number, stop_event.set)
+        loop.add_reader(wakeup_fd, wakeup_callback)
+
+        server = await asyncio.start_unix_server(self._handle_client, sock=self._server_socket)
+        try:
+            await stop_event.wait()
+        finally:
+            server.close()
+            loop.remove_reader(wakeup_fd)
+
+        await self._stop_connections()
+
+    async def _stop_connections(self) -> None:
+        # The connections waiting for a message are closed right away; the other ones are closed once they handle their
+        #  current request and the requests pipelined after it.
+        tasks = []
+        for connection in list(self._connections):
+            connection.stop_requested = True
+            if connection.is_waiting_for_message:
+                connection.task.cancel()
+
+            tasks.append(connection.task)
+
+        if not tasks:
+            return
+
+        _, pending_tasks = await asyncio.wait(tasks, timeout=AsyncSearchServer._STOP_TIMEOUT)
+        for task in pending_tasks:
+            task.cancel()
+
+    async def _handle_client(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        connection = AsyncSearchServer._ClientConnection(asyncio.current_task())
+        self._connections.add(connection)
+        self._server_statistics.on_connection_opened()
+
+        client_msgess = AsyncMsgESS(reader, writer)
+        client_msgess.set_compress_messages(False)
+
+        try:
+            # The same as in ClientHandlerThread - the requests are handled in the order they were sent, and the
+            #  connection is closed once the client closes it or stays idle for too long. When the server is stopping,
+            #  the requests which have already been pipelined by the client are still handled, so their responses
+            #  aren't lost.
+            while True:
+                receive_timeout = (AsyncSearchServer._STOPPING_RECEIVE_TIMEOUT if connection.stop_requested else Settings.CLIENT_IDLE_TIMEOUT)
+
+                connection.is_waiting_for_message = True
+                try:
+                    json_, message_class = await asyncio.wait_for(client_msgess.receive_json_object(), receive_timeout)
+                finally:
+                    connection.is_waiting_for_message = False
+
+                arrival_time = client_msgess.get_last_message_arrival_time()
+                self._server_statistics.record_latency(ServerStatistics.PHASE_RECEIVE, time.perf_counter() - arrival_time)
+
+                # The cheap messages (e.g. the stats requests) are handled right in the event loop - this way, they
+                #  are answered even if the server is overloaded.
+                if message_class in self._client_message_handler.IMMEDIATELY_HANDLED_MESSAGE_CLASSES:
+                    response_json_object, response_message_class = self._handle_message(json_, message_class)
+                else:
+                    try:
+                        response_json_object, response_message_class = await asyncio.wrap_future(self._search_worker_pool.submit(self._handle_message, json_, message_class))
+                    except SearchWorkerPool.OverloadedException as e:
+                        self._server_statistics.on_overloaded_response_sent()
+                        overloaded_response = OverloadedResponse(e.queue_delay)
+                        response_json_object, response_message_class = overloaded_response.to_json_object(), overloaded_response.MESSAGE_CLASS
+
+                send_start_time = time.perf_counter()
+                await asyncio.wait_for(client_msgess.send_json_object(response_json_object, response_message_class), Settings.CLIENT_IDLE_TIMEOUT)
+                end_time = time.perf_counter()
+                self._server_statistics.record_latency(ServerStatistics.PHASE_SEND, end_time - send_start_time)
+                self._server_statistics.record_latency(ServerStatistics.PHASE_TOTAL, end_time - arrival_time)
+
+        except (MsgESS.MsgESSException, CloseConnectionException, asyncio.TimeoutError):
+            pass
+
+        finally:
+            self._connections.discard(connection)
+            self._server_statistics.on_connection_closed()
+
+            writer.close()
+
+    # Runs in a search worker thread; the response is converted to a JSON object there as well, since it might be large.
+    def _handle_message(self, json_: Dict[str, Any], message_class: int) -> Tuple[Dict[str, Any], int]:
+        response = self._client_message_handler.handle_message(json_, message_class)
+
+        start_time = time.perf_counter()
+        response_json_object = response.to_json_object()
+        self._server_statistics.record_latency(ServerStatistics.PHASE_ENCODE, time.perf_counter() - start_time)
+
+        return response_json_object, response.MESSAGE_CLASS
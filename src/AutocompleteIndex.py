@@ -0,0 +1,138 @@
+# SPDX-License-Identifier: BSD-3-Clause
+#
+# Copyright (c) 2021 Vít Labuda. All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without modification, are permitted provided that the
+# following conditions are met:
+#  1. Redistributions of source code must retain the above copyright notice, this list of conditions and the following
+#     disclaimer.
+#  2. Redistributions in binary form must reproduce the above copyright notice, this list of conditions and the
+#     following disclaimer in the documentation and/or other materials provided with the distribution.
+#  3. Neither the name of the copyright holder nor the names of its contributors may be used to endorse or promote
+#     products derived from this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES,
+# INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+# SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+# SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY,
+# WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+
+from typing import List, Dict, Tuple
+import re
+import array
+import bisect
+from Settings import Settings
+from WebIndexItem import WebIndexItem
+
+
+# Completes the prefixes of the documents' titles and headings. Each distinct phrase (a canonicalized title or heading)
+#  is weighted by the sum of the scores its occurrences would get in the searches (see Settings.SCORE_TITLE and
+#  Settings.SCORE_HEADING). The phrases are kept sorted, so the phrases starting with a prefix form a contiguous range
+#  of them; the heaviest completions are precomputed for each prefix whose range is longer than the maximum number of
+#  completions, and the ranges of the other prefixes are short enough to be ordered on the fly. This way, the lookups
+#  take about the same time regardless of the size of the web index.
+class AutocompleteIndex:
+    _WHITESPACE_REGEX: re.Pattern = re.compile(r'\s+')
+
+    def __init__(self, web_index_items: List[WebIndexItem], max_completions: int, max_phrase_length: int):
+        self._max_completions: int = max_completions
+        self._max_phrase_length: int = max_phrase_length
+
+        phrase_weights = self._get_phrase_weights(web_index_items)
+        self._phrases: List[str] = sorted(phrase_weights.keys())
+        self._weights: array.array = array.array("d", (phrase_weights[phrase] for phrase in self._phrases))
+
+        # prefix -> the indices of its heaviest completions, ordered by their weight in descending order (and
+        #  alphabetically, if their weights are the same)
+        self._top_completions: Dict[str, array.array] = self._build_top_completions()
+
+    def _get_phrase_weights(self, web_index_items: List[WebIndexItem]) -> Dict[str, float]:
+        phrase_weights = {}
+
+        for web_index_item in web_index_items:
+            self._add_phrase(phrase_weights, web_index_item.title_lc, Settings.SCORE_TITLE)
+            for heading_level, heading_text_lc in web_index_item.get_headings_lc():
+                self._add_phrase(phrase_weights, heading_text_lc, Settings.SCORE_HEADING / heading_level)
+
+        return phrase_weights
+
+    def _add_phrase(self, phrase_weights: Dict[str, float], text_lc: str, weight: float) -> None:
+        # The phrases are canonicalized in the same way as the search queries (see ClientRequest); if the text is
+        #  already canonical, the (possibly deduplicated) original string is kept.
+        phrase = AutocompleteIndex._WHITESPACE_REGEX.sub(' ', text_lc).strip()
+        if phrase == text_lc:
+            phrase = text_lc
+
+        if phrase and len(phrase) <= self._max_phrase_length:
+            phrase_weights[phrase] = phrase_weights.get(phrase, 0.0) + weight
+
+    def _build_top_completions(self) -> Dict[str, array.array]:
+        phrases, max_completions = self._phrases, self._max_completions
+        top_completions = {}
+
+        # A prefix has more completions than the maximum if a phrase and the phrase max_completions positions after it
+        #  both start with it. The shorter prefixes of a stored prefix are always stored too, so the search can stop
+        #  at the first prefix which has been stored already.
+        for phrase_index in range(len(phrases) - max_completions):
+            phrase = phrases[phrase_index]
+            for prefix_length in range(self._get_common_prefix_length(phrase, phrases[phrase_index + max_completions]), 0, -1):
+                prefix = phrase[:prefix_length]
+                if prefix in top_completions:
+                    break
+                top_completions[prefix] = array.array("I")
+
+        # The phrases are visited from the heaviest one (the stable sort keeps the phrases with the same weight in the
+        #  alphabetical order), so each prefix gets its heaviest completions; the rest of the phrases can be skipped
+        #  once all the prefixes have got them.
+        unfilled_prefix_count = len(top_completions)
+        for phrase_index in sorted(range(len(phrases)), key=self._weights.__getitem__, reverse=True):
+            if unfilled_prefix_count == 0:
+                break
+
+            phrase = phrases[phrase_index]
+            for prefix_length in range(1, len(phrase) + 1):
+                completions = top_completions.get(phrase[:prefix_length])
+                if completions is None:
+                    break
+                if len(completions) < max_completions:
+                    completions.append(phrase_index)
+                    if len(completions) == max_completions:
+                        unfilled_prefix_count -= 1
+
+        return top_completions
+
+    def _get_common_prefix_length(self, first_phrase: str, second_phrase: str) -> int:
+        common_prefix_length = 0
+        for first_character, second_character in zip(first_phrase, second_phrase):
+            if first_character != second_character:
+                break
+            common_prefix_length += 1
+
+        return common_prefix_length
+
+    # Returns the (phrase, weight) pairs of the heaviest (at most max_completions, which mustn't be higher than the
+    #  index's maximum) phrases starting with the canonicalized prefix (see AutocompleteRequest).
+    def get_completions(self, canonical_prefix: str, max_completions: int) -> List[Tuple[str, float]]:
+        if not canonical_prefix:
+            return []  # If the prefix is empty, don't return any completions
+
+        completions = self._top_completions.get(canonical_prefix)
+        if completions is None:
+            # There are at most max_completions phrases starting with the prefix.
+            start = bisect.bisect_left(self._phrases, canonical_prefix)
+            end = start
+            while (end < len(self._phrases)) and self._phrases[end].startswith(canonical_prefix):
+                end += 1
+
+            completions = sorted(range(start, end), key=self._weights.__getitem__, reverse=True)
+
+        return [(self._phrases[phrase_index], self._weights[phrase_index]) for phrase_index in completions[:max_completions]]
+
+    def get_counters(self) -> Dict[str, int]:
+        return {
+            "phrases": len(self._phrases),
+            "precomputed_prefixes": len(self._top_completions)
+        }
@@ -0,0 +1,66 @@
+# SPDX-License-Identifier: BSD-3-Clause
+#
+# Copyright (c) 2021 Vít Labuda. All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without modification, are permitted provided that the
+# following conditions are met:
+#  1. Redistributions of source code must retain the above copyright notice, this list of conditions and the following
+#     disclaimer.
+#  2. Redistributions in binary form must reproduce the above copyright notice, this list of conditions and the
+#     following disclaimer in the documentation and/or other materials provided with the distribution.
+#  3. Neither the name of the copyright holder nor the names of its contributors may be used to endorse or promote
+#     products derived from this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES,
+# INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+# SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+# SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY,
+# WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+
+from typing import Dict, Any
+import re
+from Settings import Settings
+from CloseConnectionException import CloseConnectionException
+
+
+class AutocompleteRequest:
+    MESSAGE_CLASS: int = 10
+
+    def __init__(self, request_object: Dict[str, Any]):
+        if ("prefix" not in request_object) or not isinstance(request_object["prefix"], str):
+            raise CloseConnectionException("There is no prefix string in the autocomplete request!")
+
+        if ("max_completions" not in request_object) or isinstance(request_object["max_completions"], bool) or not isinstance(request_object["max_completions"], int):
+            raise CloseConnectionException("There is no max completions integer in the autocomplete request!")
+
+        if request_object["max_completions"] <= 0:
+            raise CloseConnectionException("The max completions integer isn't a positive number!")
+
+        if not self._is_autocomplete_enabled():
+            raise CloseConnectionException("The autocomplete is disabled on this server!")
+
+        self.prefix: str = request_object["prefix"]
+        self.canonical_prefix: str = self._canonicalize_prefix(request_object["prefix"])
+
+        # The completions are precomputed only up to the configured maximum (see AutocompleteIndex).
+        self.max_completions: int = min(request_object["max_completions"], Settings.AUTOCOMPLETE_MAX_COMPLETIONS)
+
+    # The coordinator doesn't have an autocomplete index of its own - it forwards the requests to its backends (see
+    #  CoordinatorMessageHandler), so it has its own setting.
+    def _is_autocomplete_enabled(self) -> bool:
+        if len(Settings.COORDINATOR_BACKEND_SOCKET_PATHS) > 0:
+            return Settings.COORDINATOR_AUTOCOMPLETE_BACKEND_COMPLETIONS > 0
+
+        return Settings.USE_AUTOCOMPLETE_INDEX
+
+    # The prefix is canonicalized in the same way as the search queries (see ClientRequest), except that a trailing
+    #  whitespace is kept (as a single space), because the user might be just starting to type the next word.
+    def _canonicalize_prefix(self, prefix: str) -> str:
+        prefix = prefix.lower()
+        prefix = re.sub(r'\s+', ' ', prefix)
+        prefix = prefix.lstrip()
+
+        return prefix
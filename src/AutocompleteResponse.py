@@ -0,0 +1,43 @@
+# SPDX-License-Identifier: BSD-3-Clause
+#
+# Copyright (c) 2021 Vít Labuda. All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without modification, are permitted provided that the
+# following conditions are met:
+#  1. Redistributions of source code must retain the above copyright notice, this list of conditions and the following
+#     disclaimer.
+#  2. Redistributions in binary form must reproduce the above copyright notice, this list of conditions and the
+#     following disclaimer in the documentation and/or other materials provided with the distribution.
+#  3. Neither the name of the copyright holder nor the names of its contributors may be used to endorse or promote
+#     products derived from this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES,
+# INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+# SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+# SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY,
+# WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+
+from typing import Dict, Any, List, Tuple
+
+
+class AutocompleteResponse:
+    MESSAGE_CLASS: int = 11
+
+    # The completions are (phrase, weight) pairs, ordered from the heaviest one. The max completions number is the
+    #  number of completions the server has actually looked for, i.e. the requested one limited by the server's
+    #  Settings.AUTOCOMPLETE_MAX_COMPLETIONS, so the clients can tell whether their request has been capped.
+    #  The completions come from the autocomplete index built when the web index was (re)loaded, which is not affected
+    #  by the delta file updates - the documents removed or replaced by them still contribute to the completions (and
+    #  the added ones don't) until the web index is reloaded (see Settings.WEB_INDEX_DELTA_FILE_PATH).
+    def __init__(self, completions: List[Tuple[str, float]], max_completions: int):
+        self._completions: List[Tuple[str, float]] = completions
+        self._max_completions: int = max_completions
+
+    def to_json_object(self) -> Dict[str, Any]:
+        return {
+            "completions": [{"text": text, "weight": weight} for text, weight in self._completions],
+            "max_completions": self._max_completions
+        }
@@ -0,0 +1,48 @@
+# SPDX-License-Identifier: BSD-3-Clause
+#
+# Copyright (c) 2021 Vít Labuda. All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without modification, are permitted provided that the
+# following conditions are met:
+#  1. Redistributions of source code must retain the above copyright notice, this list of conditions and the following
+#     disclaimer.
+#  2. Redistributions in binary form must reproduce the above copyright notice, this list of conditions and the
+#     following disclaimer in the documentation and/or other materials provided with the distribution.
+#  3. Neither the name of the copyright holder nor the names of its contributors may be used to endorse or promote
+#     products derived from this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES,
+# INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+# SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+# SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY,
+# WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+
+from typing import Dict, Any, List
+from Settings import Settings
+from ClientRequest import ClientRequest
+from CloseConnectionException import CloseConnectionException
+
+
+# Contains multiple search requests, each of which has the same format as the ClientRequest message; the searches are
+#  performed at once, and their results are returned in a single BatchResponse message.
+class BatchRequest:
+    MESSAGE_CLASS: int = 6
+
+    def __init__(self, request_object: Dict[str, Any]):
+        if ("searches" not in request_object) or not isinstance(request_object["searches"], list):
+            raise CloseConnectionException("There is no searches list in the batch request!")
+
+        if len(request_object["searches"]) == 0:
+            raise CloseConnectionException("The searches list in the batch request is empty!")
+
+        if len(request_object["searches"]) > Settings.MAX_BATCH_REQUEST_SEARCHES:
+            raise CloseConnectionException("There are too many searches in the batch request! ({})".format(len(request_object["searches"])))
+
+        for search_object in request_object["searches"]:
+            if not isinstance(search_object, dict):
+                raise CloseConnectionException("A search in the batch request isn't an object!")
+
+        self.requests: List[ClientRequest] = [ClientRequest(search_object) for search_object in request_object["searches"]]
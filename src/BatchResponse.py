@@ -0,0 +1,41 @@
+# SPDX-License-Identifier: BSD-3-Clause
+#
+# Copyright (c) 2021 Vít Labuda. All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without modification, are permitted provided that the
+# following conditions are met:
+#  1. Redistributions of source code must retain the above copyright notice, this list of conditions and the following
+#     disclaimer.
+#  2. Redistributions in binary form must reproduce the above copyright notice, this list of conditions and the
+#     following disclaimer in the documentation and/or other materials provided with the distribution.
+#  3. Neither the name of the copyright holder nor the names of its contributors may be used to endorse or promote
+#     products derived from this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES,
+# INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+# SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+# SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY,
+# WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+
+from typing import List, Dict, Any
+from SearchResult import SearchResult
+
+
+class BatchResponse:
+    MESSAGE_CLASS: int = 7
+
+    # The search results and the scanned fractions (see ClientResponse) are in the same order as the searches in the
+    #  batch request.
+    def __init__(self, search_results_of_searches: List[List[SearchResult]], scanned_fractions: List[float]):
+        self._search_results_of_searches: List[List[SearchResult]] = search_results_of_searches
+        self._scanned_fractions: List[float] = scanned_fractions
+
+    def to_json_object(self) -> Dict[str, Any]:
+        return {
+            "search_results": [[search_result.to_response_object() for search_result in search_results] for search_results in self._search_results_of_searches],
+            "is_partial": [(scanned_fraction < 1.0) for scanned_fraction in self._scanned_fractions],
+            "scanned_fractions": self._scanned_fractions
+        }
@@ -0,0 +1,189 @@
+# SPDX-License-Identifier: BSD-3-Clause
+#
+# Copyright (c) 2021 Vít Labuda. All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without modification, are permitted provided that the
+# following conditions are met:
+#  1. Redistributions of source code must retain the above copyright notice, this list of conditions and the following
+#     disclaimer.
+#  2. Redistributions in binary form must reproduce the above copyright notice, this list of conditions and the
+#     following disclaimer in the documentation and/or other materials provided with the distribution.
+#  3. Neither the name of the copyright holder nor the names of its contributors may be used to endorse or promote
+#     products derived from this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES,
+# INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+# SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+# SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY,
+# WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+
+from __future__ import annotations
+from typing import List, Dict, Tuple, Optional, Sequence
+import copy
+import time
+import heapq
+from Settings import Settings
+from WebIndex import WebIndex
+from ClientRequest import ClientRequest
+from SearchResult import SearchResult
+from SearchPerformer import SearchPerformer
+
+
+# Performs multiple searches at once. The duplicate searches are performed only once, and the searches with the same
+#  scoring algorithm are performed in a single pass over the union of their candidate documents - each document is
+#  visited only once, no matter how many of the searches it is a candidate for.
+class BatchSearchPerformer:
+    class _Search:
+        def __init__(self, request: ClientRequest, candidate_document_ids: Sequence[int], bound_factor: float):
+            self.request: ClientRequest = request
+            self.candidate_document_ids: Sequence[int] = candidate_document_ids
+            self.candidate_document_id_set = (candidate_document_ids if isinstance(candidate_document_ids, range) else frozenset(candidate_document_ids))
+            self.bound_factor: float = bound_factor
+
+            # See SearchPerformer._rank_top_documents().
+            self.heap: List[Tuple[float, int]] = []
+            self.threshold: float = Settings.MINIMAL_SCORE
+
+            # See SearchPerformer.get_scanned_fraction().
+            self.scanned_fraction: float = 1.0
+
+    def __init__(self, web_index: WebIndex, requests: List[ClientRequest], shard: Optional[Tuple[int, int]] = None):
+        self._web_index: WebIndex = web_index
+        self._requests: List[ClientRequest] = requests
+        self._shard: Optional[Tuple[int, int]] = shard
+
+        self._scanned_fractions: List[float] = [1.0] * len(requests)
+
+    # Returns the same rankings as SearchPerformer.rank_documents() would return for each of the requests (including
+    #  when their deadlines pass).
+    def rank_documents(self) -> List[List[Tuple[int, float]]]:
+        # The duplicate searches are merged into one, which returns the largest number of results requested by them, and
+        #  which is stopped only once the latest of their deadlines passes.
+        unique_requests: Dict[Tuple[str, bool, Optional[str]], ClientRequest] = {}
+        for request in self._requests:
+            if not request.canonical_search_query:
+                continue  # If the search query is empty, don't return any results
+
+            key = self._get_request_key(request)
+            if key not in unique_requests:
+                unique_requests[key] = copy.copy(request)
+            unique_requests[key].max_results = max(unique_requests[key].max_results, request.max_results)
+            if (unique_requests[key].deadline is not None) and ((request.deadline is None) or (request.deadline > unique_requests[key].deadline)):
+                unique_requests[key].deadline = request.deadline
+
+        rankings: Dict[Tuple[str, bool, Optional[str]], List[Tuple[int, float]]] = {}
+        scanned_fractions: Dict[Tuple[str, bool, Optional[str]], float] = {}
+
+        # The term-based searches only iterate over the posting lists of their terms, so there is nothing to share.
+        for key, request in unique_requests.items():
+            if request.term_mode is not None:
+                search_performer = SearchPerformer(self._web_index, request, self._shard)
+                rankings[key] = search_performer.rank_documents()
+                scanned_fractions[key] = search_performer.get_scanned_fraction()
+
+        for use_quotient_based_scoring in (False, True):
+            searches = [self._create_search(request) for request in unique_requests.values() if request.use_quotient_based_scoring == use_quotient_based_scoring and request.term_mode is None]
+            if not searches:
+                continue
+
+            if self._web_index.columnar_scoring_engine is not None:
+                # The columnar scoring engine scores all the candidates of a search at once, so there is nothing to share.
+                for search in searches:
+                    rankings[self._get_request_key(search.request)] = self._web_index.columnar_scoring_engine.rank_documents(search.candidate_document_ids, search.request.canonical_search_query, use_quotient_based_scoring, search.request.max_results)
+            else:
+                self._rank_documents_in_one_pass(searches, use_quotient_based_scoring)
+                for search in searches:
+                    rankings[self._get_request_key(search.request)] = self._get_ranked_documents(search)
+                    scanned_fractions[self._get_request_key(search.request)] = search.scanned_fraction
+
+        self._scanned_fractions = [scanned_fractions.get(self._get_request_key(request), 1.0) for request in self._requests]
+
+        return [(rankings[self._get_request_key(request)][:request.max_results] if request.canonical_search_query else []) for request in self._requests]
+
+    # Returns the scanned fraction (see SearchPerformer.get_scanned_fraction()) of each of the requests, in the same
+    #  order as the requests.
+    def get_scanned_fractions(self) -> List[float]:
+        return self._scanned_fractions
+
+    def _get_request_key(self, request: ClientRequest) -> Tuple[str, bool, Optional[str]]:
+        return request.canonical_search_query, request.use_quotient_based_scoring, request.term_mode
+
+    def make_search_results(self, ranked_documents: List[Tuple[int, float]]) -> List[SearchResult]:
+        # SearchPerformer.make_search_results() doesn't depend on the request.
+        return SearchPerformer(self._web_index, self._requests[0]).make_search_results(ranked_documents)
+
+    def _create_search(self, request: ClientRequest) -> BatchSearchPerformer._Search:
+        candidate_document_ids = SearchPerformer(self._web_index, request, self._shard).get_candidate_document_ids()
+        bound_factor = self._web_index.score_upper_bounds.get_bound_factor(request.canonical_search_query)
+
+        return BatchSearchPerformer._Search(request, candidate_document_ids, bound_factor)
+
+    def _rank_documents_in_one_pass(self, searches: List[BatchSearchPerformer._Search], use_quotient_based_scoring: bool) -> None:
+        web_index_items = self._web_index.items
+        bound_numerators = self._web_index.score_upper_bounds.get_bound_numerators(use_quotient_based_scoring)
+        has_deadlines = any((search.request.deadline is not None) for search in searches)
+
+        # The documents are visited in descending order of their score upper bounds, the same as in
+        #  SearchPerformer._rank_top_documents(); once a document's upper bound falls below a search's threshold, the
+        #  search is finished, and once all the searches are finished, the pass ends.
+        active_searches = searches
+        union_of_candidates = self._get_union_of_candidates(searches)
+        for position, document_id in enumerate(self._web_index.score_upper_bounds.sort_by_bounds(union_of_candidates, use_quotient_based_scoring)):
+            bound_numerator = bound_numerators[document_id]
+            if any((bound_numerator * search.bound_factor < search.threshold) for search in active_searches):
+                active_searches = [search for search in active_searches if bound_numerator * search.bound_factor >= search.threshold]
+                if not active_searches:
+                    break
+
+            # The searches whose deadline has passed are stopped, the other ones go on; the scanned fraction of the
+            #  stopped searches is approximated by the scanned part of the union of the candidates.
+            if has_deadlines and (position % SearchPerformer.DEADLINE_CHECK_INTERVAL == 0):
+                current_time = time.monotonic()
+                if any((search.request.deadline is not None and current_time >= search.request.deadline) for search in active_searches):
+                    for search in active_searches:
+                        if search.request.deadline is not None and current_time >= search.request.deadline:
+                            search.scanned_fraction = position / len(union_of_candidates)
+                    active_searches = [search for search in active_searches if search.scanned_fraction == 1.0]
+                    if not active_searches:
+                        break
+
+            web_index_item = web_index_items[document_id]
+
+            for search in active_searches:
+                if document_id not in search.candidate_document_id_set:
+                    continue
+
+                score = SearchPerformer.compute_score(web_index_item, search.request.canonical_search_query, use_quotient_based_scoring)
+                if score < Settings.MINIMAL_SCORE:
+                    continue
+
+                entry = (score, -document_id)
+                if len(search.heap) < search.request.max_results:
+                    heapq.heappush(search.heap, entry)
+                elif entry > search.heap[0]:
+                    heapq.heapreplace(search.heap, entry)
+                else:
+                    continue
+
+                if len(search.heap) == search.request.max_results:
+                    search.threshold = search.heap[0][0]
+
+    def _get_union_of_candidates(self, searches: List[BatchSearchPerformer._Search]) -> Sequence[int]:
+        # If any of the searches has to scan all the documents (of the shard), so does the pass.
+        for search in searches:
+            if isinstance(search.candidate_document_ids, range):
+                return search.candidate_document_ids
+
+        union = set()
+        for search in searches:
+            union.update(search.candidate_document_ids)
+
+        return sorted(union)
+
+    def _get_ranked_documents(self, search: BatchSearchPerformer._Search) -> List[Tuple[int, float]]:
+        search.heap.sort(reverse=True)
+
+        return [(-negated_document_id, score) for score, negated_document_id in search.heap]
@@ -0,0 +1,82 @@
+# SPDX-License-Identifier: BSD-3-Clause
+#
+# Copyright (c) 2021 Vít Labuda. All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without modification, are permitted provided that the
+# following conditions are met:
+#  1. Redistributions of source code must retain the above copyright notice, this list of conditions and the following
+#     disclaimer.
+#  2. Redistributions in binary form must reproduce the above copyright notice, this list of conditions and the
+#     following disclaimer in the documentation and/or other materials provided with the distribution.
+#  3. Neither the name of the copyright holder nor the names of its contributors may be used to endorse or promote
+#     products derived from this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES,
+# INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+# SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+# SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY,
+# WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+
+from typing import Optional, Tuple
+
+
+# The settings of the benchmark suite (see BenchmarkSearchServer.py and GenerateSyntheticWebIndex.py). The server
+#  itself is benchmarked with the settings from the Settings class, except for the paths of its files, which are
+#  located in the benchmark's working directory, and its search result cache and result cursors, which are disabled. All the relative paths are relative to the working directory.
+class BenchmarkSettings:
+    WORKING_DIRECTORY: str = "benchmark_dir/"
+
+    # The web index the server is benchmarked with; if the file doesn't exist, a synthetic web index is generated into
+    #  it using the settings below.
+    WEB_INDEX_FILE_PATH: str = "synthetic_web_index.csv"
+
+    # The JSON results of each run are written into a new file in this directory, so that the runs can be compared.
+    RESULTS_DIRECTORY: str = "results/"
+
+    # --- The synthetic web index ---
+    # The texts consist of words picked from a vocabulary of random words; the words are picked with Zipf-distributed
+    #  probabilities (the N-th most common word is N times less likely to be picked than the most common one), as they
+    #  are in natural language texts.
+    SYNTHETIC_DOCUMENT_COUNT: int = 100000
+    SYNTHETIC_VOCABULARY_SIZE: int = 20000
+    SYNTHETIC_RANDOM_SEED: int = 1
+
+    # The minimum and maximum number of words of each field (the actual numbers are distributed uniformly).
+    SYNTHETIC_URL_PATH_WORDS: Tuple[int, int] = (1, 4)
+    SYNTHETIC_TITLE_WORDS: Tuple[int, int] = (2, 12)
+    SYNTHETIC_HEADING_WORDS: Tuple[int, int] = (1, 8)
+    SYNTHETIC_DESCRIPTION_WORDS: Tuple[int, int] = (0, 40)
+    SYNTHETIC_KEYWORDS_WORDS: Tuple[int, int] = (0, 10)
+    SYNTHETIC_CONTENT_SNIPPET_WORDS: Tuple[int, int] = (10, 60)
+    SYNTHETIC_IMAGE_ALTS_WORDS: Tuple[int, int] = (0, 15)
+    SYNTHETIC_LINK_TEXTS_WORDS: Tuple[int, int] = (0, 60)
+
+    # The average number of headings of the levels h1 to h6 per document (the actual numbers are exponentially
+    #  distributed).
+    SYNTHETIC_HEADINGS_PER_LEVEL: Tuple[float, ...] = (1.0, 3.0, 4.0, 2.0, 0.5, 0.2)
+
+    # The number of distinct authors (and websites) the documents are spread over; an empty author is used with the
+    #  specified probability.
+    SYNTHETIC_AUTHOR_COUNT: int = 500
+    SYNTHETIC_EMPTY_AUTHOR_PROBABILITY: float = 0.5
+
+    # --- The load ---
+    # The queries replayed by the load generator are read from this file (one query per line); if it's None, a query
+    #  mix is generated from the synthetic web index's vocabulary (the same as the one the web index would be generated
+    #  with): single common and rare words and two-word phrases.
+    QUERY_MIX_FILE_PATH: Optional[str] = None
+    GENERATED_QUERY_COUNT: int = 1000
+
+    # Each scoring mode is benchmarked separately; the load generator keeps this number of connections busy (each of
+    #  them sends a request once it receives the response to the previous one) for the specified time. The requests
+    #  sent during the warm-up aren't measured.
+    CONCURRENCY: int = 8
+    WARM_UP_DURATION: float = 3.0  # in seconds
+    MEASUREMENT_DURATION: float = 20.0  # in seconds
+    MAX_RESULTS: int = 10
+
+    # For how long the benchmark waits for the server to load the web index and start responding.
+    SERVER_STARTUP_TIMEOUT: float = 600.0  # in seconds
@@ -20,25 +20,40 @@
 # OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
 
 
-from typing import List
+from typing import Dict, Any, Tuple, Union
+import time
 import socket
+import select
 import threading
-from WebIndexItem import WebIndexItem
-from ClientRequest import ClientRequest
+from Settings import Settings
+from ClientMessageHandler import ClientMessageHandler
+from CoordinatorMessageHandler import CoordinatorMessageHandler
+from SearchWorkerPool import SearchWorkerPool
 from ClientResponse import ClientResponse
-from SearchPerformer import SearchPerformer
+from BatchResponse import BatchResponse
+from ReloadResponse import ReloadResponse
+from OverloadedResponse import OverloadedResponse
+from StatsResponse import StatsResponse
+from AutocompleteResponse import AutocompleteResponse
+from ServerStatistics import ServerStatistics
 from CloseConnectionException import CloseConnectionException
 from msgess.msgess import MsgESS
 
 
 class ClientHandlerThread(threading.Thread):
-    def __init__(self, web_index: List[WebIndexItem], client_socket: socket.socket):
+    def __init__(self, client_message_handler: Union[ClientMessageHandler, CoordinatorMessageHandler], search_worker_pool: SearchWorkerPool, server_statistics: ServerStatistics, client_socket: socket.socket):
         super().__init__(daemon=True)
 
-        self._web_index: List[WebIndexItem] = web_index
+        self._client_message_handler: Union[ClientMessageHandler, CoordinatorMessageHandler] = client_message_handler
+        self._search_worker_pool: SearchWorkerPool = search_worker_pool
+        self._server_statistics: ServerStatistics = server_statistics
         self._client_socket: socket.socket = client_socket
 
+        self._stop_requested: threading.Event = threading.Event()
+
     def run(self) -> None:
+        self._server_statistics.on_connection_opened()
+
         try:
             self._handle_client()
 
@@ -46,33 +61,73 @@ class ClientHandlerThread(threading.Thread):
             pass
 
         finally:
+            self._server_statistics.on_connection_closed()
+
             try:
                 self._client_socket.close()
             except OSError:
                 pass
 
+    # The connection is closed once the current request is handled (used when the server is stopping).
+    def request_stop(self) -> None:
+        self._stop_requested.set()
+
     def _handle_client(self) -> None:
+        # The idle timeout applies to each socket operation, so it also limits how long the client can take to send
+        #  a message or to receive a response.
+        self._client_socket.settimeout(Settings.CLIENT_IDLE_TIMEOUT)
+
         client_msgess = MsgESS(self._client_socket)
         client_msgess.set_compress_messages(False)
 
-        request = self._receive_request(client_msgess)
-        response = self._handle_request(request)
-        self._send_response(client_msgess, response)
+        # The client can send any number of requests over the connection and doesn't have to wait for the response to
+        #  a request before sending the next one; the requests are handled (and responded to) in the order they were
+        #  sent. The connection is closed once the client closes it or stays idle for too long (the receive operation
+        #  fails in both cases).
+        while True:
+            json_, message_class = self._receive_message(client_msgess)
+            arrival_time = client_msgess.get_last_message_arrival_time()
+            self._server_statistics.record_latency(ServerStatistics.PHASE_RECEIVE, time.perf_counter() - arrival_time)
 
-    def _receive_request(self, client_msgess: MsgESS) -> ClientRequest:
-        json_, message_class = client_msgess.receive_json_object()
+            response = self._handle_message(json_, message_class)
+            self._send_response(client_msgess, response)
+            self._server_statistics.record_latency(ServerStatistics.PHASE_TOTAL, time.perf_counter() - arrival_time)
 
-        if message_class != ClientRequest.MESSAGE_CLASS:
-            raise CloseConnectionException("The client sent a message with an invalid message class. ({})".format(message_class))
+            # When the server is stopping, the requests which have already been pipelined by the client are still
+            #  handled, so their responses aren't lost.
+            if self._stop_requested.is_set() and not self._is_more_data_pending():
+                break
 
-        return ClientRequest(json_)
+    # poll() is used, since select() cannot handle file descriptors above FD_SETSIZE (1024).
+    def _is_more_data_pending(self) -> bool:
+        poller = select.poll()
+        poller.register(self._client_socket, select.POLLIN)
 
-    def _handle_request(self, request: ClientRequest) -> ClientResponse:
-        search_results = SearchPerformer(self._web_index, request).perform_search()
+        return bool(poller.poll(0))
 
-        return ClientResponse(search_results)
+    def _receive_message(self, client_msgess: MsgESS) -> Tuple[Dict[str, Any], int]:
+        return client_msgess.receive_json_object()
+
+    # The thread only takes care of the connection; the message is handled by one of the search workers, so the
+    #  number of concurrently performed searches is bounded. The cheap messages (e.g. the stats requests) are handled
+    #  right away - this way, they are answered even if the server is overloaded.
+    def _handle_message(self, json_: Dict[str, Any], message_class: int) -> Union[ClientResponse, BatchResponse, ReloadResponse, StatsResponse, AutocompleteResponse, OverloadedResponse]:
+        if message_class in self._client_message_handler.IMMEDIATELY_HANDLED_MESSAGE_CLASSES:
+            return self._client_message_handler.handle_message(json_, message_class)
+
+        future = self._search_worker_pool.submit(self._client_message_handler.handle_message, json_, message_class)
+
+        try:
+            return future.result()
+        except SearchWorkerPool.OverloadedException as e:
+            self._server_statistics.on_overloaded_response_sent()
+            return OverloadedResponse(e.queue_delay)
 
-    def _send_response(self, client_msgess: MsgESS, response: ClientResponse) -> None:
+    def _send_response(self, client_msgess: MsgESS, response: Union[ClientResponse, BatchResponse, ReloadResponse, StatsResponse, AutocompleteResponse, OverloadedResponse]) -> None:
+        start_time = time.perf_counter()
         response_json_object = response.to_json_object()
+        send_start_time = time.perf_counter()
+        self._server_statistics.record_latency(ServerStatistics.PHASE_ENCODE, send_start_time - start_time)
 
-        client_msgess.send_json_object(response_json_object, ClientResponse.MESSAGE_CLASS)
+        client_msgess.send_json_object(response_json_object, response.MESSAGE_CLASS)
+        self._server_statistics.record_latency(ServerStatistics.PHASE_SEND, time.perf_counter() - send_start_time)
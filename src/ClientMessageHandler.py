@@ -0,0 +1,254 @@
+# SPDX-License-Identifier: BSD-3-Clause
+#
+# Copyright (c) 2021 Vít Labuda. All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without modification, are permitted provided that the
+# following conditions are met:
+#  1. Redistributions of source code must retain the above copyright notice, this list of conditions and the following
+#     disclaimer.
+#  2. Redistributions in binary form must reproduce the above copyright notice, this list of conditions and the
+#     following disclaimer in the documentation and/or other materials provided with the distribution.
+#  3. Neither the name of the copyright holder nor the names of its contributors may be used to endorse or promote
+#     products derived from this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES,
+# INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+# SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+# SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY,
+# WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+
+from typing import Dict, Any, Tuple, Union, List, Optional, FrozenSet
+import os
+import copy
+from Settings import Settings
+from WebIndexManager import WebIndexManager
+from ClientRequest import ClientRequest
+from ClientResponse import ClientResponse
+from BatchRequest import BatchRequest
+from BatchResponse import BatchResponse
+from ReloadRequest import ReloadRequest
+from ReloadResponse import ReloadResponse
+from StatsRequest import StatsRequest
+from StatsResponse import StatsResponse
+from AutocompleteRequest import AutocompleteRequest
+from AutocompleteResponse import AutocompleteResponse
+from SearchPerformer import SearchPerformer
+from BatchSearchPerformer import BatchSearchPerformer
+from SearchWorkerPool import SearchWorkerPool
+from ServerStatistics import ServerStatistics
+from ProcessMemoryUsage import ProcessMemoryUsage
+from CloseConnectionException import CloseConnectionException
+
+
+# Handles the messages received from the clients; it is shared by all the client connections, regardless of how they
+#  are served.
+class ClientMessageHandler:
+    # The messages of these classes are cheap to handle, so the connection handlers handle them right away instead of
+    #  submitting them to the search worker pool - this way, they are answered quickly even if the server is overloaded.
+    IMMEDIATELY_HANDLED_MESSAGE_CLASSES: FrozenSet[int] = frozenset((StatsRequest.MESSAGE_CLASS, AutocompleteRequest.MESSAGE_CLASS))
+
+    def __init__(self, web_index_manager: WebIndexManager, search_worker_pool: SearchWorkerPool, server_statistics: ServerStatistics):
+        self._web_index_manager: WebIndexManager = web_index_manager
+        self._search_worker_pool: SearchWorkerPool = search_worker_pool
+        self._server_statistics: ServerStatistics = server_statistics
+
+    def handle_message(self, json_: Dict[str, Any], message_class: int) -> Union[ClientResponse, BatchResponse, ReloadResponse, StatsResponse, AutocompleteResponse]:
+        if message_class == ClientRequest.MESSAGE_CLASS:
+            response = self._handle_request(ClientRequest(json_))
+        elif message_class == BatchRequest.MESSAGE_CLASS:
+            response = self._handle_batch_request(BatchRequest(json_))
+        elif message_class == ReloadRequest.MESSAGE_CLASS:
+            response = self._handle_reload_request(ReloadRequest(json_))
+        elif message_class == StatsRequest.MESSAGE_CLASS:
+            response = self._handle_stats_request(StatsRequest(json_))
+        elif message_class == AutocompleteRequest.MESSAGE_CLASS:
+            response = self._handle_autocomplete_request(AutocompleteRequest(json_))
+        else:
+            raise CloseConnectionException("The client sent a message with an invalid message class. ({})".format(message_class))
+
+        self._server_statistics.on_message_handled(message_class)
+
+        return response
+
+    def _handle_request(self, request: ClientRequest) -> ClientResponse:
+        # The generation is held until the search is finished, so a concurrent reload doesn't affect the search.
+        with self._web_index_manager.acquire_current_generation() as generation:
+            ranked_documents, cursor, scanned_fraction = self._rank_documents_page(generation, request)
+            search_results = SearchPerformer(generation.web_index, request, server_statistics=self._server_statistics).make_search_results(ranked_documents)
+
+        return ClientResponse(search_results, request.use_cursor, cursor, scanned_fraction)
+
+    # The cursors are not supported in batch requests; the pages of their searches are always searched for again.
+    def _handle_batch_request(self, batch_request: BatchRequest) -> BatchResponse:
+        with self._web_index_manager.acquire_current_generation() as generation:
+            expanded_requests = [self._make_request_with_max_results(request, request.offset + request.max_results) for request in batch_request.requests]
+            rankings, scanned_fractions = self._rank_documents_batch(generation, expanded_requests)
+            ranked_documents_of_searches = [ranked_documents[request.offset:] for request, ranked_documents in zip(batch_request.requests, rankings)]
+
+            search_results_of_searches = [SearchPerformer(generation.web_index, request, server_statistics=self._server_statistics).make_search_results(ranked_documents) for request, ranked_documents in zip(batch_request.requests, ranked_documents_of_searches)]
+
+        return BatchResponse(search_results_of_searches, scanned_fractions)
+
+    # Returns the requested page of the ranked documents, the cursor under which the results are stored (if the client
+    #  asked for it, and the results could be stored), and the scanned fraction of the search (see
+    #  SearchPerformer.get_scanned_fraction()). The partial results (of the searches stopped by their deadline) are
+    #  never stored, so the subsequent requests for the same search get the complete results if they have time for it.
+    def _rank_documents_page(self, generation: WebIndexManager.Generation, request: ClientRequest) -> Tuple[List[Tuple[int, float]], Optional[str], float]:
+        result_cursor_store = self._web_index_manager.get_result_cursor_store()
+        page_end = request.offset + request.max_results
+
+        if (not request.use_cursor) or (result_cursor_store is None) or (page_end > result_cursor_store.get_max_results_per_cursor()):
+            ranked_documents, scanned_fraction = self._rank_documents(generation, self._make_request_with_max_results(request, page_end))
+            return ranked_documents[request.offset:], None, scanned_fraction
+
+        if request.cursor is not None:
+            ranked_documents = result_cursor_store.get(request.cursor, generation.number, request.canonical_search_query, request.use_quotient_based_scoring, request.term_mode)
+            if ranked_documents is not None:
+                return list(ranked_documents[request.offset:page_end]), request.cursor, 1.0
+
+        # If the cursor is not valid anymore (e.g. it has expired, or the web index has been reloaded), the search is
+        #  performed again, so the client doesn't have to handle it in any special way.
+        ranked_documents, scanned_fraction = self._rank_documents(generation, self._make_request_with_max_results(request, result_cursor_store.get_max_results_per_cursor()))
+        if scanned_fraction < 1.0:
+            return ranked_documents[request.offset:page_end], None, scanned_fraction
+
+        cursor = result_cursor_store.create(generation.number, request.canonical_search_query, request.use_quotient_based_scoring, request.term_mode, ranked_documents)
+
+        return ranked_documents[request.offset:page_end], cursor, scanned_fraction
+
+    def _rank_documents(self, generation: WebIndexManager.Generation, request: ClientRequest) -> Tuple[List[Tuple[int, float]], float]:
+        search_result_cache = self._web_index_manager.get_search_result_cache()
+        if not self._is_request_cacheable(request):
+            return self._search_in_generation(generation, request)
+
+        ranked_documents = search_result_cache.get(generation.number, request.canonical_search_query, request.use_quotient_based_scoring, request.term_mode, request.max_results)
+        if ranked_documents is not None:
+            return ranked_documents, 1.0
+
+        ranked_documents, scanned_fraction = self._search_in_generation(generation, self._make_cached_request(request))
+        if scanned_fraction == 1.0:
+            search_result_cache.put(generation.number, request.canonical_search_query, request.use_quotient_based_scoring, request.term_mode, ranked_documents)
+
+        return ranked_documents[:request.max_results], scanned_fraction
+
+    # The searches whose results aren't cached are performed at once.
+    def _rank_documents_batch(self, generation: WebIndexManager.Generation, requests: List[ClientRequest]) -> Tuple[List[List[Tuple[int, float]]], List[float]]:
+        search_result_cache = self._web_index_manager.get_search_result_cache()
+
+        ranked_documents_of_searches = [None] * len(requests)
+        scanned_fractions = [1.0] * len(requests)
+        uncached_request_indices, uncached_requests = [], []
+        for request_index, request in enumerate(requests):
+            if not self._is_request_cacheable(request):
+                uncached_request_indices.append(request_index)
+                uncached_requests.append(request)
+                continue
+
+            ranked_documents = search_result_cache.get(generation.number, request.canonical_search_query, request.use_quotient_based_scoring, request.term_mode, request.max_results)
+            if ranked_documents is not None:
+                ranked_documents_of_searches[request_index] = ranked_documents
+            else:
+                uncached_request_indices.append(request_index)
+                uncached_requests.append(self._make_cached_request(request))
+
+        if not uncached_requests:
+            return ranked_documents_of_searches, scanned_fractions
+
+        for request_index, ranked_documents, scanned_fraction in zip(uncached_request_indices, *self._search_batch_in_generation(generation, uncached_requests)):
+            request = requests[request_index]
+            if self._is_request_cacheable(request) and scanned_fraction == 1.0:
+                search_result_cache.put(generation.number, request.canonical_search_query, request.use_quotient_based_scoring, request.term_mode, ranked_documents)
+
+            ranked_documents_of_searches[request_index] = ranked_documents[:request.max_results]
+            scanned_fractions[request_index] = scanned_fraction
+
+        return ranked_documents_of_searches, scanned_fractions
+
+    def _is_request_cacheable(self, request: ClientRequest) -> bool:
+        search_result_cache = self._web_index_manager.get_search_result_cache()
+
+        return (search_result_cache is not None) and (request.max_results <= search_result_cache.get_max_results_per_entry())
+
+    # The cache entry has to be usable for any request for no more than its maximum number of results.
+    def _make_cached_request(self, request: ClientRequest) -> ClientRequest:
+        return self._make_request_with_max_results(request, self._web_index_manager.get_search_result_cache().get_max_results_per_entry())
+
+    def _make_request_with_max_results(self, request: ClientRequest, max_results: int) -> ClientRequest:
+        if request.max_results == max_results:
+            return request
+
+        modified_request = copy.copy(request)
+        modified_request.max_results = max_results
+
+        return modified_request
+
+    # Returns the ranked documents together with the scanned fraction of the search.
+    def _search_in_generation(self, generation: WebIndexManager.Generation, request: ClientRequest) -> Tuple[List[Tuple[int, float]], float]:
+        if generation.search_shard_pool is not None:
+            ranked_documents, scanned_fraction = generation.search_shard_pool.rank_documents(request)
+        else:
+            search_performer = SearchPerformer(generation.web_index, request, server_statistics=self._server_statistics)
+            ranked_documents, scanned_fraction = search_performer.rank_documents(), search_performer.get_scanned_fraction()
+
+        if scanned_fraction < 1.0:
+            self._server_statistics.on_partial_search()
+
+        return ranked_documents, scanned_fraction
+
+    def _search_batch_in_generation(self, generation: WebIndexManager.Generation, requests: List[ClientRequest]) -> Tuple[List[List[Tuple[int, float]]], List[float]]:
+        if generation.search_shard_pool is not None:
+            rankings, scanned_fractions = generation.search_shard_pool.rank_documents_batch(requests)
+        else:
+            batch_search_performer = BatchSearchPerformer(generation.web_index, requests)
+            rankings, scanned_fractions = batch_search_performer.rank_documents(), batch_search_performer.get_scanned_fractions()
+
+        for scanned_fraction in scanned_fractions:
+            if scanned_fraction < 1.0:
+                self._server_statistics.on_partial_search()
+
+        return rankings, scanned_fractions
+
+    def _handle_reload_request(self, request: ReloadRequest) -> ReloadResponse:
+        if not Settings.ALLOW_RELOAD_REQUESTS:
+            return ReloadResponse(False)
+
+        self._web_index_manager.request_reload()
+
+        return ReloadResponse(True)
+
+    def _handle_autocomplete_request(self, request: AutocompleteRequest) -> AutocompleteResponse:
+        with self._web_index_manager.acquire_current_generation() as generation:
+            completions = generation.web_index.autocomplete_index.get_completions(request.canonical_prefix, request.max_completions)
+
+        return AutocompleteResponse(completions, request.max_completions)
+
+    # The statistics are read without stopping the other threads, so the values coming from different components might
+    #  be slightly out of sync with each other.
+    def _handle_stats_request(self, request: StatsRequest) -> StatsResponse:
+        search_result_cache = self._web_index_manager.get_search_result_cache()
+        result_cursor_store = self._web_index_manager.get_result_cursor_store()
+
+        with self._web_index_manager.acquire_current_generation() as generation:
+            web_index_generation_number = generation.number
+            web_index_document_count = generation.web_index.get_live_document_count()
+            document_store = generation.web_index.document_store
+            autocomplete_index = generation.web_index.autocomplete_index
+
+        return StatsResponse({
+            "pid": os.getpid(),
+            "uptime": self._server_statistics.get_uptime(),
+            "rss": ProcessMemoryUsage.get_current_rss(),
+            "peak_rss": ProcessMemoryUsage.get_peak_rss(),
+            "web_index_generation_number": web_index_generation_number,
+            "web_index_document_count": web_index_document_count,
+            "server": self._server_statistics.get_counters(),
+            "search_worker_pool": self._search_worker_pool.get_counters(),
+            "search_result_cache": (search_result_cache.get_counters() if search_result_cache is not None else None),
+            "result_cursor_store": (result_cursor_store.get_counters() if result_cursor_store is not None else None),
+            "document_store": (document_store.get_counters() if document_store is not None else None),
+            "autocomplete_index": (autocomplete_index.get_counters() if autocomplete_index is not None else None),
+            "latencies": self._server_statistics.get_latency_histograms()
+        })
@@ -20,14 +20,20 @@
 # OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
 
 
-from typing import Dict, Any
+from typing import Dict, Any, Optional
 import re
+import math
+import time
+from Settings import Settings
 from CloseConnectionException import CloseConnectionException
 
 
 class ClientRequest:
     MESSAGE_CLASS: int = 1
 
+    TERM_MODE_ALL: str = "all"
+    TERM_MODE_ANY: str = "any"
+
     def __init__(self, request_object: Dict[str, Any]):
         if ("search_query" not in request_object) or not isinstance(request_object["search_query"], str):
             raise CloseConnectionException("There is no search query string in the request!")
@@ -41,9 +47,61 @@ class ClientRequest:
         if ("use_quotient_based_scoring" not in request_object) or not isinstance(request_object["use_quotient_based_scoring"], bool):
             raise CloseConnectionException("There is no percentile-based ranking boolean in the request!")
 
+        # The following items are optional; the results are paginated by skipping the first "offset" results. If
+        #  "use_cursor" is true, the results are stored on the server, and the response contains a cursor, which can be
+        #  sent in the "cursor" item of the requests for the subsequent pages of the results (if the cursor is not valid
+        #  anymore, the search is simply performed again). The offset is limited by Settings.SEARCH_MAX_OFFSET.
+        if ("offset" in request_object) and (isinstance(request_object["offset"], bool) or not isinstance(request_object["offset"], int) or request_object["offset"] < 0):
+            raise CloseConnectionException("The offset in the request isn't a non-negative integer!")
+
+        if request_object.get("offset", 0) > Settings.SEARCH_MAX_OFFSET:
+            raise CloseConnectionException("The offset in the request exceeds the maximum of {}!".format(Settings.SEARCH_MAX_OFFSET))
+
+        if ("use_cursor" in request_object) and not isinstance(request_object["use_cursor"], bool):
+            raise CloseConnectionException("The use cursor item in the request isn't a boolean!")
+
+        if ("cursor" in request_object) and not isinstance(request_object["cursor"], (str, type(None))):
+            raise CloseConnectionException("The cursor in the request isn't a string!")
+
+        # If the optional "term_mode" item is "all" or "any", the search query is split into terms, and the documents
+        #  containing all or any of them are searched for, instead of the documents containing the whole query.
+        if ("term_mode" in request_object) and (request_object["term_mode"] not in (None, ClientRequest.TERM_MODE_ALL, ClientRequest.TERM_MODE_ANY)):
+            raise CloseConnectionException("The term mode in the request is invalid!")
+
+        if (request_object.get("term_mode") is not None) and not Settings.USE_TERM_POSTINGS_INDEX:
+            raise CloseConnectionException("The term-based searches are disabled on this server!")
+
+        # The optional "deadline_ms" item overrides the server's default time budget of the search (see
+        #  Settings.SEARCH_DEFAULT_DEADLINE).
+        if ("deadline_ms" in request_object) and (isinstance(request_object["deadline_ms"], bool) or not isinstance(request_object["deadline_ms"], (int, float)) or not math.isfinite(request_object["deadline_ms"]) or request_object["deadline_ms"] <= 0):
+            raise CloseConnectionException("The deadline in the request isn't a positive finite number!")
+
+        # If the optional "include_document_ids" item is true, the search results contain the IDs of their documents
+        #  (used by the coordinator to merge the results of the backend servers, see CoordinatorMessageHandler).
+        if ("include_document_ids" in request_object) and not isinstance(request_object["include_document_ids"], bool):
+            raise CloseConnectionException("The include document IDs item in the request isn't a boolean!")
+
         self.canonical_search_query: str = self._canonicalize_query(request_object["search_query"])
         self.max_results: int = request_object["max_results"]
         self.use_quotient_based_scoring: bool = request_object["use_quotient_based_scoring"]
+        self.offset: int = request_object.get("offset", 0)
+        self.use_cursor: bool = request_object.get("use_cursor", False) or (request_object.get("cursor") is not None)
+        self.cursor: Optional[str] = request_object.get("cursor")
+        self.term_mode: Optional[str] = request_object.get("term_mode")
+        self.include_document_ids: bool = request_object.get("include_document_ids", False)
+
+        # The time.monotonic() value after which the search is stopped, or None if the search is never stopped; the
+        #  monotonic clock is shared by all the processes, so the deadline holds in the search shard processes too.
+        self.deadline: Optional[float] = self._get_deadline(request_object.get("deadline_ms"))
+
+    def _get_deadline(self, deadline_ms: Optional[float]) -> Optional[float]:
+        if deadline_ms is not None:
+            return time.monotonic() + (deadline_ms / 1000)
+
+        if Settings.SEARCH_DEFAULT_DEADLINE is not None:
+            return time.monotonic() + Settings.SEARCH_DEFAULT_DEADLINE
+
+        return None
 
     def _canonicalize_query(self, query: str) -> str:
         query = query.lower()
@@ -20,17 +20,30 @@
 # OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
 
 
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional
 from SearchResult import SearchResult
 
 
 class ClientResponse:
     MESSAGE_CLASS: int = 2
 
-    def __init__(self, search_results: List[SearchResult]):
+    # The cursor is included in the response only if the client requested it (it can be None, if the results couldn't
+    #  be stored). If the search has been stopped by its deadline, the results are partial, and the scanned fraction
+    #  tells which part of the candidate documents has been scored (see SearchPerformer.get_scanned_fraction()).
+    def __init__(self, search_results: List[SearchResult], include_cursor: bool = False, cursor: Optional[str] = None, scanned_fraction: float = 1.0):
         self._search_results: List[SearchResult] = search_results
+        self._include_cursor: bool = include_cursor
+        self._cursor: Optional[str] = cursor
+        self._scanned_fraction: float = scanned_fraction
 
     def to_json_object(self) -> Dict[str, Any]:
-        return {
-            "search_results": [search_result.to_response_object() for search_result in self._search_results]
+        json_object = {
+            "search_results": [search_result.to_response_object() for search_result in self._search_results],
+            "is_partial": (self._scanned_fraction < 1.0),
+            "scanned_fraction": self._scanned_fraction
         }
+
+        if self._include_cursor:
+            json_object["cursor"] = self._cursor
+
+        return json_object
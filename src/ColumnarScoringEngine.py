@@ -0,0 +1,225 @@
+# SPDX-License-Identifier: BSD-3-Clause
+#
+# Copyright (c) 2021 Vít Labuda. All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without modification, are permitted provided that the
+# following conditions are met:
+#  1. Redistributions of source code must retain the above copyright notice, this list of conditions and the following
+#     disclaimer.
+#  2. Redistributions in binary form must reproduce the above copyright notice, this list of conditions and the
+#     following disclaimer in the documentation and/or other materials provided with the distribution.
+#  3. Neither the name of the copyright holder nor the names of its contributors may be used to endorse or promote
+#     products derived from this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES,
+# INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+# SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+# SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY,
+# WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+
+from __future__ import annotations
+from typing import List, Sequence, Callable, Tuple
+import copy
+from Settings import Settings
+from WebIndexItem import WebIndexItem
+from ScoreUpperBounds import ScoreUpperBounds
+from SpiderimentSearchServerRuntimeError import SpiderimentSearchServerRuntimeError
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+class ColumnarScoringEngine:
+    # The fields' lowercased text getters; the headings are scored between the title and the description, so the fields
+    #  are split in two groups in order for the scores to be summed in the same order as in the per-document scoring
+    #  algorithms (floating-point addition isn't associative). Their scoring coefficients are read from the settings
+    #  when the engine is created (see _get_field_coefficients()).
+    _FIELDS_BEFORE_HEADINGS: Tuple[Callable[[WebIndexItem], str], ...] = (
+        lambda item: item.url_lc,
+        lambda item: item.title_lc,
+    )
+    _FIELDS_AFTER_HEADINGS: Tuple[Callable[[WebIndexItem], str], ...] = (
+        lambda item: item.description_lc,
+        lambda item: item.keywords_lc,
+        lambda item: item.author_lc,
+        lambda item: item.content_snippet_lc,
+        lambda item: item.image_alts_lc,
+        lambda item: item.link_texts_lc,
+    )
+    _CONTENT_SNIPPET_FIELD_INDEX: int = 3  # in _FIELDS_AFTER_HEADINGS
+
+    def __init__(self, web_index_items: List[WebIndexItem], score_upper_bounds: ScoreUpperBounds):
+        if numpy is None:
+            raise SpiderimentSearchServerRuntimeError("The columnar scoring engine requires the NumPy library to be installed!")
+
+        self._web_index_items: List[WebIndexItem] = web_index_items
+        self._score_upper_bounds: ScoreUpperBounds = score_upper_bounds
+        # The bound numerators are copied, since the arrays of the score upper bounds are appended to by the updates (and
+        #  an array whose buffer is exported to NumPy cannot be resized).
+        self._occurrence_bound_numerators: numpy.ndarray = numpy.array(score_upper_bounds.get_bound_numerators(False), dtype=numpy.float64)
+        self._quotient_bound_numerators: numpy.ndarray = numpy.array(score_upper_bounds.get_bound_numerators(True), dtype=numpy.float64)
+
+        self._coefficients_before_headings: Tuple[int, ...]
+        self._coefficients_after_headings: Tuple[int, ...]
+        self._coefficients_before_headings, self._coefficients_after_headings = self._get_field_coefficients()
+
+        self._lengths_before_headings: List[numpy.ndarray] = [self._build_length_column(web_index_items, getter) for getter in ColumnarScoringEngine._FIELDS_BEFORE_HEADINGS]
+        self._lengths_after_headings: List[numpy.ndarray] = [self._build_length_column(web_index_items, getter) for getter in ColumnarScoringEngine._FIELDS_AFTER_HEADINGS]
+        self._content_snippet_qualities: numpy.ndarray = self._build_content_snippet_quality_column(web_index_items)
+
+        # The headings of all the documents are stored in flat arrays; the headings of the document N are located at
+        #  the indices heading_offsets[N] to heading_offsets[N + 1].
+        heading_counts = self._build_heading_count_column(web_index_items)
+        self._heading_counts: numpy.ndarray = heading_counts
+        self._heading_offsets: numpy.ndarray = numpy.concatenate((numpy.zeros(1, dtype=numpy.int64), numpy.cumsum(heading_counts)))
+        self._heading_lengths: numpy.ndarray = self._build_heading_length_column(web_index_items)
+        self._heading_coefficients: numpy.ndarray = self._build_heading_coefficient_column(web_index_items)
+
+    # The coefficients are read when the engine is created (like the ones of the score upper bounds and the heading
+    #  coefficient column), not when this module is imported, so the settings overridden in the meantime (see
+    #  Settings.apply_command_line_overrides()) are taken into account.
+    def _get_field_coefficients(self) -> Tuple[Tuple[int, ...], Tuple[int, ...]]:
+        return (
+            (Settings.SCORE_URL, Settings.SCORE_TITLE),
+            (Settings.SCORE_DESCRIPTION, Settings.SCORE_KEYWORD, Settings.SCORE_AUTHOR, Settings.SCORE_CONTENT_SNIPPET, Settings.SCORE_IMAGE_ALT, Settings.SCORE_LINK_TEXT)
+        )
+
+    def _build_length_column(self, web_index_items: List[WebIndexItem], getter: Callable[[WebIndexItem], str]) -> numpy.ndarray:
+        return numpy.fromiter((len(getter(item)) for item in web_index_items), dtype=numpy.float64, count=len(web_index_items))
+
+    def _build_content_snippet_quality_column(self, web_index_items: List[WebIndexItem]) -> numpy.ndarray:
+        return numpy.fromiter((item.content_snippet_quality for item in web_index_items), dtype=numpy.float64, count=len(web_index_items))
+
+    def _build_heading_count_column(self, web_index_items: List[WebIndexItem]) -> numpy.ndarray:
+        return numpy.fromiter((len(item.headings_lc) for item in web_index_items), dtype=numpy.int64, count=len(web_index_items))
+
+    def _build_heading_length_column(self, web_index_items: List[WebIndexItem]) -> numpy.ndarray:
+        return numpy.fromiter((len(heading_text_lc) for item in web_index_items for heading_text_lc in item.headings_lc), dtype=numpy.float64)
+
+    def _build_heading_coefficient_column(self, web_index_items: List[WebIndexItem]) -> numpy.ndarray:
+        return numpy.fromiter((Settings.SCORE_HEADING / heading_level for item in web_index_items for heading_level in item.heading_levels), dtype=numpy.float64)
+
+    # Returns an engine which also covers the documents added to the web index (see WebIndex.create_updated_index());
+    #  only the columns of the added documents are built, and they are appended to the existing columns (see
+    #  _append_to_column()). The removed documents are never passed to the engine, so their columns are simply left in
+    #  place. The same as with the web index, an outdated engine must not be updated.
+    def create_updated(self, added_web_index_items: List[WebIndexItem], score_upper_bounds: ScoreUpperBounds) -> ColumnarScoringEngine:
+        first_added_document_id = len(self._occurrence_bound_numerators)
+
+        updated_engine = copy.copy(self)
+        updated_engine._score_upper_bounds = score_upper_bounds
+        updated_engine._occurrence_bound_numerators = self._append_to_column(self._occurrence_bound_numerators, numpy.array(score_upper_bounds.get_bound_numerators(False)[first_added_document_id:], dtype=numpy.float64))
+        updated_engine._quotient_bound_numerators = self._append_to_column(self._quotient_bound_numerators, numpy.array(score_upper_bounds.get_bound_numerators(True)[first_added_document_id:], dtype=numpy.float64))
+
+        updated_engine._lengths_before_headings = [self._append_to_column(lengths, self._build_length_column(added_web_index_items, getter)) for getter, lengths in zip(ColumnarScoringEngine._FIELDS_BEFORE_HEADINGS, self._lengths_before_headings)]
+        updated_engine._lengths_after_headings = [self._append_to_column(lengths, self._build_length_column(added_web_index_items, getter)) for getter, lengths in zip(ColumnarScoringEngine._FIELDS_AFTER_HEADINGS, self._lengths_after_headings)]
+        updated_engine._content_snippet_qualities = self._append_to_column(self._content_snippet_qualities, self._build_content_snippet_quality_column(added_web_index_items))
+
+        heading_counts = self._build_heading_count_column(added_web_index_items)
+        updated_engine._heading_counts = self._append_to_column(self._heading_counts, heading_counts)
+        updated_engine._heading_offsets = self._append_to_column(self._heading_offsets, self._heading_offsets[-1] + numpy.cumsum(heading_counts))
+        updated_engine._heading_lengths = self._append_to_column(self._heading_lengths, self._build_heading_length_column(added_web_index_items))
+        updated_engine._heading_coefficients = self._append_to_column(self._heading_coefficients, self._build_heading_coefficient_column(added_web_index_items))
+
+        return updated_engine
+
+    # The engines use views of the columns' underlying arrays, which have spare capacity after the views' end, so the
+    #  appended values are usually just written into it - the older engines' views don't cover it, so they are not
+    #  affected. Once the capacity runs out, the column is copied into an array twice as large, so each value is copied
+    #  only a constant number of times on average.
+    def _append_to_column(self, column: numpy.ndarray, added_values: numpy.ndarray) -> numpy.ndarray:
+        length, new_length = len(column), len(column) + len(added_values)
+
+        underlying_array = (column.base if isinstance(column.base, numpy.ndarray) else column)
+        if new_length > len(underlying_array):
+            underlying_array = numpy.empty(max(new_length, 2 * length), dtype=column.dtype)
+            underlying_array[:length] = column
+
+        underlying_array[length:new_length] = added_values
+
+        return underlying_array[:new_length]
+
+    # Returns the (document ID, score) pairs of the best-scoring documents, ordered by their score in descending order
+    #  (documents with the same score are ordered by their IDs), whose score is at least Settings.MINIMAL_SCORE.
+    def rank_documents(self, document_ids: Sequence[int], canonical_search_query: str, use_quotient_based_scoring: bool, max_results: int) -> List[Tuple[int, float]]:
+        document_ids = numpy.asarray(document_ids, dtype=numpy.int64)
+
+        # The documents whose score cannot reach the minimal score (not even theoretically) don't have to be scored.
+        bound_numerators = (self._quotient_bound_numerators if use_quotient_based_scoring else self._occurrence_bound_numerators)
+        bound_factor = self._score_upper_bounds.get_bound_factor(canonical_search_query)
+        document_ids = document_ids[bound_numerators[document_ids] * bound_factor >= Settings.MINIMAL_SCORE]
+
+        scores = self.compute_scores(document_ids, canonical_search_query, use_quotient_based_scoring)
+
+        passing_mask = (scores >= Settings.MINIMAL_SCORE)
+        document_ids, scores = document_ids[passing_mask], scores[passing_mask]
+
+        # Only the documents scoring at least as much as the k-th best one are sorted; a stable sort then keeps the
+        #  documents with the same score in the order of their IDs.
+        if len(scores) > max_results:
+            kth_best_score = numpy.partition(scores, len(scores) - max_results)[len(scores) - max_results]
+            top_mask = (scores >= kth_best_score)
+            document_ids, scores = document_ids[top_mask], scores[top_mask]
+
+        order = numpy.argsort(-scores, kind="stable")[0:max_results]
+
+        return list(zip(document_ids[order].tolist(), scores[order].tolist()))
+
+    # Returns the scores of the specified documents in the same order as the document IDs were passed.
+    def compute_scores(self, document_ids: Sequence[int], canonical_search_query: str, use_quotient_based_scoring: bool) -> numpy.ndarray:
+        document_ids = numpy.asarray(document_ids, dtype=numpy.int64)
+        items = [self._web_index_items[document_id] for document_id in document_ids.tolist()]
+        scores = numpy.zeros(len(items), dtype=numpy.float64)
+
+        for getter, coefficient, lengths in zip(ColumnarScoringEngine._FIELDS_BEFORE_HEADINGS, self._coefficients_before_headings, self._lengths_before_headings):
+            scores += self._compute_field_scores(items, getter, lengths[document_ids], canonical_search_query, use_quotient_based_scoring) * coefficient
+
+        self._add_heading_scores(scores, items, document_ids, canonical_search_query, use_quotient_based_scoring)
+
+        for field_index, (getter, coefficient, lengths) in enumerate(zip(ColumnarScoringEngine._FIELDS_AFTER_HEADINGS, self._coefficients_after_headings, self._lengths_after_headings)):
+            field_scores = self._compute_field_scores(items, getter, lengths[document_ids], canonical_search_query, use_quotient_based_scoring)
+            if field_index == ColumnarScoringEngine._CONTENT_SNIPPET_FIELD_INDEX:
+                field_scores *= self._content_snippet_qualities[document_ids]
+            scores += field_scores * coefficient
+
+        return scores
+
+    def _compute_field_scores(self, items: List[WebIndexItem], getter: Callable[[WebIndexItem], str], lengths: numpy.ndarray, canonical_search_query: str, use_quotient_based_scoring: bool) -> numpy.ndarray:
+        counts = numpy.fromiter((getter(item).count(canonical_search_query) for item in items), dtype=numpy.float64, count=len(items))
+
+        return self._apply_scoring_mode(counts, lengths, use_quotient_based_scoring)
+
+    def _add_heading_scores(self, scores: numpy.ndarray, items: List[WebIndexItem], document_ids: numpy.ndarray, canonical_search_query: str, use_quotient_based_scoring: bool) -> None:
+        heading_counts = self._heading_counts[document_ids]
+        total_heading_count = int(heading_counts.sum())
+        if total_heading_count == 0:
+            return
+
+        # For each heading of the scored documents: the position of its document in the 'scores' array, its position
+        #  among its document's headings and its index in the flat heading arrays.
+        rows = numpy.repeat(numpy.arange(len(items)), heading_counts)
+        first_heading_positions = numpy.cumsum(heading_counts) - heading_counts
+        positions_in_document = numpy.arange(total_heading_count) - numpy.repeat(first_heading_positions, heading_counts)
+        heading_indices = numpy.repeat(self._heading_offsets[document_ids], heading_counts) + positions_in_document
+
+        counts = numpy.fromiter((heading_text_lc.count(canonical_search_query) for item in items for heading_text_lc in item.headings_lc), dtype=numpy.float64, count=total_heading_count)
+        heading_scores = self._apply_scoring_mode(counts, self._heading_lengths[heading_indices], use_quotient_based_scoring) * self._heading_coefficients[heading_indices]
+
+        # The headings are added one "column" at a time, so each document's heading scores are summed in their original
+        #  order. A document occurs at most once in each column, so the fancy-indexed addition is safe.
+        for position in range(int(heading_counts.max())):
+            column_mask = (positions_in_document == position)
+            scores[rows[column_mask]] += heading_scores[column_mask]
+
+    def _apply_scoring_mode(self, counts: numpy.ndarray, lengths: numpy.ndarray, use_quotient_based_scoring: bool) -> numpy.ndarray:
+        if not use_quotient_based_scoring:
+            return counts
+
+        # Zero-length fields are masked out instead of raising ZeroDivisionError; their score is 0.0, the same as in
+        #  the per-document quotient-based scoring algorithm.
+        return numpy.divide(counts, lengths, out=numpy.zeros_like(counts), where=(lengths != 0))
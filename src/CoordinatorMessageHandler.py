@@ -0,0 +1,225 @@
+# SPDX-License-Identifier: BSD-3-Clause
+#
+# Copyright (c) 2021 Vít Labuda. All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without modification, are permitted provided that the
+# following conditions are met:
+#  1. Redistributions of source code must retain the above copyright notice, this list of conditions and the following
+#     disclaimer.
+#  2. Redistributions in binary form must reproduce the above copyright notice, this list of conditions and the
+#     following disclaimer in the documentation and/or other materials provided with the distribution.
+#  3. Neither the name of the copyright holder nor the names of its contributors may be used to endorse or promote
+#     products derived from this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES,
+# INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+# SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+# SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY,
+# WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+
+from typing import Dict, Any, Tuple, Union, List, Optional, FrozenSet, Set
+import os
+import time
+import logging
+import heapq
+import itertools
+from Settings import Settings
+from ClientRequest import ClientRequest
+from ClientResponse import ClientResponse
+from BatchRequest import BatchRequest
+from BatchResponse import BatchResponse
+from ReloadRequest import ReloadRequest
+from ReloadResponse import ReloadResponse
+from StatsRequest import StatsRequest
+from StatsResponse import StatsResponse
+from AutocompleteRequest import AutocompleteRequest
+from AutocompleteResponse import AutocompleteResponse
+from SearchResult import SearchResult
+from SearchBackend import SearchBackend
+from SearchWorkerPool import SearchWorkerPool
+from ServerStatistics import ServerStatistics
+from ProcessMemoryUsage import ProcessMemoryUsage
+from CloseConnectionException import CloseConnectionException
+
+
+# Handles the messages received from the clients in the coordinator mode (see Settings.COORDINATOR_BACKEND_SOCKET_PATHS);
+#  it can be used instead of ClientMessageHandler. Each search is forwarded to all the backend servers, and their top
+#  results are merged. The partitions of the web index are created by assigning its documents to the backends in a
+#  round-robin fashion (see WebIndexPartitioner), so the document N of the backend B is the document
+#  (N * backend count + B) of the whole web index; the results are then merged in the same order (score descending,
+#  document ID ascending) as if the whole web index was searched by a single server. This only holds as long as the
+#  backends search exactly their partitions: the documents added or replaced by a backend's delta file (see
+#  Settings.WEB_INDEX_DELTA_FILE_PATH) get IDs following the partition's ones, so the documents with the same score
+#  might be ordered differently than by a single server (they are still ordered consistently, as the derived IDs are
+#  unique). The same applies if the backends' partitions don't come from the same version of the web index.
+class CoordinatorMessageHandler:
+    # The autocomplete requests are forwarded to the backends like the searches, so only the stats requests are handled
+    #  right away by the connection handlers (see ClientMessageHandler).
+    IMMEDIATELY_HANDLED_MESSAGE_CLASSES: FrozenSet[int] = frozenset((StatsRequest.MESSAGE_CLASS,))
+
+    # If the search's deadline has already passed, the backends still get a tiny time budget, so they return at least
+    #  what they find right away.
+    _MIN_BACKEND_DEADLINE_MS: float = 1.0
+
+    def __init__(self, logger: logging.Logger, search_worker_pool: SearchWorkerPool, server_statistics: ServerStatistics):
+        self._logger: logging.Logger = logger
+        self._search_worker_pool: SearchWorkerPool = search_worker_pool
+        self._server_statistics: ServerStatistics = server_statistics
+
+        self._backends: List[SearchBackend] = [SearchBackend(socket_path, Settings.COORDINATOR_MAX_IDLE_CONNECTIONS) for socket_path in Settings.COORDINATOR_BACKEND_SOCKET_PATHS]
+
+        # The indices of the backends which have been warned about returning fewer autocomplete completions than asked.
+        self._capped_autocomplete_backend_indices: Set[int] = set()
+
+    def handle_message(self, json_: Dict[str, Any], message_class: int) -> Union[ClientResponse, BatchResponse, ReloadResponse, StatsResponse, AutocompleteResponse]:
+        if message_class == ClientRequest.MESSAGE_CLASS:
+            response = self._handle_request(json_)
+        elif message_class == BatchRequest.MESSAGE_CLASS:
+            response = self._handle_batch_request(json_)
+        elif message_class == ReloadRequest.MESSAGE_CLASS:
+            response = self._handle_reload_request(ReloadRequest(json_))
+        elif message_class == StatsRequest.MESSAGE_CLASS:
+            response = self._handle_stats_request(StatsRequest(json_))
+        elif message_class == AutocompleteRequest.MESSAGE_CLASS:
+            response = self._handle_autocomplete_request(AutocompleteRequest(json_))
+        else:
+            raise CloseConnectionException("The client sent a message with an invalid message class. ({})".format(message_class))
+
+        self._server_statistics.on_message_handled(message_class)
+
+        return response
+
+    # The cursors are not supported by the coordinator (the response never contains a cursor, which the clients have to
+    #  handle anyway); each page is searched for again.
+    def _handle_request(self, request_object: Dict[str, Any]) -> ClientResponse:
+        request = ClientRequest(request_object)
+        if not request.canonical_search_query:
+            return ClientResponse([], request.use_cursor)  # If the search query is empty, don't return any results
+
+        backend_responses = self._scatter(self._make_backend_request_object(request_object, request), ClientRequest.MESSAGE_CLASS, ClientResponse.MESSAGE_CLASS)
+        search_results, scanned_fraction = self._merge_search_results(request, [(backend_response["search_results"], backend_response["scanned_fraction"]) if backend_response is not None else None for backend_response in backend_responses])
+
+        return ClientResponse(search_results, request.use_cursor, None, scanned_fraction)
+
+    def _handle_batch_request(self, batch_request_object: Dict[str, Any]) -> BatchResponse:
+        batch_request = BatchRequest(batch_request_object)
+        backend_batch_request_object = {"searches": [self._make_backend_request_object(search_object, request) for search_object, request in zip(batch_request_object["searches"], batch_request.requests)]}
+
+        backend_responses = self._scatter(backend_batch_request_object, BatchRequest.MESSAGE_CLASS, BatchResponse.MESSAGE_CLASS)
+
+        search_results_of_searches, scanned_fractions = [], []
+        for search_index, request in enumerate(batch_request.requests):
+            search_results, scanned_fraction = self._merge_search_results(request, [(backend_response["search_results"][search_index], backend_response["scanned_fractions"][search_index]) if backend_response is not None else None for backend_response in backend_responses])
+            search_results_of_searches.append(search_results)
+            scanned_fractions.append(scanned_fraction)
+
+        return BatchResponse(search_results_of_searches, scanned_fractions)
+
+    # Each backend is asked for all the results up to the end of the requested page, together with their document IDs.
+    #  The remaining time of the search is passed on, so the time spent by the request in the coordinator counts too.
+    def _make_backend_request_object(self, request_object: Dict[str, Any], request: ClientRequest) -> Dict[str, Any]:
+        backend_request_object = {key: value for key, value in request_object.items() if key not in ("use_cursor", "cursor")}
+        backend_request_object["offset"] = 0
+        backend_request_object["max_results"] = request.offset + request.max_results
+        backend_request_object["include_document_ids"] = True
+
+        if request.deadline is not None:
+            backend_request_object["deadline_ms"] = max((request.deadline - time.monotonic()) * 1000, CoordinatorMessageHandler._MIN_BACKEND_DEADLINE_MS)
+
+        return backend_request_object
+
+    # The backend's results and scanned fraction are None if it hasn't responded. The missing backends count as if none
+    #  of their documents has been scanned.
+    def _merge_search_results(self, request: ClientRequest, backend_results: List[Optional[Tuple[List[Dict[str, Any]], float]]]) -> Tuple[List[SearchResult], float]:
+        backend_count = len(backend_results)
+
+        sorted_results = []
+        for backend_index, results_and_scanned_fraction in enumerate(backend_results):
+            if results_and_scanned_fraction is not None:
+                sorted_results.append([(result_object["document_id"] * backend_count + backend_index, result_object) for result_object in results_and_scanned_fraction[0]])
+
+        merged_results = heapq.merge(*sorted_results, key=lambda result: (-result[1]["score"], result[0]))
+        page_results = itertools.islice(merged_results, request.offset, request.offset + request.max_results)
+
+        search_results = [self._make_search_result(request, document_id, result_object) for document_id, result_object in page_results]
+        scanned_fraction = sum(results_and_scanned_fraction[1] for results_and_scanned_fraction in backend_results if results_and_scanned_fraction is not None) / backend_count
+        if scanned_fraction < 1.0:
+            self._server_statistics.on_partial_search()
+
+        return search_results, scanned_fraction
+
+    def _make_search_result(self, request: ClientRequest, document_id: int, result_object: Dict[str, Any]) -> SearchResult:
+        search_result = SearchResult(result_object["url"], result_object["title"], result_object["snippet"])
+        search_result.score = result_object["score"]
+        if request.include_document_ids:
+            search_result.document_id = document_id
+
+        return search_result
+
+    # The message is sent to all the backends first, so they handle it in parallel, and then their responses are
+    #  collected. None is returned for the backends which haven't responded in time (see SearchBackend).
+    def _scatter(self, json_object: Dict[str, Any], message_class: int, expected_response_message_class: int) -> List[Optional[Dict[str, Any]]]:
+        start_time = time.perf_counter()
+        deadline = time.monotonic() + Settings.COORDINATOR_BACKEND_TIMEOUT
+
+        connections = [backend.send_message(json_object, message_class, deadline) for backend in self._backends]
+        responses = [(backend.receive_response(connection, expected_response_message_class, deadline) if connection is not None else None) for backend, connection in zip(self._backends, connections)]
+
+        self._server_statistics.record_latency(ServerStatistics.PHASE_BACKEND, time.perf_counter() - start_time)
+
+        return responses
+
+    # Each backend weights the phrases by their occurrences in its own partition, so the weights of the same phrase are
+    #  summed up. The merged completions are approximate, as the backends only return their top completions (see
+    #  Settings.COORDINATOR_AUTOCOMPLETE_BACKEND_COMPLETIONS). If a backend caps the number of completions by its own
+    #  AUTOCOMPLETE_MAX_COMPLETIONS setting, the merged completions are even less accurate, which is logged once per
+    #  backend.
+    def _handle_autocomplete_request(self, request: AutocompleteRequest) -> AutocompleteResponse:
+        if not request.canonical_prefix:
+            return AutocompleteResponse([], request.max_completions)  # If the prefix is empty, don't return any completions
+
+        backend_max_completions = max(request.max_completions, Settings.COORDINATOR_AUTOCOMPLETE_BACKEND_COMPLETIONS)
+        backend_responses = self._scatter({"prefix": request.prefix, "max_completions": backend_max_completions}, AutocompleteRequest.MESSAGE_CLASS, AutocompleteResponse.MESSAGE_CLASS)
+
+        phrase_weights = {}
+        for backend_index, backend_response in enumerate(backend_responses):
+            if backend_response is not None:
+                if (backend_response["max_completions"] < backend_max_completions) and (backend_index not in self._capped_autocomplete_backend_indices):
+                    self._capped_autocomplete_backend_indices.add(backend_index)
+                    self._logger.warning("The backend #{} returns at most {} autocomplete completions instead of {}; raise its AUTOCOMPLETE_MAX_COMPLETIONS setting to get more accurate merged completions!".format(backend_index, backend_response["max_completions"], backend_max_completions))
+
+                for completion_object in backend_response["completions"]:
+                    phrase_weights[completion_object["text"]] = phrase_weights.get(completion_object["text"], 0.0) + completion_object["weight"]
+
+        completions = sorted(phrase_weights.items(), key=lambda completion: (-completion[1], completion[0]))
+
+        return AutocompleteResponse(completions[:request.max_completions], request.max_completions)
+
+    # The reload is requested from all the backends; it is reported as requested only if all of them have accepted it.
+    def _handle_reload_request(self, request: ReloadRequest) -> ReloadResponse:
+        if not Settings.ALLOW_RELOAD_REQUESTS:
+            return ReloadResponse(False)
+
+        backend_responses = self._scatter({}, ReloadRequest.MESSAGE_CLASS, ReloadResponse.MESSAGE_CLASS)
+
+        return ReloadResponse(all((backend_response is not None) and backend_response["reload_requested"] for backend_response in backend_responses))
+
+    # The backends' statistics can be obtained from them directly; only their connection counters are included.
+    def _handle_stats_request(self, request: StatsRequest) -> StatsResponse:
+        return StatsResponse({
+            "pid": os.getpid(),
+            "uptime": self._server_statistics.get_uptime(),
+            "rss": ProcessMemoryUsage.get_current_rss(),
+            "peak_rss": ProcessMemoryUsage.get_peak_rss(),
+            "server": self._server_statistics.get_counters(),
+            "search_worker_pool": self._search_worker_pool.get_counters(),
+            "backends": [backend.get_counters() for backend in self._backends],
+            "latencies": self._server_statistics.get_latency_histograms()
+        })
+
+    def close(self) -> None:
+        for backend in self._backends:
+            backend.close()
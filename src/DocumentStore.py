@@ -0,0 +1,127 @@
+# SPDX-License-Identifier: BSD-3-Clause
+#
+# Copyright (c) 2021 Vít Labuda. All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without modification, are permitted provided that the
+# following conditions are met:
+#  1. Redistributions of source code must retain the above copyright notice, this list of conditions and the following
+#     disclaimer.
+#  2. Redistributions in binary form must reproduce the above copyright notice, this list of conditions and the
+#     following disclaimer in the documentation and/or other materials provided with the distribution.
+#  3. Neither the name of the copyright holder nor the names of its contributors may be used to endorse or promote
+#     products derived from this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES,
+# INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+# SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+# SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY,
+# WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+
+from __future__ import annotations
+from typing import List, Tuple, Dict, BinaryIO
+import os
+import mmap
+import array
+import tempfile
+import threading
+import collections
+from WebIndexItem import WebIndexItem
+from SpiderimentSearchServerRuntimeError import SpiderimentSearchServerRuntimeError
+
+
+# Keeps the fields which are only displayed to the clients (the original URL, title and content snippet of each
+#  document) in a memory-mapped file instead of the process's memory, as they are needed only for the few documents
+#  which end up in the search results. The fields of the recently returned documents are cached.
+class DocumentStore:
+    # The file consists of a table of (3 * document count + 1) 64-bit offsets and the UTF-8 encoded fields of all the
+    #  documents; the fields of the document N are located between the offsets 3N, 3N + 1, 3N + 2 and 3N + 3 (relative
+    #  to the start of the encoded fields). The file is created by the server itself whenever the web index is loaded,
+    #  so the numbers are stored in the native byte order, and there is no header.
+    _FIELDS_PER_DOCUMENT: int = 3
+
+    # See WebIndexSnapshot.
+    _STRING_ENCODING: str = "utf-8"
+    _STRING_ENCODING_ERRORS: str = "surrogatepass"
+
+    # Writes the display fields of the items into a new file and maps it into memory. The file is created under a unique
+    #  name next to the specified path (which is used as the prefix of the name), and it's deleted right away - it's only
+    #  accessed through the open file and the mapping, which are inherited by the forked processes, so each web index
+    #  (of any process) has its own file, and it's removed from the disk once the web index is released.
+    def __init__(self, file_path: str, web_index_items: List[WebIndexItem], cache_size: int):
+        self._cache_size: int = cache_size
+        self._cache_lock: threading.Lock = threading.Lock()
+        self._cache: collections.OrderedDict = collections.OrderedDict()  # document ID -> (URL, title, content snippet)
+
+        self._hits: int = 0
+        self._misses: int = 0
+
+        self._document_count: int = len(web_index_items)
+        offsets_size = 8 * (DocumentStore._FIELDS_PER_DOCUMENT * self._document_count + 1)
+
+        file_descriptor, temporary_path = tempfile.mkstemp(prefix=os.path.basename(file_path) + ".", dir=(os.path.dirname(file_path) or "."))
+        os.unlink(temporary_path)
+
+        with open(file_descriptor, "w+b") as file:
+            self._write_file(file, web_index_items, offsets_size)
+            self._mapped_file: mmap.mmap = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        self._offsets: memoryview = memoryview(self._mapped_file)[:offsets_size].cast("Q")
+        self._fields: memoryview = memoryview(self._mapped_file)[offsets_size:]
+
+    def _write_file(self, file: BinaryIO, web_index_items: List[WebIndexItem], offsets_size: int) -> None:
+        offsets = array.array("Q", [0])
+
+        # The offsets are known only once all the fields are written, so space is reserved for them.
+        file.seek(offsets_size)
+        for web_index_item in web_index_items:
+            for field in (web_index_item.url, web_index_item.title, web_index_item.content_snippet):
+                encoded_field = field.encode(DocumentStore._STRING_ENCODING, DocumentStore._STRING_ENCODING_ERRORS)
+                offsets.append(offsets[-1] + len(encoded_field))
+                file.write(encoded_field)
+
+        file.seek(0)
+        offsets.tofile(file)
+        file.flush()
+
+    # Returns the URL, title and content snippet of the document.
+    def get_display_fields(self, document_id: int) -> Tuple[str, str, str]:
+        with self._cache_lock:
+            display_fields = self._cache.get(document_id)
+            if display_fields is not None:
+                self._cache.move_to_end(document_id)
+                self._hits += 1
+                return display_fields
+
+            self._misses += 1
+
+        if not (0 <= document_id < self._document_count):
+            raise SpiderimentSearchServerRuntimeError("The document #{} is not in the document store!".format(document_id))
+
+        first_field_index = DocumentStore._FIELDS_PER_DOCUMENT * document_id
+        display_fields = tuple(self._read_field(field_index) for field_index in range(first_field_index, first_field_index + DocumentStore._FIELDS_PER_DOCUMENT))
+
+        if self._cache_size > 0:
+            with self._cache_lock:
+                self._cache[document_id] = display_fields
+                self._cache.move_to_end(document_id)
+                while len(self._cache) > self._cache_size:
+                    self._cache.popitem(last=False)
+
+        return display_fields
+
+    def get_document_count(self) -> int:
+        return self._document_count
+
+    def _read_field(self, field_index: int) -> str:
+        return str(self._fields[self._offsets[field_index]:self._offsets[field_index + 1]], DocumentStore._STRING_ENCODING, DocumentStore._STRING_ENCODING_ERRORS)
+
+    def get_counters(self) -> Dict[str, int]:
+        with self._cache_lock:
+            return {
+                "cached_documents": len(self._cache),
+                "hits": self._hits,
+                "misses": self._misses
+            }
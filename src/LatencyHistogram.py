@@ -0,0 +1,91 @@
+# SPDX-License-Identifier: BSD-3-Clause
+#
+# Copyright (c) 2021 Vít Labuda. All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without modification, are permitted provided that the
+# following conditions are met:
+#  1. Redistributions of source code must retain the above copyright notice, this list of conditions and the following
+#     disclaimer.
+#  2. Redistributions in binary form must reproduce the above copyright notice, this list of conditions and the
+#     following disclaimer in the documentation and/or other materials provided with the distribution.
+#  3. Neither the name of the copyright holder nor the names of its contributors may be used to endorse or promote
+#     products derived from this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES,
+# INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+# SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+# SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY,
+# WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+
+from typing import List, Dict, Any, Tuple
+import bisect
+import threading
+
+
+# Counts the recorded durations in fixed, exponentially growing buckets, so recording a duration is cheap (a binary
+#  search and an increment) and doesn't allocate anything, no matter how many durations are recorded. The percentiles
+#  are therefore only approximate - each of them is reported as the upper bound of the bucket it falls into.
+class LatencyHistogram:
+    # The upper bounds of the buckets in seconds: 10 µs, 20 µs, 40 µs, ..., ~21 s; the durations exceeding the last
+    #  bound are counted in an extra overflow bucket.
+    BUCKET_UPPER_BOUNDS: Tuple[float, ...] = tuple(0.00001 * (2 ** bucket_index) for bucket_index in range(22))
+
+    _REPORTED_PERCENTILES: Tuple[Tuple[str, float], ...] = (("p50", 0.50), ("p95", 0.95), ("p99", 0.99), ("p999", 0.999))
+
+    def __init__(self):
+        self._lock: threading.Lock = threading.Lock()
+        self._bucket_counts: List[int] = [0] * (len(LatencyHistogram.BUCKET_UPPER_BOUNDS) + 1)
+        self._count: int = 0
+        self._sum: float = 0.0  # in seconds
+        self._max: float = 0.0  # in seconds
+
+    def record(self, duration: float) -> None:
+        bucket_index = bisect.bisect_left(LatencyHistogram.BUCKET_UPPER_BOUNDS, duration)
+
+        with self._lock:
+            self._bucket_counts[bucket_index] += 1
+            self._count += 1
+            self._sum += duration
+            if duration > self._max:
+                self._max = duration
+
+    def to_json_object(self) -> Dict[str, Any]:
+        with self._lock:
+            bucket_counts, count, sum_, max_ = list(self._bucket_counts), self._count, self._sum, self._max
+
+        json_object = {
+            "count": count,
+            "sum": sum_,
+            "average": (sum_ / count if count > 0 else 0.0),
+            "max": max_
+        }
+        for percentile_name, percentile in LatencyHistogram._REPORTED_PERCENTILES:
+            json_object[percentile_name] = LatencyHistogram._estimate_percentile(bucket_counts, count, percentile, max_)
+
+        # The upper bounds are the same for all the histograms, so the client can pair them with the counts by their
+        #  position; the last count belongs to the overflow bucket.
+        json_object["bucket_upper_bounds"] = list(LatencyHistogram.BUCKET_UPPER_BOUNDS)
+        json_object["bucket_counts"] = bucket_counts
+
+        return json_object
+
+    @staticmethod
+    def _estimate_percentile(bucket_counts: List[int], count: int, percentile: float, max_: float) -> float:
+        if count == 0:
+            return 0.0
+
+        rank = percentile * count
+        cumulative_count = 0
+        for bucket_index, bucket_count in enumerate(bucket_counts):
+            cumulative_count += bucket_count
+            if cumulative_count >= rank:
+                break
+
+        # No recorded duration exceeds the maximum, which is also the only known bound of the overflow bucket.
+        if bucket_index == len(LatencyHistogram.BUCKET_UPPER_BOUNDS):
+            return max_
+
+        return min(LatencyHistogram.BUCKET_UPPER_BOUNDS[bucket_index], max_)
@@ -0,0 +1,108 @@
+# SPDX-License-Identifier: BSD-3-Clause
+#
+# Copyright (c) 2021 Vít Labuda. All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without modification, are permitted provided that the
+# following conditions are met:
+#  1. Redistributions of source code must retain the above copyright notice, this list of conditions and the following
+#     disclaimer.
+#  2. Redistributions in binary form must reproduce the above copyright notice, this list of conditions and the
+#     following disclaimer in the documentation and/or other materials provided with the distribution.
+#  3. Neither the name of the copyright holder nor the names of its contributors may be used to endorse or promote
+#     products derived from this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES,
+# INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+# SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+# SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY,
+# WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+
+from typing import Tuple, Union
+import gc
+import time
+import socket
+import threading
+from msgess.msgess import MsgESS
+
+
+# Measures how long it takes to receive a JSON object message of various sizes over a Unix socket pair, both with the
+#  current receive path of MsgESS and with the previous one (which concatenated the received chunks and collected
+#  the garbage after each compressed message). The messages are sent both uncompressed and compressed, since the
+#  garbage collection only affected the compressed ones.
+class MsgESSBenchmark:
+    # (message size in bytes, number of messages)
+    _MESSAGE_SIZES: Tuple[Tuple[int, int], ...] = (
+        (1000, 5000),
+        (1000000, 20),
+        (25000000, 2)
+    )
+
+    class _LegacyMsgESS(MsgESS):
+        def _receive_message(self, data_type: int) -> Tuple[Union[bytes, memoryview], int]:
+            header = self._receive_n_bytes_legacy(25)
+            message_length, message_class, is_message_compressed = self._parse_message_header(header, data_type, self._max_message_size)
+
+            message = self._receive_n_bytes_legacy(message_length)
+            if is_message_compressed:
+                message = self._unpack_message_body(memoryview(message), True)
+                gc.collect()
+
+            if self._receive_n_bytes_legacy(9) != self._FOOTER_MAGIC:
+                raise MsgESS.MsgESSException("The received message has an invalid magic footer string!")
+
+            return message, message_class
+
+        def _receive_n_bytes_legacy(self, n: int) -> bytes:
+            bytes_left = n
+            data = bytes()
+
+            while bytes_left > 0:
+                current_data = self._socket.recv(min(16384, bytes_left))
+                if not current_data:
+                    raise MsgESS.MsgESSException("The connection is dead.")
+
+                data += current_data
+                bytes_left -= len(current_data)
+
+            return data
+
+    def run(self) -> None:
+        print("{:>12} {:>10} {:>10} {:>16} {:>16} {:>9}".format("message size", "compressed", "messages", "legacy [ms/msg]", "current [ms/msg]", "speedup"))
+
+        for compress_messages in (False, True):
+            for message_size, message_count in MsgESSBenchmark._MESSAGE_SIZES:
+                legacy_time = self._measure(MsgESSBenchmark._LegacyMsgESS, message_size, message_count, compress_messages)
+                current_time = self._measure(MsgESS, message_size, message_count, compress_messages)
+
+                print("{:>12} {:>10} {:>10} {:>16.3f} {:>16.3f} {:>8.1f}x".format(message_size, ("yes" if compress_messages else "no"), message_count, legacy_time * 1000, current_time * 1000, legacy_time / current_time))
+
+    # Returns the average time it took to receive a message.
+    def _measure(self, receiver_class: type, message_size: int, message_count: int, compress_messages: bool) -> float:
+        # The JSON object's serialized size is exactly the message size.
+        json_object = {"data": "x" * (message_size - len('{"data": ""}'))}
+
+        sender_socket, receiver_socket = socket.socketpair()
+        sender = MsgESS(sender_socket)
+        sender.set_compress_messages(compress_messages)
+        receiver = receiver_class(receiver_socket)
+
+        sender_thread = threading.Thread(target=self._send_messages, args=(sender, json_object, message_count))
+        sender_thread.start()
+
+        start_time = time.perf_counter()
+        for _ in range(message_count):
+            receiver.receive_json_object()
+        total_time = time.perf_counter() - start_time
+
+        sender_thread.join()
+        sender_socket.close()
+        receiver_socket.close()
+
+        return total_time / message_count
+
+    def _send_messages(self, sender: MsgESS, json_object: dict, message_count: int) -> None:
+        for _ in range(message_count):
+            sender.send_json_object(json_object, 1)
@@ -0,0 +1,95 @@
+# SPDX-License-Identifier: BSD-3-Clause
+#
+# Copyright (c) 2021 Vít Labuda. All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without modification, are permitted provided that the
+# following conditions are met:
+#  1. Redistributions of source code must retain the above copyright notice, this list of conditions and the following
+#     disclaimer.
+#  2. Redistributions in binary form must reproduce the above copyright notice, this list of conditions and the
+#     following disclaimer in the documentation and/or other materials provided with the distribution.
+#  3. Neither the name of the copyright holder nor the names of its contributors may be used to endorse or promote
+#     products derived from this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES,
+# INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+# SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+# SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY,
+# WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+
+from __future__ import annotations
+from typing import Optional, Iterator
+import threading
+import contextlib
+
+
+class ProcessMemoryUsage:
+    class RssSample:
+        def __init__(self, initial_rss: Optional[int]):
+            # The largest resident set size observed so far, or None if it cannot be determined.
+            self.peak_rss: Optional[int] = initial_rss
+
+    # The memory usage of the current process (or of another process, if its PID is specified) is read from the Linux
+    #  procfs.
+    _PROC_STATUS_PATH: str = "/proc/{}/status"
+
+    # How often (in seconds) the resident set size is read by sample_peak_rss(); a shorter-lived peak may be missed.
+    _RSS_SAMPLING_INTERVAL: float = 0.01
+
+    # Returns the current resident set size of the process in bytes, or None if it cannot be determined.
+    @staticmethod
+    def get_current_rss(pid: Optional[int] = None) -> Optional[int]:
+        return ProcessMemoryUsage._read_status_value("VmRSS", pid)
+
+    # Returns the peak resident set size of the process since it has started in bytes, or None if it cannot be
+    #  determined.
+    @staticmethod
+    def get_peak_rss(pid: Optional[int] = None) -> Optional[int]:
+        return ProcessMemoryUsage._read_status_value("VmHWM", pid)
+
+    # Samples the resident set size of the current process in a background thread while the context is active, so that
+    #  the peak memory usage of a part of the program can be measured; the kernel's own peak (see get_peak_rss()) could
+    #  only be measured that way by resetting it, which would falsify it for everyone else reading it (e.g. the stats).
+    @staticmethod
+    @contextlib.contextmanager
+    def sample_peak_rss() -> Iterator[ProcessMemoryUsage.RssSample]:
+        sample = ProcessMemoryUsage.RssSample(ProcessMemoryUsage.get_current_rss())
+        if sample.peak_rss is None:
+            yield sample
+            return
+
+        stop_event = threading.Event()
+
+        def sample_rss() -> None:
+            while not stop_event.wait(ProcessMemoryUsage._RSS_SAMPLING_INTERVAL):
+                ProcessMemoryUsage._update_peak_rss(sample)
+
+        sampling_thread = threading.Thread(target=sample_rss, daemon=True)
+        sampling_thread.start()
+        try:
+            yield sample
+        finally:
+            stop_event.set()
+            sampling_thread.join()
+            ProcessMemoryUsage._update_peak_rss(sample)
+
+    @staticmethod
+    def _update_peak_rss(sample: ProcessMemoryUsage.RssSample) -> None:
+        current_rss = ProcessMemoryUsage.get_current_rss()
+        if (current_rss is not None) and ((sample.peak_rss is None) or (current_rss > sample.peak_rss)):
+            sample.peak_rss = current_rss
+
+    @staticmethod
+    def _read_status_value(key: str, pid: Optional[int]) -> Optional[int]:
+        try:
+            with open(ProcessMemoryUsage._PROC_STATUS_PATH.format("self" if pid is None else pid)) as file:
+                for line in file:
+                    if line.startswith(key + ":"):
+                        return int(line.split()[1]) * 1024  # The values are in kB
+        except (OSError, ValueError, IndexError):
+            pass
+
+        return None
@@ -0,0 +1,138 @@
+# SPDX-License-Identifier: BSD-3-Clause
+#
+# Copyright (c) 2021 Vít Labuda. All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without modification, are permitted provided that the
+# following conditions are met:
+#  1. Redistributions of source code must retain the above copyright notice, this list of conditions and the following
+#     disclaimer.
+#  2. Redistributions in binary form must reproduce the above copyright notice, this list of conditions and the
+#     following disclaimer in the documentation and/or other materials provided with the distribution.
+#  3. Neither the name of the copyright holder nor the names of its contributors may be used to endorse or promote
+#     products derived from this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES,
+# INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+# SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+# SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY,
+# WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+
+from __future__ import annotations
+from typing import List, Tuple, Optional, Dict
+import time
+import secrets
+import threading
+import collections
+
+
+# Stores the ranked results of searches under opaque cursors, so the subsequent pages of the results can be sliced
+#  from them instead of searching again. A cursor expires once it hasn't been used for the specified time; if the
+#  total number of stored results exceeds the capacity, the least recently used cursors are discarded.
+class ResultCursorStore:
+    class _Cursor:
+        def __init__(self, canonical_search_query: str, use_quotient_based_scoring: bool, term_mode: Optional[str], ranked_documents: Tuple[Tuple[int, float], ...], expiration_time: float):
+            self.canonical_search_query: str = canonical_search_query
+            self.use_quotient_based_scoring: bool = use_quotient_based_scoring
+            self.term_mode: Optional[str] = term_mode
+            self.ranked_documents: Tuple[Tuple[int, float], ...] = ranked_documents
+            self.expiration_time: float = expiration_time
+
+    def __init__(self, time_to_live: float, max_results_per_cursor: int, capacity: int):
+        self._time_to_live: float = time_to_live
+        self._max_results_per_cursor: int = max_results_per_cursor
+        self._capacity: int = capacity  # in results
+
+        self._lock: threading.Lock = threading.Lock()
+
+        # cursor -> ResultCursorStore._Cursor; the cursors are ordered from the least recently used one to the most
+        #  recently used one, so they are also ordered by their expiration time.
+        self._cursors: collections.OrderedDict = collections.OrderedDict()
+        self._stored_results: int = 0
+
+        # The stored results are valid only for the web index generation they were searched for.
+        self._generation_number: int = 0
+
+        self._created_cursors: int = 0
+        self._hits: int = 0
+        self._misses: int = 0
+        self._evictions: int = 0
+        self._expirations: int = 0
+
+    def get_max_results_per_cursor(self) -> int:
+        return self._max_results_per_cursor
+
+    # Returns None if the results couldn't be stored, because they were searched for in an older generation.
+    def create(self, generation_number: int, canonical_search_query: str, use_quotient_based_scoring: bool, term_mode: Optional[str], ranked_documents: List[Tuple[int, float]]) -> Optional[str]:
+        cursor_id = secrets.token_urlsafe(16)
+        cursor = ResultCursorStore._Cursor(canonical_search_query, use_quotient_based_scoring, term_mode, tuple(ranked_documents), time.monotonic() + self._time_to_live)
+
+        with self._lock:
+            self._check_generation_number(generation_number)
+            if generation_number != self._generation_number:
+                return None
+
+            self._cursors[cursor_id] = cursor
+            self._stored_results += len(cursor.ranked_documents)
+            self._created_cursors += 1
+
+            self._discard_expired_cursors()
+            while self._stored_results > self._capacity and len(self._cursors) > 1:
+                self._discard_cursor(next(iter(self._cursors)))
+                self._evictions += 1
+
+        return cursor_id
+
+    # Returns None if the cursor doesn't exist (anymore), or if it belongs to a different search.
+    def get(self, cursor_id: str, generation_number: int, canonical_search_query: str, use_quotient_based_scoring: bool, term_mode: Optional[str]) -> Optional[Tuple[Tuple[int, float], ...]]:
+        with self._lock:
+            self._check_generation_number(generation_number)
+            self._discard_expired_cursors()
+
+            cursor = self._cursors.get(cursor_id)
+            if (cursor is None) or (generation_number != self._generation_number) or (cursor.canonical_search_query != canonical_search_query) or (cursor.use_quotient_based_scoring != use_quotient_based_scoring) or (cursor.term_mode != term_mode):
+                self._misses += 1
+                return None
+
+            cursor.expiration_time = time.monotonic() + self._time_to_live
+            self._cursors.move_to_end(cursor_id)
+            self._hits += 1
+
+            return cursor.ranked_documents
+
+    def _check_generation_number(self, generation_number: int) -> None:
+        if generation_number <= self._generation_number:
+            return
+
+        self._cursors.clear()
+        self._stored_results = 0
+        self._generation_number = generation_number
+
+    def _discard_expired_cursors(self) -> None:
+        current_time = time.monotonic()
+
+        while self._cursors:
+            cursor_id, cursor = next(iter(self._cursors.items()))
+            if cursor.expiration_time > current_time:
+                break
+
+            self._discard_cursor(cursor_id)
+            self._expirations += 1
+
+    def _discard_cursor(self, cursor_id: str) -> None:
+        cursor = self._cursors.pop(cursor_id)
+        self._stored_results -= len(cursor.ranked_documents)
+
+    def get_counters(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "cursors": len(self._cursors),
+                "stored_results": self._stored_results,
+                "created_cursors": self._created_cursors,
+                "hits": self._hits,
+                "misses": self._misses,
+                "evictions": self._evictions,
+                "expirations": self._expirations
+            }
@@ -0,0 +1,147 @@
+# SPDX-License-Identifier: BSD-3-Clause
+#
+# Copyright (c) 2021 Vít Labuda. All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without modification, are permitted provided that the
+# following conditions are met:
+#  1. Redistributions of source code must retain the above copyright notice, this list of conditions and the following
+#     disclaimer.
+#  2. Redistributions in binary form must reproduce the above copyright notice, this list of conditions and the
+#     following disclaimer in the documentation and/or other materials provided with the distribution.
+#  3. Neither the name of the copyright holder nor the names of its contributors may be used to endorse or promote
+#     products derived from this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES,
+# INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+# SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+# SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY,
+# WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+
+from __future__ import annotations
+from typing import List, Sequence, Tuple, Iterable, Optional
+import copy
+import array
+import heapq
+from Settings import Settings
+from WebIndexItem import WebIndexItem
+
+
+class ScoreUpperBounds:
+    # The bounds are inflated by this relative margin, so the rounding errors made while summing up the field scores
+    #  can never make a document's real score exceed its bound.
+    _ROUNDING_ERROR_MARGIN: float = 1e-9
+
+    def __init__(self, web_index_items: List[WebIndexItem]):
+        # A search query of length N can occur at most floor(L / N) times (str.count() counts non-overlapping
+        #  occurrences) in a field of length L, which means that:
+        #  - the occurrence-based score of a field is at most L * coefficient / N,
+        #  - the quotient-based score of a non-empty field is at most coefficient / N.
+        # Therefore, the sums of these numerators are precomputed for each document, and only divided by the query's
+        #  length when a search is performed.
+        self._occurrence_bound_numerators: array.array = array.array("d")
+        self._quotient_bound_numerators: array.array = array.array("d")
+
+        for web_index_item in web_index_items:
+            self._append_bound_numerators(web_index_item)
+
+        # The order of the bounds doesn't depend on the query, so the order of all the documents can be precomputed. The
+        #  documents added by the updates are kept in a separate order (see create_updated()).
+        self._occurrence_bound_order: array.array = self._get_descending_bound_order(range(len(web_index_items)), self._occurrence_bound_numerators)
+        self._quotient_bound_order: array.array = self._get_descending_bound_order(range(len(web_index_items)), self._quotient_bound_numerators)
+        self._added_occurrence_bound_order: array.array = array.array("I")
+        self._added_quotient_bound_order: array.array = array.array("I")
+
+        # The documents removed by the updates are skipped when the orders are iterated (see WebIndex).
+        self._live_document_count: int = len(web_index_items)
+        self._removed_document_flags: Optional[bytearray] = None
+
+    def _append_bound_numerators(self, web_index_item: WebIndexItem) -> None:
+        occurrence_bound_numerator, quotient_bound_numerator = 0.0, 0.0
+
+        for length, coefficient in self._get_field_lengths_and_coefficients(web_index_item):
+            if length > 0 and coefficient > 0:
+                occurrence_bound_numerator += length * coefficient
+                quotient_bound_numerator += coefficient
+
+        self._occurrence_bound_numerators.append(occurrence_bound_numerator)
+        self._quotient_bound_numerators.append(quotient_bound_numerator)
+
+    # Returns the bounds of the web index with the specified documents added to it (with consecutive IDs following the
+    #  existing ones) and removed from it (see WebIndex.create_updated_index()). The bound numerators are only appended
+    #  to, like the web index items, and the precomputed order of the documents loaded with the web index is shared;
+    #  only the order of the documents added since then is merged with the new ones, so an update doesn't have to sort
+    #  the whole web index again.
+    def create_updated(self, added_web_index_items: List[WebIndexItem], live_document_count: int, removed_document_flags: Optional[bytearray]) -> ScoreUpperBounds:
+        first_added_document_id = len(self._occurrence_bound_numerators)
+        for web_index_item in added_web_index_items:
+            self._append_bound_numerators(web_index_item)
+        added_document_ids = range(first_added_document_id, len(self._occurrence_bound_numerators))
+
+        updated_bounds = copy.copy(self)
+        updated_bounds._added_occurrence_bound_order = self._merge_into_bound_order(self._added_occurrence_bound_order, added_document_ids, self._occurrence_bound_numerators)
+        updated_bounds._added_quotient_bound_order = self._merge_into_bound_order(self._added_quotient_bound_order, added_document_ids, self._quotient_bound_numerators)
+        updated_bounds._live_document_count = live_document_count
+        updated_bounds._removed_document_flags = removed_document_flags
+
+        return updated_bounds
+
+    def _merge_into_bound_order(self, bound_order: array.array, document_ids: Iterable[int], bound_numerators: array.array) -> array.array:
+        # The merge is stable and the added documents have higher IDs than all the other ones, so the documents with the
+        #  same bound stay ordered by their IDs.
+        return array.array("I", heapq.merge(bound_order, self._get_descending_bound_order(document_ids, bound_numerators), key=bound_numerators.__getitem__, reverse=True))
+
+    def _get_descending_bound_order(self, document_ids: Iterable[int], bound_numerators: array.array) -> array.array:
+        return array.array("I", sorted(document_ids, key=bound_numerators.__getitem__, reverse=True))
+
+    def _get_field_lengths_and_coefficients(self, web_index_item: WebIndexItem) -> List[Tuple[int, float]]:
+        fields = [
+            (len(web_index_item.url_lc), Settings.SCORE_URL),
+            (len(web_index_item.title_lc), Settings.SCORE_TITLE),
+            (len(web_index_item.description_lc), Settings.SCORE_DESCRIPTION),
+            (len(web_index_item.keywords_lc), Settings.SCORE_KEYWORD),
+            (len(web_index_item.author_lc), Settings.SCORE_AUTHOR),
+            (len(web_index_item.content_snippet_lc), web_index_item.content_snippet_quality * Settings.SCORE_CONTENT_SNIPPET),
+            (len(web_index_item.image_alts_lc), Settings.SCORE_IMAGE_ALT),
+            (len(web_index_item.link_texts_lc), Settings.SCORE_LINK_TEXT),
+        ]
+        fields += [(len(heading_text_lc), Settings.SCORE_HEADING / heading_level) for heading_level, heading_text_lc in web_index_item.get_headings_lc()]
+
+        return fields
+
+    # Returns the per-document numbers which have to be multiplied by the factor returned by get_bound_factor() to get
+    #  the documents' score upper bounds.
+    def get_bound_numerators(self, use_quotient_based_scoring: bool) -> array.array:
+        return (self._quotient_bound_numerators if use_quotient_based_scoring else self._occurrence_bound_numerators)
+
+    # Returns the specified document IDs sorted by their score upper bounds in descending order.
+    def sort_by_bounds(self, document_ids: Sequence[int], use_quotient_based_scoring: bool) -> Iterable[int]:
+        if use_quotient_based_scoring:
+            bound_order, added_bound_order, bound_numerators = self._quotient_bound_order, self._added_quotient_bound_order, self._quotient_bound_numerators
+        else:
+            bound_order, added_bound_order, bound_numerators = self._occurrence_bound_order, self._added_occurrence_bound_order, self._occurrence_bound_numerators
+
+        # The document IDs are unique, so if there are as many of them as there are (not removed) documents, all the
+        #  documents are requested and the precomputed orders can be used.
+        if len(document_ids) == self._live_document_count:
+            return self._get_all_documents_in_bound_order(bound_order, added_bound_order, bound_numerators)
+
+        return self._get_descending_bound_order(document_ids, bound_numerators)
+
+    # The orders are merged lazily, as the searches usually stop long before they reach their end.
+    def _get_all_documents_in_bound_order(self, bound_order: array.array, added_bound_order: array.array, bound_numerators: array.array) -> Iterable[int]:
+        document_ids = bound_order
+        if added_bound_order:
+            document_ids = heapq.merge(bound_order, added_bound_order, key=bound_numerators.__getitem__, reverse=True)
+
+        removed_document_flags = self._removed_document_flags
+        if removed_document_flags is None:
+            return document_ids
+
+        removed_document_flag_count = len(removed_document_flags)
+        return (document_id for document_id in document_ids if (document_id >= removed_document_flag_count) or not removed_document_flags[document_id])
+
+    def get_bound_factor(self, canonical_search_query: str) -> float:
+        return (1.0 + ScoreUpperBounds._ROUNDING_ERROR_MARGIN) / len(canonical_search_query)
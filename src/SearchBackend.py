@@ -0,0 +1,179 @@
+# SPDX-License-Identifier: BSD-3-Clause
+#
+# Copyright (c) 2021 Vít Labuda. All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without modification, are permitted provided that the
+# following conditions are met:
+#  1. Redistributions of source code must retain the above copyright notice, this list of conditions and the following
+#     disclaimer.
+#  2. Redistributions in binary form must reproduce the above copyright notice, this list of conditions and the
+#     following disclaimer in the documentation and/or other materials provided with the distribution.
+#  3. Neither the name of the copyright holder nor the names of its contributors may be used to endorse or promote
+#     products derived from this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES,
+# INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+# SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+# SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY,
+# WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+
+from __future__ import annotations
+from typing import List, Dict, Any, Optional
+import time
+import socket
+import select
+import threading
+from msgess.msgess import MsgESS
+
+
+# A backend search server the coordinator forwards the searches to (see CoordinatorMessageHandler). The connections to
+#  it are reused by the subsequent requests; each connection is used by a single request at a time.
+class SearchBackend:
+    class Connection:
+        def __init__(self, socket_: socket.socket):
+            self.socket: socket.socket = socket_
+            self.msgess: MsgESS = MsgESS(socket_)
+            self.msgess.set_compress_messages(False)
+
+        def close(self) -> None:
+            try:
+                self.socket.close()
+            except OSError:
+                pass
+
+    def __init__(self, socket_path: str, max_idle_connections: int):
+        self.socket_path: str = socket_path
+        self._max_idle_connections: int = max_idle_connections
+
+        self._lock: threading.Lock = threading.Lock()
+        self._idle_connections: List[SearchBackend.Connection] = []
+
+        self._requests: int = 0
+        self._failed_requests: int = 0  # including the timed out ones
+        self._timed_out_requests: int = 0
+        self._opened_connections: int = 0
+
+    # Sends the message to the backend and returns the connection its response is to be received from (see
+    #  receive_response()), or None if the message couldn't be sent before the deadline (a time.monotonic() value).
+    def send_message(self, json_object: Dict[str, Any], message_class: int, deadline: float) -> Optional[SearchBackend.Connection]:
+        with self._lock:
+            self._requests += 1
+
+        connection = self._get_idle_connection()
+        if connection is not None:
+            try:
+                self._send_message(connection, json_object, message_class, deadline)
+                return connection
+            except (MsgESS.MsgESSException, OSError):
+                # The backend might have closed the idle connection in the meantime; a new connection is tried.
+                connection.close()
+
+        connection = None
+        try:
+            connection = self._open_connection(deadline)
+            self._send_message(connection, json_object, message_class, deadline)
+        except (MsgESS.MsgESSException, OSError):
+            if connection is not None:
+                connection.close()
+            self._on_request_failed(deadline)
+            return None
+
+        return connection
+
+    # Returns the response to the message sent over the connection, or None if it hasn't been received before the
+    #  deadline, or if it isn't of the expected class. The connection can't be used afterwards.
+    def receive_response(self, connection: SearchBackend.Connection, expected_message_class: int, deadline: float) -> Optional[Dict[str, Any]]:
+        try:
+            connection.socket.settimeout(self._get_remaining_time(deadline))
+            json_object, message_class = connection.msgess.receive_json_object()
+        except (MsgESS.MsgESSException, OSError):
+            connection.close()
+            self._on_request_failed(deadline)
+            return None
+
+        # A response of an unexpected class (e.g. an OverloadedResponse) doesn't break the connection.
+        self._put_idle_connection(connection)
+
+        if message_class != expected_message_class:
+            self._on_request_failed(deadline)
+            return None
+
+        return json_object
+
+    def _send_message(self, connection: SearchBackend.Connection, json_object: Dict[str, Any], message_class: int, deadline: float) -> None:
+        connection.socket.settimeout(self._get_remaining_time(deadline))
+        connection.msgess.send_json_object(json_object, message_class)
+
+    def _open_connection(self, deadline: float) -> SearchBackend.Connection:
+        socket_ = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            socket_.settimeout(self._get_remaining_time(deadline))
+            socket_.connect(self.socket_path)
+        except OSError:
+            socket_.close()
+            raise
+
+        with self._lock:
+            self._opened_connections += 1
+
+        return SearchBackend.Connection(socket_)
+
+    # Raises socket.timeout if the deadline has already passed.
+    def _get_remaining_time(self, deadline: float) -> float:
+        remaining_time = deadline - time.monotonic()
+        if remaining_time <= 0:
+            raise socket.timeout("The deadline has passed!")
+
+        return remaining_time
+
+    def _get_idle_connection(self) -> Optional[SearchBackend.Connection]:
+        while True:
+            with self._lock:
+                if not self._idle_connections:
+                    return None
+                connection = self._idle_connections.pop()
+
+            # An idle connection shouldn't have anything to read; if it has, the backend has closed it (e.g. because of
+            #  its idle timeout). poll() is used, since select() cannot handle file descriptors above FD_SETSIZE (1024),
+            #  which a coordinator with many clients and backends easily gets.
+            poller = select.poll()
+            poller.register(connection.socket, select.POLLIN)
+            if not poller.poll(0):
+                return connection
+
+            connection.close()
+
+    def _put_idle_connection(self, connection: SearchBackend.Connection) -> None:
+        with self._lock:
+            if len(self._idle_connections) < self._max_idle_connections:
+                self._idle_connections.append(connection)
+                return
+
+        connection.close()
+
+    def _on_request_failed(self, deadline: float) -> None:
+        with self._lock:
+            self._failed_requests += 1
+            if time.monotonic() >= deadline:
+                self._timed_out_requests += 1
+
+    def get_counters(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "socket_path": self.socket_path,
+                "requests": self._requests,
+                "failed_requests": self._failed_requests,
+                "timed_out_requests": self._timed_out_requests,
+                "opened_connections": self._opened_connections,
+                "idle_connections": len(self._idle_connections)
+            }
+
+    def close(self) -> None:
+        with self._lock:
+            idle_connections, self._idle_connections = self._idle_connections, []
+
+        for connection in idle_connections:
+            connection.close()
@@ -0,0 +1,130 @@
+# SPDX-License-Identifier: BSD-3-Clause
+#
+# Copyright (c) 2021 Vít Labuda. All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without modification, are permitted provided that the
+# following conditions are met:
+#  1. Redistributions of source code must retain the above copyright notice, this list of conditions and the following
+#     disclaimer.
+#  2. Redistributions in binary form must reproduce the above copyright notice, this list of conditions and the
+#     following disclaimer in the documentation and/or other materials provided with the distribution.
+#  3. Neither the name of the copyright holder nor the names of its contributors may be used to endorse or promote
+#     products derived from this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES,
+# INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+# SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+# SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY,
+# WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+
+from __future__ import annotations
+from typing import List, Dict, Any, Optional
+import time
+import socket
+import threading
+from msgess.msgess import MsgESS
+from ClientRequest import ClientRequest
+from ClientResponse import ClientResponse
+from OverloadedResponse import OverloadedResponse
+
+
+# Replays a mix of search requests against the server over a number of concurrent persistent connections, and measures
+#  the latency of each request (from sending the request to receiving the whole response).
+class SearchLoadGenerator:
+    # Once a connection fails, it is reestablished after this delay (in seconds).
+    _RECONNECT_DELAY: float = 0.1
+
+    class Result:
+        def __init__(self):
+            self.latencies: List[float] = []  # in seconds; only the successful requests are measured
+            self.overloaded_responses: int = 0
+            self.errors: int = 0
+            self.duration: float = 0.0  # in seconds
+
+        def merge(self, other: SearchLoadGenerator.Result) -> None:
+            self.latencies += other.latencies
+            self.overloaded_responses += other.overloaded_responses
+            self.errors += other.errors
+
+    def __init__(self, socket_path: str, request_objects: List[Dict[str, Any]], concurrency: int):
+        self._socket_path: str = socket_path
+        self._request_objects: List[Dict[str, Any]] = request_objects
+        self._concurrency: int = concurrency
+
+    # The requests are sent in the order in which they were specified (each connection starts at a different position
+    #  in the list); the requests which are sent before the warm-up ends are not measured.
+    def run(self, warm_up_duration: float, measurement_duration: float) -> SearchLoadGenerator.Result:
+        measurement_start_time = time.perf_counter() + warm_up_duration
+        measurement_end_time = measurement_start_time + measurement_duration
+
+        connection_results = [SearchLoadGenerator.Result() for _ in range(self._concurrency)]
+        threads = [
+            threading.Thread(target=self._connection_thread_main, args=(connection_number, connection_result, measurement_start_time, measurement_end_time), daemon=True)
+            for connection_number, connection_result in enumerate(connection_results)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        result = SearchLoadGenerator.Result()
+        for connection_result in connection_results:
+            result.merge(connection_result)
+        result.duration = measurement_duration
+
+        return result
+
+    def _connection_thread_main(self, connection_number: int, result: SearchLoadGenerator.Result, measurement_start_time: float, measurement_end_time: float) -> None:
+        request_index = (connection_number * len(self._request_objects)) // self._concurrency
+        msgess = None
+
+        while time.perf_counter() < measurement_end_time:
+            try:
+                if msgess is None:
+                    msgess = self._connect()
+
+                request_object = self._request_objects[request_index % len(self._request_objects)]
+                request_index += 1
+
+                start_time = time.perf_counter()
+                msgess.send_json_object(request_object, ClientRequest.MESSAGE_CLASS)
+                _, message_class = msgess.receive_json_object()
+                end_time = time.perf_counter()
+
+            except (OSError, MsgESS.MsgESSException):
+                if time.perf_counter() >= measurement_start_time:
+                    result.errors += 1
+
+                self._disconnect(msgess)
+                msgess = None
+                time.sleep(SearchLoadGenerator._RECONNECT_DELAY)
+                continue
+
+            if start_time < measurement_start_time or end_time > measurement_end_time:
+                continue
+
+            if message_class == ClientResponse.MESSAGE_CLASS:
+                result.latencies.append(end_time - start_time)
+            elif message_class == OverloadedResponse.MESSAGE_CLASS:
+                result.overloaded_responses += 1
+            else:
+                result.errors += 1
+
+        self._disconnect(msgess)
+
+    def _connect(self) -> MsgESS:
+        socket_ = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            socket_.connect(self._socket_path)
+        except OSError:
+            socket_.close()
+            raise
+
+        return MsgESS(socket_)
+
+    def _disconnect(self, msgess: Optional[MsgESS]) -> None:
+        if msgess is not None:
+            msgess.get_socket().close()
@@ -20,68 +20,224 @@
 # OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
 
 
-from typing import List, Callable
+from typing import List, Sequence, Tuple, Optional, Callable
+import time
+import heapq
 from Settings import Settings
 from WebIndexItem import WebIndexItem
+from WebIndex import WebIndex
 from ClientRequest import ClientRequest
 from SearchResult import SearchResult
+from ServerStatistics import ServerStatistics
 
 
 class SearchPerformer:
-    def __init__(self, web_index: List[WebIndexItem], request: ClientRequest):
-        self._web_index: List[WebIndexItem] = web_index
+    # The deadline of the search is checked once per this number of scored documents, so that reading the clock doesn't
+    #  slow the scoring down.
+    DEADLINE_CHECK_INTERVAL: int = 256
+
+    def __init__(self, web_index: WebIndex, request: ClientRequest, shard: Optional[Tuple[int, int]] = None, server_statistics: Optional[ServerStatistics] = None):
+        self._web_index: WebIndex = web_index
         self._request: ClientRequest = request
 
+        # (shard index, shard count) - if set, only the documents whose ID modulo the shard count is equal to the shard
+        #  index are searched.
+        self._shard: Optional[Tuple[int, int]] = shard
+
+        # If set, the durations of the search's phases are recorded into it.
+        self._server_statistics: Optional[ServerStatistics] = server_statistics
+
+        # The fraction of the candidate documents which have been scored before the search's deadline passed; it is 1.0
+        #  if the search has been finished (including when the rest of the candidates are skipped because they can't
+        #  get into the results).
+        self._scanned_fraction: float = 1.0
+
     def perform_search(self) -> List[SearchResult]:
-        search_results = []
+        return self.make_search_results(self.rank_documents())
+
+    # Returns the (document ID, score) pairs of the search results, ordered by their score in descending order
+    #  (documents with the same score are ordered by their IDs). If the request's deadline passes during the search, the
+    #  best documents found so far are returned (see get_scanned_fraction()).
+    def rank_documents(self) -> List[Tuple[int, float]]:
         if not self._request.canonical_search_query:
-            return search_results  # If the search query is empty, don't return any results
+            return []  # If the search query is empty, don't return any results
+
+        # The term postings index and the columnar scoring engine score and sort the documents at once, so the whole
+        #  ranking is recorded as the score phase. They only process the postings of the query's terms or vectorized
+        #  columns, so they are not interrupted by the deadline.
+        start_time = time.perf_counter()
+        if self._request.term_mode is not None:
+            ranked_documents = self._web_index.term_postings_index.rank_documents(self._request.canonical_search_query, self._request.term_mode == ClientRequest.TERM_MODE_ALL, self._request.use_quotient_based_scoring, self._request.max_results, self._web_index.document_count, (self._web_index.is_document_removed if self._web_index.removed_document_count > 0 else None), self._shard)
+            self._record_latency(ServerStatistics.PHASE_SCORE, start_time)
+            return ranked_documents
+
+        candidate_document_ids = self.get_candidate_document_ids()
+        start_time = self._record_latency(ServerStatistics.PHASE_SCAN, start_time)
+
+        if self._web_index.columnar_scoring_engine is not None:
+            ranked_documents = self._web_index.columnar_scoring_engine.rank_documents(candidate_document_ids, self._request.canonical_search_query, self._request.use_quotient_based_scoring, self._request.max_results)
+            self._record_latency(ServerStatistics.PHASE_SCORE, start_time)
+            return ranked_documents
+
+        return self._rank_documents(candidate_document_ids)
+
+    # Returns 1.0 unless the last ranking has been stopped by the deadline.
+    def get_scanned_fraction(self) -> float:
+        return self._scanned_fraction
+
+    # The SearchResult objects are created only for the documents which are actually returned to the client.
+    def make_search_results(self, ranked_documents: List[Tuple[int, float]]) -> List[SearchResult]:
+        start_time = time.perf_counter()
+        search_results = [self._make_search_result(document_id, score) for document_id, score in ranked_documents]
+        self._record_latency(ServerStatistics.PHASE_FETCH, start_time)
+
+        return search_results
+
+    def get_candidate_document_ids(self) -> Sequence[int]:
+        candidate_document_ids = self._web_index.get_candidate_document_ids(self._request.canonical_search_query)
+        if self._shard is None:
+            return candidate_document_ids
+
+        shard_index, shard_count = self._shard
+        if isinstance(candidate_document_ids, range):
+            return range(shard_index, len(candidate_document_ids), shard_count)
+
+        return [document_id for document_id in candidate_document_ids if document_id % shard_count == shard_index]
+
+    def _rank_documents(self, candidate_document_ids: Sequence[int]) -> List[Tuple[int, float]]:
+        # If there aren't more candidates than requested results, all the candidates passing the minimal score end up
+        #  in the results anyway, so there is nothing to prune.
+        if len(candidate_document_ids) <= self._request.max_results:
+            return self._rank_all_documents(candidate_document_ids)
+
+        return self._rank_top_documents(candidate_document_ids)
+
+    def _rank_all_documents(self, candidate_document_ids: Sequence[int]) -> List[Tuple[int, float]]:
+        web_index_items = self._web_index.items
 
-        for web_index_item in self._web_index:
-            search_result = self._get_search_result(web_index_item)
-            if search_result.score >= Settings.MINIMAL_SCORE:
-                search_results.append(search_result)
+        deadline = self._request.deadline
 
-        search_results.sort(key=lambda item: item.score, reverse=True)
+        start_time = time.perf_counter()
+        ranked_documents = []
+        for position, document_id in enumerate(candidate_document_ids):
+            if (deadline is not None) and (position % SearchPerformer.DEADLINE_CHECK_INTERVAL == 0) and (time.monotonic() >= deadline):
+                self._scanned_fraction = position / len(candidate_document_ids)
+                break
 
-        return search_results[0:self._request.max_results]
+            score = self._compute_score(web_index_items[document_id])
+            if score >= Settings.MINIMAL_SCORE:
+                ranked_documents.append((document_id, score))
+        start_time = self._record_latency(ServerStatistics.PHASE_SCORE, start_time)
 
-    def _get_search_result(self, web_index_item: WebIndexItem) -> SearchResult:
-        search_result = SearchResult(web_index_item)
+        # The candidates are sorted by their IDs, so the stable sort orders the documents with the same score in the
+        #  same way as if the whole web index was scanned.
+        ranked_documents.sort(key=lambda item: item[1], reverse=True)
+        self._record_latency(ServerStatistics.PHASE_SORT, start_time)
 
-        url_lc = web_index_item.url.lower()
-        title_lc = web_index_item.title.lower()
-        content_snippet_lc = web_index_item.content_snippet.lower()
+        return ranked_documents
 
-        if self._request.use_quotient_based_scoring:
+    def _rank_top_documents(self, candidate_document_ids: Sequence[int]) -> List[Tuple[int, float]]:
+        start_time = time.perf_counter()
+        web_index_items = self._web_index.items
+        max_results = self._request.max_results
+        bound_numerators = self._web_index.score_upper_bounds.get_bound_numerators(self._request.use_quotient_based_scoring)
+        bound_factor = self._web_index.score_upper_bounds.get_bound_factor(self._request.canonical_search_query)
+        deadline = self._request.deadline
+
+        # The heap contains (score, -document_id) tuples of the best documents found so far, with the worst one at the
+        #  top, so the ordering of the final results doesn't depend on the order in which the documents are scored -
+        #  the documents with the same score are ordered by their IDs, the same as if the whole web index was sorted.
+        heap = []
+        threshold = Settings.MINIMAL_SCORE
+
+        # The candidates are scored in descending order of their score upper bounds. Once a document's upper bound
+        #  falls below the current threshold, none of the remaining documents can get into the results. Thanks to this
+        #  order, if the deadline passes, the documents which could score the most have already been scored.
+        for position, document_id in enumerate(self._web_index.score_upper_bounds.sort_by_bounds(candidate_document_ids, self._request.use_quotient_based_scoring)):
+            if bound_numerators[document_id] * bound_factor < threshold:
+                break
+
+            if (deadline is not None) and (position % SearchPerformer.DEADLINE_CHECK_INTERVAL == 0) and (time.monotonic() >= deadline):
+                self._scanned_fraction = position / len(candidate_document_ids)
+                break
+
+            score = self._compute_score(web_index_items[document_id])
+            if score < Settings.MINIMAL_SCORE:
+                continue
+
+            entry = (score, -document_id)
+            if len(heap) < max_results:
+                heapq.heappush(heap, entry)
+            elif entry > heap[0]:
+                heapq.heapreplace(heap, entry)
+            else:
+                continue
+
+            if len(heap) == max_results:
+                threshold = heap[0][0]
+
+        start_time = self._record_latency(ServerStatistics.PHASE_SCORE, start_time)
+
+        heap.sort(reverse=True)
+        ranked_documents = [(-negated_document_id, score) for score, negated_document_id in heap]
+        self._record_latency(ServerStatistics.PHASE_SORT, start_time)
+
+        return ranked_documents
+
+    def _make_search_result(self, document_id: int, score: float) -> SearchResult:
+        search_result = SearchResult(*self._web_index.get_display_fields(document_id))
+        search_result.score = score
+        if self._request.include_document_ids:
+            search_result.document_id = document_id
+
+        return search_result
+
+    # Returns the current time, so the next phase can be measured from it.
+    def _record_latency(self, phase: str, start_time: float) -> float:
+        end_time = time.perf_counter()
+        if self._server_statistics is not None:
+            self._server_statistics.record_latency(phase, end_time - start_time)
+
+        return end_time
+
+    def _compute_score(self, web_index_item: WebIndexItem) -> float:
+        return SearchPerformer.compute_score(web_index_item, self._request.canonical_search_query, self._request.use_quotient_based_scoring)
+
+    @staticmethod
+    def compute_score(web_index_item: WebIndexItem, canonical_search_query: str, use_quotient_based_scoring: bool) -> float:
+        url_lc, title_lc, content_snippet_lc = web_index_item.url_lc, web_index_item.title_lc, web_index_item.content_snippet_lc
+        score = 0.0
+
+        if use_quotient_based_scoring:
             # --- Percentile-based scoring algorithm ---
-            search_result.score += self._zdse(lambda: (url_lc.count(self._request.canonical_search_query) / len(url_lc)) * Settings.SCORE_URL)
-            search_result.score += self._zdse(lambda: (title_lc.count(self._request.canonical_search_query) / len(title_lc)) * Settings.SCORE_TITLE)
-            for heading in web_index_item.headings_lc:  # functools.reduce() could be used here, but the resulting code is very difficult to read
-                search_result.score += self._zdse(lambda: (heading.text_lc.count(self._request.canonical_search_query) / len(heading.text_lc)) * (Settings.SCORE_HEADING / heading.level))
-            search_result.score += self._zdse(lambda: (web_index_item.description_lc.count(self._request.canonical_search_query) / len(web_index_item.description_lc)) * Settings.SCORE_DESCRIPTION)
-            search_result.score += self._zdse(lambda: (web_index_item.keywords_lc.count(self._request.canonical_search_query) / len(web_index_item.keywords_lc)) * Settings.SCORE_KEYWORD)
-            search_result.score += self._zdse(lambda: (web_index_item.author_lc.count(self._request.canonical_search_query) / len(web_index_item.author_lc)) * Settings.SCORE_AUTHOR)
-            search_result.score += self._zdse(lambda: (content_snippet_lc.count(self._request.canonical_search_query) / len(content_snippet_lc)) * web_index_item.content_snippet_quality * Settings.SCORE_CONTENT_SNIPPET)
-            search_result.score += self._zdse(lambda: (web_index_item.image_alts_lc.count(self._request.canonical_search_query) / len(web_index_item.image_alts_lc)) * Settings.SCORE_IMAGE_ALT)
-            search_result.score += self._zdse(lambda: (web_index_item.link_texts_lc.count(self._request.canonical_search_query) / len(web_index_item.link_texts_lc)) * Settings.SCORE_LINK_TEXT)
+            score += SearchPerformer._zdse(lambda: (url_lc.count(canonical_search_query) / len(url_lc)) * Settings.SCORE_URL)
+            score += SearchPerformer._zdse(lambda: (title_lc.count(canonical_search_query) / len(title_lc)) * Settings.SCORE_TITLE)
+            for heading_level, heading_text_lc in web_index_item.get_headings_lc():  # functools.reduce() could be used here, but the resulting code is very difficult to read
+                score += SearchPerformer._zdse(lambda: (heading_text_lc.count(canonical_search_query) / len(heading_text_lc)) * (Settings.SCORE_HEADING / heading_level))
+            score += SearchPerformer._zdse(lambda: (web_index_item.description_lc.count(canonical_search_query) / len(web_index_item.description_lc)) * Settings.SCORE_DESCRIPTION)
+            score += SearchPerformer._zdse(lambda: (web_index_item.keywords_lc.count(canonical_search_query) / len(web_index_item.keywords_lc)) * Settings.SCORE_KEYWORD)
+            score += SearchPerformer._zdse(lambda: (web_index_item.author_lc.count(canonical_search_query) / len(web_index_item.author_lc)) * Settings.SCORE_AUTHOR)
+            score += SearchPerformer._zdse(lambda: (content_snippet_lc.count(canonical_search_query) / len(content_snippet_lc)) * web_index_item.content_snippet_quality * Settings.SCORE_CONTENT_SNIPPET)
+            score += SearchPerformer._zdse(lambda: (web_index_item.image_alts_lc.count(canonical_search_query) / len(web_index_item.image_alts_lc)) * Settings.SCORE_IMAGE_ALT)
+            score += SearchPerformer._zdse(lambda: (web_index_item.link_texts_lc.count(canonical_search_query) / len(web_index_item.link_texts_lc)) * Settings.SCORE_LINK_TEXT)
         else:
             # --- Occurrence-based scoring algorithm ---
-            search_result.score += url_lc.count(self._request.canonical_search_query) * Settings.SCORE_URL
-            search_result.score += title_lc.count(self._request.canonical_search_query) * Settings.SCORE_TITLE
-            for heading in web_index_item.headings_lc:  # functools.reduce() could be used here, but the resulting code is very difficult to read
-                search_result.score += heading.text_lc.count(self._request.canonical_search_query) * (Settings.SCORE_HEADING / heading.level)
-            search_result.score += web_index_item.description_lc.count(self._request.canonical_search_query) * Settings.SCORE_DESCRIPTION
-            search_result.score += web_index_item.keywords_lc.count(self._request.canonical_search_query) * Settings.SCORE_KEYWORD
-            search_result.score += web_index_item.author_lc.count(self._request.canonical_search_query) * Settings.SCORE_AUTHOR
-            search_result.score += content_snippet_lc.count(self._request.canonical_search_query) * web_index_item.content_snippet_quality * Settings.SCORE_CONTENT_SNIPPET
-            search_result.score += web_index_item.image_alts_lc.count(self._request.canonical_search_query) * Settings.SCORE_IMAGE_ALT
-            search_result.score += web_index_item.link_texts_lc.count(self._request.canonical_search_query) * Settings.SCORE_LINK_TEXT
+            score += url_lc.count(canonical_search_query) * Settings.SCORE_URL
+            score += title_lc.count(canonical_search_query) * Settings.SCORE_TITLE
+            for heading_level, heading_text_lc in web_index_item.get_headings_lc():  # functools.reduce() could be used here, but the resulting code is very difficult to read
+                score += heading_text_lc.count(canonical_search_query) * (Settings.SCORE_HEADING / heading_level)
+            score += web_index_item.description_lc.count(canonical_search_query) * Settings.SCORE_DESCRIPTION
+            score += web_index_item.keywords_lc.count(canonical_search_query) * Settings.SCORE_KEYWORD
+            score += web_index_item.author_lc.count(canonical_search_query) * Settings.SCORE_AUTHOR
+            score += content_snippet_lc.count(canonical_search_query) * web_index_item.content_snippet_quality * Settings.SCORE_CONTENT_SNIPPET
+            score += web_index_item.image_alts_lc.count(canonical_search_query) * Settings.SCORE_IMAGE_ALT
+            score += web_index_item.link_texts_lc.count(canonical_search_query) * Settings.SCORE_LINK_TEXT
 
-        return search_result
+        return score
 
     # Zero-division safety ensurer
-    def _zdse(self, f: Callable[[], float]) -> float:
+    @staticmethod
+    def _zdse(f: Callable[[], float]) -> float:
         try:
             return f()
         except ZeroDivisionError:
@@ -20,22 +20,29 @@
 # OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
 
 
-from typing import Dict, Any
-from WebIndexItem import WebIndexItem
+from typing import Dict, Any, Optional
 
 
 class SearchResult:
-    def __init__(self, web_index_item: WebIndexItem):
-        self.url: str = web_index_item.url
-        self.title: str = web_index_item.title
-        self.snippet: str = web_index_item.content_snippet
+    def __init__(self, url: str, title: str, snippet: str):
+        self.url: str = url
+        self.title: str = title
+        self.snippet: str = snippet
 
         self.score: float = 0.0
 
+        # Set only if the client asked for the document IDs (see ClientRequest).
+        self.document_id: Optional[int] = None
+
     def to_response_object(self) -> Dict[str, Any]:
-        return {
+        response_object = {
             "url": self.url,
             "title": self.title,
             "snippet": self.snippet,
             "score": self.score
         }
+
+        if self.document_id is not None:
+            response_object["document_id"] = self.document_id
+
+        return response_object
@@ -0,0 +1,106 @@
+# SPDX-License-Identifier: BSD-3-Clause
+#
+# Copyright (c) 2021 Vít Labuda. All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without modification, are permitted provided that the
+# following conditions are met:
+#  1. Redistributions of source code must retain the above copyright notice, this list of conditions and the following
+#     disclaimer.
+#  2. Redistributions in binary form must reproduce the above copyright notice, this list of conditions and the
+#     following disclaimer in the documentation and/or other materials provided with the distribution.
+#  3. Neither the name of the copyright holder nor the names of its contributors may be used to endorse or promote
+#     products derived from this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES,
+# INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+# SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+# SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY,
+# WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+
+from typing import List, Tuple, Optional, Dict
+import threading
+import collections
+
+
+class SearchResultCache:
+    def __init__(self, max_entries: int, max_results_per_entry: int):
+        self._max_entries: int = max_entries
+        self._max_results_per_entry: int = max_results_per_entry
+
+        self._lock: threading.Lock = threading.Lock()
+
+        # (canonical search query, use quotient-based scoring, term mode) -> the top ranked (document ID, score) pairs; the entries
+        #  are ordered from the least recently used one to the most recently used one.
+        self._entries: collections.OrderedDict = collections.OrderedDict()
+
+        # The cached results are valid only for the web index generation they were searched for.
+        self._generation_number: int = 0
+
+        self._hits: int = 0
+        self._misses: int = 0
+        self._evictions: int = 0
+        self._invalidations: int = 0
+
+    def get_max_results_per_entry(self) -> int:
+        return self._max_results_per_entry
+
+    # Returns None if the results are not cached.
+    def get(self, generation_number: int, canonical_search_query: str, use_quotient_based_scoring: bool, term_mode: Optional[str], max_results: int) -> Optional[List[Tuple[int, float]]]:
+        key = (canonical_search_query, use_quotient_based_scoring, term_mode)
+
+        with self._lock:
+            self._check_generation_number(generation_number)
+
+            ranked_documents = (self._entries.get(key) if generation_number == self._generation_number else None)
+            if ranked_documents is None:
+                self._misses += 1
+                return None
+
+            self._entries.move_to_end(key)
+            self._hits += 1
+
+        # The ranked documents are ordered by (score descending, document ID ascending), so the first results of
+        #  a deeper search are the same as the results of a shallower one.
+        return list(ranked_documents[:max_results])
+
+    # The ranked documents must be the results of a search for exactly max_results_per_entry results.
+    def put(self, generation_number: int, canonical_search_query: str, use_quotient_based_scoring: bool, term_mode: Optional[str], ranked_documents: List[Tuple[int, float]]) -> None:
+        key = (canonical_search_query, use_quotient_based_scoring, term_mode)
+
+        with self._lock:
+            self._check_generation_number(generation_number)
+
+            # The results of a search which was performed in an older generation (while a new one was being published)
+            #  must not be cached.
+            if generation_number != self._generation_number:
+                return
+
+            self._entries[key] = tuple(ranked_documents)
+            self._entries.move_to_end(key)
+
+            while len(self._entries) > self._max_entries:
+                self._entries.popitem(last=False)
+                self._evictions += 1
+
+    def _check_generation_number(self, generation_number: int) -> None:
+        if generation_number <= self._generation_number:
+            return
+
+        if self._generation_number != 0:
+            self._invalidations += 1
+
+        self._entries.clear()
+        self._generation_number = generation_number
+
+    def get_counters(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "hits": self._hits,
+                "misses": self._misses,
+                "evictions": self._evictions,
+                "invalidations": self._invalidations
+            }
@@ -0,0 +1,248 @@
+# SPDX-License-Identifier: BSD-3-Clause
+#
+# Copyright (c) 2021 Vít Labuda. All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without modification, are permitted provided that the
+# following conditions are met:
+#  1. Redistributions of source code must retain the above copyright notice, this list of conditions and the following
+#     disclaimer.
+#  2. Redistributions in binary form must reproduce the above copyright notice, this list of conditions and the
+#     following disclaimer in the documentation and/or other materials provided with the distribution.
+#  3. Neither the name of the copyright holder nor the names of its contributors may be used to endorse or promote
+#     products derived from this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES,
+# INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+# SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+# SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY,
+# WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+
+from typing import List, Dict, Any, Optional, Tuple
+import os
+import json
+import math
+import time
+import signal
+import socket
+import random
+import logging
+import datetime
+import multiprocessing
+from Settings import Settings
+from BenchmarkSettings import BenchmarkSettings
+from SyntheticWebIndexGenerator import SyntheticWebIndexGenerator
+from SearchLoadGenerator import SearchLoadGenerator
+from ProcessMemoryUsage import ProcessMemoryUsage
+from ClientRequest import ClientRequest
+from ClientResponse import ClientResponse
+from SpiderimentSearchServerRuntimeError import SpiderimentSearchServerRuntimeError
+from msgess.msgess import MsgESS
+
+
+# Starts the server (with the settings from the Settings class, except that its search result cache and result
+#  cursors are disabled) in a child process, measures how long it takes to start and how much memory it uses,
+#  benchmarks each scoring mode using the load generator, and writes the results into a JSON file.
+class SearchServerBenchmark:
+    _SERVER_SOCKET_PATH: str = "benchmark_server.sock"
+    _SERVER_DOCUMENT_STORE_FILE_PATH: str = "benchmark_web_index.documents"
+    _SERVER_STOP_TIMEOUT: float = 60.0  # in seconds
+    _READINESS_CHECK_INTERVAL: float = 0.1  # in seconds
+
+    _SCORING_MODES: Dict[str, bool] = {"occurrence_based": False, "quotient_based": True}
+    _LATENCY_PERCENTILES: Dict[str, float] = {"p50": 50.0, "p95": 95.0, "p99": 99.0}
+
+    # The number of most common words of the vocabulary the common words in the generated query mix are picked from.
+    _COMMON_WORD_COUNT: int = 100
+
+    def __init__(self):
+        Settings.enter_working_directory(BenchmarkSettings.WORKING_DIRECTORY)
+
+        self._logger: logging.Logger = Settings.get_logger()
+
+    def run(self) -> None:
+        self._ensure_web_index_exists()
+        queries = self._load_query_mix()
+
+        server_process, startup_time = self._start_server()
+        try:
+            rss_after_startup = ProcessMemoryUsage.get_current_rss(server_process.pid)
+
+            scoring_mode_results = {}
+            for scoring_mode_name, use_quotient_based_scoring in SearchServerBenchmark._SCORING_MODES.items():
+                self._logger.info("Benchmarking the {} scoring ({} connections, {:.0f} seconds)...".format(scoring_mode_name, BenchmarkSettings.CONCURRENCY, BenchmarkSettings.MEASUREMENT_DURATION))
+                scoring_mode_results[scoring_mode_name] = self._benchmark_scoring_mode(queries, use_quotient_based_scoring)
+
+            rss_after_load = ProcessMemoryUsage.get_current_rss(server_process.pid)
+            peak_rss = ProcessMemoryUsage.get_peak_rss(server_process.pid)
+        finally:
+            self._stop_server(server_process)
+
+        results = {
+            "time": datetime.datetime.now().astimezone().isoformat(),
+            "web_index": {
+                "file_path": os.path.abspath(BenchmarkSettings.WEB_INDEX_FILE_PATH),
+                "file_size": os.path.getsize(BenchmarkSettings.WEB_INDEX_FILE_PATH)
+            },
+            "query_count": len(queries),
+            "startup_time": startup_time,
+            # Only the server's main process is measured - the memory of its child processes (if any) isn't included.
+            "rss_after_startup": rss_after_startup,
+            "rss_after_load": rss_after_load,
+            "peak_rss": peak_rss,
+            "scoring_modes": scoring_mode_results,
+            "settings": self._get_settings_values(Settings),
+            "benchmark_settings": self._get_settings_values(BenchmarkSettings)
+        }
+        self._write_results(results)
+
+    def _ensure_web_index_exists(self) -> None:
+        if os.path.exists(BenchmarkSettings.WEB_INDEX_FILE_PATH):
+            return
+
+        self._logger.info("Generating a synthetic web index with {} documents into \"{}\"...".format(BenchmarkSettings.SYNTHETIC_DOCUMENT_COUNT, BenchmarkSettings.WEB_INDEX_FILE_PATH))
+        start_time = time.perf_counter()
+        SyntheticWebIndexGenerator().generate(BenchmarkSettings.WEB_INDEX_FILE_PATH)
+        self._logger.info("The synthetic web index has been generated in {:.1f} seconds.".format(time.perf_counter() - start_time))
+
+    def _load_query_mix(self) -> List[str]:
+        if BenchmarkSettings.QUERY_MIX_FILE_PATH is not None:
+            with open(BenchmarkSettings.QUERY_MIX_FILE_PATH) as file:
+                queries = [line.strip() for line in file if line.strip()]
+
+            if not queries:
+                raise SpiderimentSearchServerRuntimeError("The query mix file \"{}\" doesn't contain any queries!".format(BenchmarkSettings.QUERY_MIX_FILE_PATH))
+
+            return queries
+
+        # The query mix consists of the same number of common words, rare words and two-word phrases of common words.
+        random_ = random.Random(BenchmarkSettings.SYNTHETIC_RANDOM_SEED)
+        vocabulary = SyntheticWebIndexGenerator.generate_vocabulary()
+        common_words = vocabulary[:SearchServerBenchmark._COMMON_WORD_COUNT]
+
+        query_generators = (
+            lambda: random_.choice(common_words),
+            lambda: random_.choice(vocabulary),
+            lambda: "{} {}".format(random_.choice(common_words), random_.choice(common_words))
+        )
+
+        return [query_generators[query_number % len(query_generators)]() for query_number in range(BenchmarkSettings.GENERATED_QUERY_COUNT)]
+
+    def _start_server(self) -> Tuple[multiprocessing.Process, float]:
+        self._logger.info("Starting the server...")
+
+        start_time = time.perf_counter()
+        server_process = multiprocessing.get_context("fork").Process(target=self._server_process_main, name="BenchmarkedServer")
+        server_process.start()
+
+        # The server is considered to be started once it responds to a search request.
+        deadline = start_time + BenchmarkSettings.SERVER_STARTUP_TIMEOUT
+        while not self._is_server_responding():
+            if not server_process.is_alive():
+                raise SpiderimentSearchServerRuntimeError("The benchmarked server has exited while starting!")
+
+            if time.perf_counter() > deadline:
+                self._stop_server(server_process)
+                raise SpiderimentSearchServerRuntimeError("The benchmarked server hasn't started in time!")
+
+            time.sleep(SearchServerBenchmark._READINESS_CHECK_INTERVAL)
+
+        startup_time = time.perf_counter() - start_time
+        self._logger.info("The server has started in {:.1f} seconds.".format(startup_time))
+
+        return server_process, startup_time
+
+    def _server_process_main(self) -> None:
+        from SearchServerMain import SearchServerMain
+
+        # The server's files are located in the benchmark's working directory (which is the current directory). The
+        #  snapshot isn't used, so that the measured startup time always includes the loading of the web index file.
+        Settings.WORKING_DIRECTORY = None
+        Settings.WEB_INDEX_FILE_PATH = BenchmarkSettings.WEB_INDEX_FILE_PATH
+        Settings.WEB_INDEX_SNAPSHOT_FILE_PATH = None
+        Settings.SERVER_SOCKET_PATH = SearchServerBenchmark._SERVER_SOCKET_PATH
+        Settings.DOCUMENT_STORE_FILE_PATH = SearchServerBenchmark._SERVER_DOCUMENT_STORE_FILE_PATH
+
+        # The query mix is replayed over and over, so with the search result cache (or the result cursors) most of the
+        #  measured requests would be served from it, and the benchmark would measure the cache instead of the searches.
+        Settings.SEARCH_RESULT_CACHE_SIZE = 0
+        Settings.RESULT_CURSOR_STORE_CAPACITY = 0
+
+        server = SearchServerMain()
+        server.on_server_start()
+        server.server_loop()
+        server.on_server_exit()
+
+    def _is_server_responding(self) -> bool:
+        try:
+            with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as socket_:
+                socket_.connect(SearchServerBenchmark._SERVER_SOCKET_PATH)
+
+                msgess = MsgESS(socket_)
+                msgess.send_json_object(self._make_request_object("", False), ClientRequest.MESSAGE_CLASS)
+                _, message_class = msgess.receive_json_object()
+        except (OSError, MsgESS.MsgESSException):
+            return False
+
+        return message_class == ClientResponse.MESSAGE_CLASS
+
+    def _stop_server(self, server_process: multiprocessing.Process) -> None:
+        self._logger.info("Stopping the server...")
+
+        if server_process.is_alive():
+            os.kill(server_process.pid, signal.SIGINT)
+
+        server_process.join(SearchServerBenchmark._SERVER_STOP_TIMEOUT)
+        if server_process.is_alive():
+            self._logger.warning("The benchmarked server hasn't exited in time, killing it...")
+            server_process.kill()
+            server_process.join()
+
+    def _benchmark_scoring_mode(self, queries: List[str], use_quotient_based_scoring: bool) -> Dict[str, Any]:
+        request_objects = [self._make_request_object(query, use_quotient_based_scoring) for query in queries]
+        result = SearchLoadGenerator(SearchServerBenchmark._SERVER_SOCKET_PATH, request_objects, BenchmarkSettings.CONCURRENCY).run(BenchmarkSettings.WARM_UP_DURATION, BenchmarkSettings.MEASUREMENT_DURATION)
+
+        latencies = sorted(result.latencies)
+        latency_statistics = {name: self._get_percentile(latencies, percentile) for name, percentile in SearchServerBenchmark._LATENCY_PERCENTILES.items()}
+        latency_statistics["mean"] = ((sum(latencies) / len(latencies)) if latencies else None)
+        latency_statistics["max"] = (latencies[-1] if latencies else None)
+
+        self._logger.info("{:.1f} requests per second; latency p50 {}, p95 {}, p99 {}; {} overloaded responses, {} errors".format(
+            len(latencies) / result.duration, *(self._format_latency(latency_statistics[name]) for name in SearchServerBenchmark._LATENCY_PERCENTILES.keys()), result.overloaded_responses, result.errors
+        ))
+
+        return {
+            "requests": len(latencies),
+            "overloaded_responses": result.overloaded_responses,
+            "errors": result.errors,
+            "duration": result.duration,
+            "qps": len(latencies) / result.duration,
+            "latency": latency_statistics  # in seconds
+        }
+
+    def _make_request_object(self, query: str, use_quotient_based_scoring: bool) -> Dict[str, Any]:
+        return {"search_query": query, "max_results": BenchmarkSettings.MAX_RESULTS, "use_quotient_based_scoring": use_quotient_based_scoring}
+
+    # Uses the nearest-rank method; the latencies must be sorted.
+    def _get_percentile(self, latencies: List[float], percentile: float) -> Optional[float]:
+        if not latencies:
+            return None
+
+        return latencies[max(0, math.ceil(len(latencies) * percentile / 100) - 1)]
+
+    def _format_latency(self, latency: Optional[float]) -> str:
+        return ("n/a" if latency is None else "{:.2f} ms".format(latency * 1000))
+
+    def _get_settings_values(self, settings_class: type) -> Dict[str, Any]:
+        return {name: value for name, value in vars(settings_class).items() if name.isupper() and isinstance(value, (int, float, str, bool, tuple, type(None)))}
+
+    def _write_results(self, results: Dict[str, Any]) -> None:
+        os.makedirs(BenchmarkSettings.RESULTS_DIRECTORY, exist_ok=True)
+
+        results_path = os.path.join(BenchmarkSettings.RESULTS_DIRECTORY, "benchmark_{}.json".format(datetime.datetime.now().strftime("%Y%m%d_%H%M%S")))
+        with open(results_path, "w") as file:
+            json.dump(results, file, indent=4)
+
+        self._logger.info("The results have been written into \"{}\".".format(results_path))
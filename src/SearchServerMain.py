@@ -20,35 +20,67 @@
 # OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
 
 
-from typing import List
+from typing import Optional, Dict, Set, Union, Tuple, Callable, Any
 import gc
 import os
+import time
+import queue
+import signal
+import select
 import logging
 import socket
+import threading
+import concurrent.futures
 from Settings import Settings
-from WebIndexItem import WebIndexItem
+from WebIndex import WebIndex
 from WebIndexLoader import WebIndexLoader
+from WebIndexDeltaUpdater import WebIndexDeltaUpdater
+from WebIndexManager import WebIndexManager
+from ClientMessageHandler import ClientMessageHandler
+from CoordinatorMessageHandler import CoordinatorMessageHandler
+from SearchWorkerPool import SearchWorkerPool
+from ServerStatistics import ServerStatistics
 from ClientHandlerThread import ClientHandlerThread
+from AsyncSearchServer import AsyncSearchServer
 
 
 class SearchServerMain:
     PROGRAM_VERSION: float = 1.1
 
     _LISTEN_BACKLOG: int = 64
+    _WORKER_PROCESS_RESTART_DELAY: float = 1.0  # in seconds
+    _WORKER_PROCESS_STOP_TIMEOUT: float = 30.0  # in seconds; for how long a stopping worker waits for its clients to be handled
+
+    class _StopAcceptingClients(Exception):
+        pass
 
     def __init__(self):
-        self._perform_basic_initialization()
+        Settings.enter_working_directory(Settings.WORKING_DIRECTORY)
 
         self._logger: logging.Logger = Settings.get_logger()
 
-        self._web_index: List[WebIndexItem] = WebIndexLoader(self._logger).load_index()
-        self._server_socket: socket.socket = self._create_server_socket()
+        # In the coordinator mode, the searches are forwarded to the backend servers, so no web index is loaded.
+        self._is_coordinator: bool = (len(Settings.COORDINATOR_BACKEND_SOCKET_PATHS) > 0)
 
-    def _perform_basic_initialization(self) -> None:
-        if Settings.WORKING_DIRECTORY is not None:
-            os.makedirs(Settings.WORKING_DIRECTORY, exist_ok=True)
+        # In the pre-forked mode, the main process keeps the web index, so that it is inherited by the worker processes.
+        #  Otherwise, it is handed over to the web index manager, so that it can be released after a reload.
+        #  The delta file is merged into the web index as it is loaded; the rows appended to it later are applied by the
+        #  updater in the web index manager, unless the server is pre-forked (see Settings.WEB_INDEX_DELTA_FILE_PATH).
+        self._delta_updater: Optional[WebIndexDeltaUpdater] = (WebIndexDeltaUpdater.create_from_settings(self._logger) if not self._is_coordinator else None)
+        self._web_index: Optional[WebIndex] = (WebIndexLoader(self._logger).load_index(self._delta_updater) if not self._is_coordinator else None)
+        self._web_index_generation_number: int = 1
+        self._web_index_manager: Optional[WebIndexManager] = None
+        self._client_message_handler: Optional[Union[ClientMessageHandler, CoordinatorMessageHandler]] = None
+        self._search_worker_pool: Optional[SearchWorkerPool] = None
+        self._server_statistics: Optional[ServerStatistics] = None
 
-            os.chdir(Settings.WORKING_DIRECTORY)
+        # The tasks which the other threads need to be performed by the main thread (see _run_in_main_thread()); the
+        #  main thread is woken up by a byte written to the pipe while it is waiting for clients.
+        self._main_thread_tasks: queue.SimpleQueue = queue.SimpleQueue()
+        self._main_thread_wakeup_pipe: Tuple[int, int] = os.pipe()
+        os.set_blocking(self._main_thread_wakeup_pipe[0], False)
+
+        self._server_socket: socket.socket = self._create_server_socket()
 
     def _create_server_socket(self) -> socket.socket:
         try:
@@ -68,20 +100,257 @@ class SearchServerMain:
 
     def on_server_start(self) -> None:
         self._logger.info("The server has started; listening on Unix socket \"{}\"...".format(Settings.SERVER_SOCKET_PATH))
+        if self._is_coordinator:
+            self._logger.info("The server is running as a coordinator of {} backend servers.".format(len(Settings.COORDINATOR_BACKEND_SOCKET_PATHS)))
 
     def server_loop(self) -> None:
+        if Settings.SERVER_WORKER_PROCESSES > 0:
+            self._supervise_worker_processes()
+            return
+
+        self._initialize_client_handling(delegate_reloads_to_parent_process=False)
+        signal.signal(signal.SIGHUP, self._reload_signal_handler)
+
+        self._serve_clients(stop_signals={signal.SIGINT})
+
+    def _initialize_client_handling(self, delegate_reloads_to_parent_process: bool) -> None:
+        self._server_statistics = ServerStatistics()
+        self._search_worker_pool = SearchWorkerPool(Settings.SEARCH_WORKER_THREADS, Settings.SEARCH_QUEUE_SIZE, Settings.SEARCH_MAX_QUEUE_DELAY, self._server_statistics)
+
+        if self._is_coordinator:
+            self._client_message_handler = CoordinatorMessageHandler(self._logger, self._search_worker_pool, self._server_statistics)
+            return
+
+        web_index, self._web_index = self._web_index, None
+        delta_updater, self._delta_updater = (self._delta_updater if not delegate_reloads_to_parent_process else None), None
+
+        self._web_index_manager = WebIndexManager(self._logger, web_index, delta_updater, self._web_index_generation_number, delegate_reloads_to_parent_process, self._run_in_main_thread)
+        self._client_message_handler = ClientMessageHandler(self._web_index_manager, self._search_worker_pool, self._server_statistics)
+
+    # The coordinator has no web index to reload; the backend servers are reloaded on their own.
+    def _reload_signal_handler(self, signal_number: int, frame) -> None:
+        if self._web_index_manager is not None:
+            self._web_index_manager.request_reload()
+
+    # In the asyncio mode, the signals are handled by the event loop; in the threaded mode, they are expected to raise
+    #  an exception interrupting the accept() call.
+    def _serve_clients(self, stop_signals: Set[int]) -> None:
+        if Settings.USE_ASYNCIO_SERVER:
+            AsyncSearchServer(self._logger, self._client_message_handler, self._search_worker_pool, self._server_statistics, self._server_socket).serve(stop_signals, self._main_thread_wakeup_pipe[0], self._run_main_thread_tasks)
+        else:
+            self._accept_clients()
+
+    def _accept_clients(self) -> None:
+        poller = select.poll()
+        poller.register(self._server_socket, select.POLLIN)
+        poller.register(self._main_thread_wakeup_pipe[0], select.POLLIN)
+
         while True:
             try:
+                ready_fds = {fd for fd, _ in poller.poll()}
+                if self._main_thread_wakeup_pipe[0] in ready_fds:
+                    self._run_main_thread_tasks()
+                if self._server_socket.fileno() not in ready_fds:
+                    continue
+
                 client_socket, _ = self._server_socket.accept()
-            except KeyboardInterrupt:
+            except (KeyboardInterrupt, SearchServerMain._StopAcceptingClients):
                 break
 
-            gc.collect()
-
-            client_handler_thread = ClientHandlerThread(self._web_index, client_socket)
+            client_handler_thread = ClientHandlerThread(self._client_message_handler, self._search_worker_pool, self._server_statistics, client_socket)
             client_handler_thread.start()
 
+    # Performs the function in the main thread while it is serving the clients, and returns its result (or raises its
+    #  exception). The web index manager uses it to fork the search shard worker processes after a reload (see
+    #  WebIndexManager._start_search_shard_pool()).
+    def _run_in_main_thread(self, function: Callable[[], Any]) -> Any:
+        if threading.current_thread() is threading.main_thread():
+            return function()
+
+        future = concurrent.futures.Future()
+        self._main_thread_tasks.put((function, future))
+        os.write(self._main_thread_wakeup_pipe[1], b"\0")
+
+        return future.result()
+
+    def _run_main_thread_tasks(self) -> None:
+        try:
+            while os.read(self._main_thread_wakeup_pipe[0], 4096):
+                pass
+        except BlockingIOError:
+            pass
+
+        while True:
+            try:
+                function, future = self._main_thread_tasks.get_nowait()
+            except queue.Empty:
+                break
+
+            try:
+                future.set_result(function())
+            except Exception as e:
+                future.set_exception(e)
+
+    def _supervise_worker_processes(self) -> None:
+        # The signals the main process is interested in are handled synchronously, so the supervision loop is never
+        #  interrupted in the middle of something.
+        supervised_signals = {signal.SIGCHLD, signal.SIGHUP}
+        signal.pthread_sigmask(signal.SIG_BLOCK, supervised_signals)
+
+        self._freeze_loaded_objects(is_reload=False)
+
+        worker_processes = {}  # PID -> worker number
+        for worker_number in range(Settings.SERVER_WORKER_PROCESSES):
+            self._start_worker_process(worker_number, worker_processes)
+
+        try:
+            while True:
+                signal_info = signal.sigwaitinfo(supervised_signals)
+
+                if signal_info.si_signo == signal.SIGHUP:
+                    self._reload_worker_processes(worker_processes)
+                else:
+                    self._restart_exited_worker_processes(worker_processes)
+
+        except KeyboardInterrupt:
+            pass
+
+        finally:
+            self._stop_worker_processes(worker_processes)
+
+    def _freeze_loaded_objects(self, is_reload: bool) -> None:
+        # The garbage collector would touch the loaded objects in the forked processes (and so cause their memory pages
+        #  to be duplicated). Moving the objects to the permanent generation makes the collector ignore them. When the
+        #  web index is reloaded, the objects frozen before are unfrozen first, so the ones which have been released
+        #  since then (e.g. the reference cycles of the old web index) can be collected.
+        if is_reload:
+            gc.unfreeze()
+        gc.collect()
+        gc.freeze()
+
+    def _start_worker_process(self, worker_number: int, worker_processes: Dict[int, int]) -> None:
+        pid = os.fork()
+        if pid == 0:
+            self._worker_process_main(worker_number)  # never returns
+
+        worker_processes[pid] = worker_number
+
+    def _restart_exited_worker_processes(self, worker_processes: Dict[int, int]) -> None:
+        while True:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                break
+
+            if pid == 0:
+                break
+
+            # The worker processes replaced during a reload are not in the dictionary anymore.
+            worker_number = worker_processes.pop(pid, None)
+            if worker_number is None:
+                continue
+
+            self._logger.warning("The worker process #{} (PID {}) has exited unexpectedly (wait status {}); restarting it...".format(worker_number, pid, status))
+            time.sleep(SearchServerMain._WORKER_PROCESS_RESTART_DELAY)  # Prevents the workers from being restarted in a tight loop
+            self._start_worker_process(worker_number, worker_processes)
+
+    def _reload_worker_processes(self, worker_processes: Dict[int, int]) -> None:
+        if self._is_coordinator:
+            return  # See _reload_signal_handler()
+
+        # The worker processes keep serving the queries from the old web index while the new one is being loaded. Then,
+        #  new worker processes are started, and the old ones are asked to stop once they finish handling their clients.
+        self._logger.info("Reloading the web index...")
+        try:
+            web_index = WebIndexLoader(self._logger).load_index(WebIndexDeltaUpdater.create_from_settings(self._logger))
+        except Exception:
+            self._logger.exception("Failed to reload the web index; the searches are still performed in the old one!")
+            return
+
+        self._web_index = web_index
+        self._web_index_generation_number += 1
+        self._freeze_loaded_objects(is_reload=True)
+
+        old_worker_processes = dict(worker_processes)
+        worker_processes.clear()
+        for old_pid, worker_number in old_worker_processes.items():
+            self._start_worker_process(worker_number, worker_processes)
+            self._signal_worker_process(old_pid, signal.SIGTERM)
+
+        self._logger.info("The reloaded web index has been published as generation {}.".format(self._web_index_generation_number))
+
+    def _worker_process_main(self, worker_number: int) -> None:
+        exit_code = 0
+
+        try:
+            # The web index is reloaded by the main process.
+            signal.signal(signal.SIGHUP, signal.SIG_IGN)
+            signal.signal(signal.SIGTERM, self._stop_accepting_clients_signal_handler)
+            signal.pthread_sigmask(signal.SIG_UNBLOCK, {signal.SIGCHLD, signal.SIGHUP})
+
+            self._logger.debug("The worker process #{} (PID {}) has started.".format(worker_number, os.getpid()))
+
+            self._initialize_client_handling(delegate_reloads_to_parent_process=True)
+            self._serve_clients(stop_signals={signal.SIGINT, signal.SIGTERM})
+
+            signal.signal(signal.SIGTERM, signal.SIG_IGN)
+            self._wait_for_client_handler_threads()
+
+        except BaseException:
+            self._logger.exception("The worker process #{} has crashed!".format(worker_number))
+            exit_code = 1
+
+        finally:
+            self._close_client_handling()
+
+            # The worker process must never return to the code run by the parent process.
+            os._exit(exit_code)
+
+    def _stop_accepting_clients_signal_handler(self, signal_number: int, frame) -> None:
+        raise SearchServerMain._StopAcceptingClients()
+
+    def _wait_for_client_handler_threads(self) -> None:
+        deadline = time.monotonic() + SearchServerMain._WORKER_PROCESS_STOP_TIMEOUT
+
+        # The connections are closed once their current requests are handled; the idle ones are closed by the idle
+        #  timeout.
+        client_handler_threads = [thread for thread in threading.enumerate() if isinstance(thread, ClientHandlerThread)]
+        for thread in client_handler_threads:
+            thread.request_stop()
+
+        for thread in client_handler_threads:
+            thread.join(max(0.0, deadline - time.monotonic()))
+
+    def _stop_worker_processes(self, worker_processes: Dict[int, int]) -> None:
+        for pid in worker_processes.keys():
+            self._signal_worker_process(pid, signal.SIGTERM)
+
+        # The replaced worker processes which are still finishing their work are waited for too.
+        while True:
+            try:
+                os.wait()
+            except ChildProcessError:
+                break
+
+    def _signal_worker_process(self, pid: int, signal_number: int) -> None:
+        try:
+            os.kill(pid, signal_number)
+        except OSError:
+            pass
+
     def on_server_exit(self) -> None:
         self._logger.info("The server is exiting...")
 
         self._server_socket.close()
+
+        self._close_client_handling()
+
+    def _close_client_handling(self) -> None:
+        if self._search_worker_pool is not None:
+            self._search_worker_pool.close()
+
+        if self._web_index_manager is not None:
+            self._web_index_manager.close()
+
+        if isinstance(self._client_message_handler, CoordinatorMessageHandler):
+            self._client_message_handler.close()
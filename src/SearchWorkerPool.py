@@ -0,0 +1,153 @@
+# SPDX-License-Identifier: BSD-3-Clause
+#
+# Copyright (c) 2021 Vít Labuda. All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without modification, are permitted provided that the
+# following conditions are met:
+#  1. Redistributions of source code must retain the above copyright notice, this list of conditions and the following
+#     disclaimer.
+#  2. Redistributions in binary form must reproduce the above copyright notice, this list of conditions and the
+#     following disclaimer in the documentation and/or other materials provided with the distribution.
+#  3. Neither the name of the copyright holder nor the names of its contributors may be used to endorse or promote
+#     products derived from this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES,
+# INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+# SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+# SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY,
+# WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+
+from __future__ import annotations
+from typing import Optional, Callable, Any, Dict, List
+import time
+import queue
+import threading
+import concurrent.futures
+from ServerStatistics import ServerStatistics
+
+
+# A fixed number of threads which perform the searches (and handle the other messages), fed by a bounded queue. If the
+#  queue is full, or if the oldest queued task has already been waiting for too long, a newly submitted task is rejected
+#  right away; a task which has been waiting in the queue for too long once it is dequeued is not performed either. The
+#  future of such a task fails with OverloadedException, so under overload, the tasks which are admitted are still
+#  performed with a bounded delay, instead of all of them being slowed down.
+class SearchWorkerPool:
+    class OverloadedException(Exception):
+        def __init__(self, queue_delay: float):
+            super().__init__("The search workers are overloaded! (queue delay: {:.3f} s)".format(queue_delay))
+            self.queue_delay: float = queue_delay
+
+    class _Task:
+        def __init__(self, function: Callable[..., Any], args: tuple):
+            self.function: Callable[..., Any] = function
+            self.args: tuple = args
+            self.future: concurrent.futures.Future = concurrent.futures.Future()
+            self.enqueue_time: float = time.monotonic()
+
+    def __init__(self, thread_count: int, queue_size: int, max_queue_delay: Optional[float], server_statistics: Optional[ServerStatistics] = None):
+        self._max_queue_delay: Optional[float] = max_queue_delay
+        self._server_statistics: Optional[ServerStatistics] = server_statistics
+        self._queue: queue.Queue = queue.Queue(maxsize=queue_size)
+
+        self._counters_lock: threading.Lock = threading.Lock()
+        self._submitted_tasks: int = 0
+        self._rejected_tasks: int = 0  # when submitted (the queue was full, or its oldest task was waiting for too long)
+        self._shed_tasks: int = 0  # when dequeued (the task was waiting in the queue for too long)
+        self._performed_tasks: int = 0
+        self._total_queue_delay: float = 0.0  # of the performed tasks
+        self._max_observed_queue_delay: float = 0.0  # of the performed tasks
+
+        self._threads: List[threading.Thread] = []
+        for thread_index in range(thread_count):
+            thread = threading.Thread(target=self._worker_thread_main, name="SearchWorker-{}".format(thread_index), daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    # The returned future's result is the function's return value.
+    def submit(self, function: Callable[..., Any], *args: Any) -> concurrent.futures.Future:
+        task = SearchWorkerPool._Task(function, args)
+
+        with self._counters_lock:
+            self._submitted_tasks += 1
+
+        # The new task would wait at least as long as the oldest queued task has been waiting already, so if that is
+        #  too long, it is rejected without waiting in the queue only to be shed once it is dequeued.
+        oldest_task_queue_delay = self._get_oldest_task_queue_delay(task.enqueue_time)
+        if (self._max_queue_delay is not None) and (oldest_task_queue_delay > self._max_queue_delay):
+            self._reject_task(task, oldest_task_queue_delay)
+            return task.future
+
+        try:
+            self._queue.put_nowait(task)
+        except queue.Full:
+            self._reject_task(task, oldest_task_queue_delay)
+
+        return task.future
+
+    def _get_oldest_task_queue_delay(self, now: float) -> float:
+        # queue.Queue keeps its items in a deque guarded by its mutex.
+        with self._queue.mutex:
+            oldest_task = (self._queue.queue[0] if self._queue.queue else None)
+
+        if oldest_task is None:  # The queue is empty, or the pool is being closed
+            return 0.0
+
+        return now - oldest_task.enqueue_time
+
+    def _reject_task(self, task: SearchWorkerPool._Task, queue_delay: float) -> None:
+        with self._counters_lock:
+            self._rejected_tasks += 1
+
+        task.future.set_exception(SearchWorkerPool.OverloadedException(queue_delay))
+
+    def _worker_thread_main(self) -> None:
+        while True:
+            task = self._queue.get()
+            if task is None:
+                break
+
+            if not task.future.set_running_or_notify_cancel():
+                continue
+
+            queue_delay = time.monotonic() - task.enqueue_time
+            if (self._max_queue_delay is not None) and (queue_delay > self._max_queue_delay):
+                with self._counters_lock:
+                    self._shed_tasks += 1
+                task.future.set_exception(SearchWorkerPool.OverloadedException(queue_delay))
+                continue
+
+            with self._counters_lock:
+                self._performed_tasks += 1
+                self._total_queue_delay += queue_delay
+                self._max_observed_queue_delay = max(self._max_observed_queue_delay, queue_delay)
+
+            if self._server_statistics is not None:
+                self._server_statistics.record_latency(ServerStatistics.PHASE_QUEUE_WAIT, queue_delay)
+
+            try:
+                task.future.set_result(task.function(*task.args))
+            except BaseException as e:
+                task.future.set_exception(e)
+
+    def get_counters(self) -> Dict[str, Any]:
+        with self._counters_lock:
+            return {
+                "submitted_tasks": self._submitted_tasks,
+                "rejected_tasks": self._rejected_tasks,
+                "shed_tasks": self._shed_tasks,
+                "performed_tasks": self._performed_tasks,
+                "queued_tasks": self._queue.qsize(),
+                "average_queue_delay": (self._total_queue_delay / self._performed_tasks if self._performed_tasks > 0 else 0.0),
+                "max_queue_delay": self._max_observed_queue_delay
+            }
+
+    # The tasks which are already queued are performed before the threads exit.
+    def close(self) -> None:
+        for _ in self._threads:
+            self._queue.put(None)
+
+        for thread in self._threads:
+            thread.join()
@@ -0,0 +1,114 @@
+# SPDX-License-Identifier: BSD-3-Clause
+#
+# Copyright (c) 2021 Vít Labuda. All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without modification, are permitted provided that the
+# following conditions are met:
+#  1. Redistributions of source code must retain the above copyright notice, this list of conditions and the following
+#     disclaimer.
+#  2. Redistributions in binary form must reproduce the above copyright notice, this list of conditions and the
+#     following disclaimer in the documentation and/or other materials provided with the distribution.
+#  3. Neither the name of the copyright holder nor the names of its contributors may be used to endorse or promote
+#     products derived from this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES,
+# INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+# SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+# SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY,
+# WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+
+from typing import Dict, Any
+import time
+import threading
+from LatencyHistogram import LatencyHistogram
+
+
+# Collects the statistics of the server process; it is shared by all the client connections and search workers. The
+#  statistics are kept per process, so in the pre-forked mode, each stats request is answered by the worker process
+#  which has accepted the connection.
+class ServerStatistics:
+    # The phases whose durations are measured:
+    #  - receive: from the arrival of a message's header until the message is received and decoded,
+    #  - queue_wait: how long a message was waiting in the search worker pool's queue,
+    #  - scan: selecting the candidate documents of a search,
+    #  - score: scoring the candidates (including the selection of the best ones),
+    #  - sort: ordering the selected documents,
+    #  - fetch: creating the search results of the ranked documents (reading the document store, if it is used),
+    #  - backend: waiting for the responses of the backend servers (only in the coordinator mode, see
+    #    CoordinatorMessageHandler),
+    #  - encode: converting a response to a JSON object,
+    #  - send: serializing and sending a response,
+    #  - total: from the arrival of a message's header until its response is sent.
+    # The scan, score and sort phases are measured only in searches performed directly by a SearchPerformer, i.e. not
+    #  in the ones performed in batches or by the search shard processes; their durations are included in the other
+    #  phases.
+    PHASE_RECEIVE: str = "receive"
+    PHASE_QUEUE_WAIT: str = "queue_wait"
+    PHASE_SCAN: str = "scan"
+    PHASE_SCORE: str = "score"
+    PHASE_SORT: str = "sort"
+    PHASE_FETCH: str = "fetch"
+    PHASE_BACKEND: str = "backend"
+    PHASE_ENCODE: str = "encode"
+    PHASE_SEND: str = "send"
+    PHASE_TOTAL: str = "total"
+
+    _PHASES = (PHASE_RECEIVE, PHASE_QUEUE_WAIT, PHASE_SCAN, PHASE_SCORE, PHASE_SORT, PHASE_FETCH, PHASE_BACKEND, PHASE_ENCODE, PHASE_SEND, PHASE_TOTAL)
+
+    def __init__(self):
+        self._start_time: float = time.monotonic()
+
+        # The histograms are created up front, so recording a duration only updates their existing counters.
+        self._latency_histograms: Dict[str, LatencyHistogram] = {phase: LatencyHistogram() for phase in ServerStatistics._PHASES}
+
+        self._counters_lock: threading.Lock = threading.Lock()
+        self._open_connections: int = 0
+        self._accepted_connections: int = 0
+        # Only the successfully handled messages are counted, so the clients can't make the dictionary grow by sending
+        #  messages of arbitrary classes.
+        self._handled_messages: Dict[int, int] = {}  # message class -> count
+        self._overloaded_responses: int = 0
+        self._partial_searches: int = 0  # the searches stopped by their deadline
+
+    def get_uptime(self) -> float:
+        return time.monotonic() - self._start_time
+
+    def record_latency(self, phase: str, duration: float) -> None:
+        self._latency_histograms[phase].record(duration)
+
+    def on_connection_opened(self) -> None:
+        with self._counters_lock:
+            self._open_connections += 1
+            self._accepted_connections += 1
+
+    def on_connection_closed(self) -> None:
+        with self._counters_lock:
+            self._open_connections -= 1
+
+    def on_message_handled(self, message_class: int) -> None:
+        with self._counters_lock:
+            self._handled_messages[message_class] = self._handled_messages.get(message_class, 0) + 1
+
+    def on_overloaded_response_sent(self) -> None:
+        with self._counters_lock:
+            self._overloaded_responses += 1
+
+    def on_partial_search(self) -> None:
+        with self._counters_lock:
+            self._partial_searches += 1
+
+    def get_counters(self) -> Dict[str, Any]:
+        with self._counters_lock:
+            return {
+                "open_connections": self._open_connections,
+                "accepted_connections": self._accepted_connections,
+                "handled_messages": {str(message_class): count for message_class, count in sorted(self._handled_messages.items())},
+                "overloaded_responses": self._overloaded_responses,
+                "partial_searches": self._partial_searches
+            }
+
+    def get_latency_histograms(self) -> Dict[str, Dict[str, Any]]:
+        return {phase: histogram.to_json_object() for phase, histogram in self._latency_histograms.items()}
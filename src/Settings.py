@@ -20,9 +20,12 @@
 # OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
 
 
-from typing import Optional
+from typing import Optional, Tuple
+import os
 import sys
+import runpy
 import logging
+import argparse
 
 
 class Settings:
@@ -30,11 +33,165 @@ class Settings:
 
     WEB_INDEX_FILE_PATH: str = "web_index.csv"
 
+    # The binary snapshot of the web index can be created from the web index CSV file using the
+    #  ConvertWebIndexToSnapshot.py program. If the snapshot is up to date (i.e. it was created from the current version
+    #  of the CSV file, or the CSV file doesn't exist), the server loads the web index from it instead of the CSV file,
+    #  which is a lot faster. The snapshot only replaces the parsing of the CSV file - the loaded web index is the same
+    #  and takes the same amount of memory (see WebIndexSnapshot). Set to None to disable the snapshot.
+    WEB_INDEX_SNAPSHOT_FILE_PATH: Optional[str] = "web_index.snapshot"
+
+    # If enabled, the fields which are only displayed to the clients (the original URL, title and content snippet) are
+    #  written into the document store file when the web index is loaded, and they are read from it (through a memory
+    #  mapping) only for the documents returned in the search results, instead of being kept in memory. The fields of
+    #  the DOCUMENT_STORE_CACHE_SIZE most recently returned documents are cached (in each process handling client
+    #  connections). Each loaded web index gets its own file, created under a unique name prefixed with
+    #  DOCUMENT_STORE_FILE_PATH and deleted right away (see DocumentStore), so the file is never visible under the path.
+    USE_DOCUMENT_STORE: bool = False
+    DOCUMENT_STORE_FILE_PATH: str = "web_index.documents"
+    DOCUMENT_STORE_CACHE_SIZE: int = 10000
+
+    # The web index CSV file (which may also be gzip- or zstd-compressed; zstd requires the 'zstandard' library) is split
+    #  into chunks of approximately this size (in bytes) which are parsed in parallel by this number of worker processes
+    #  (None means the number of CPUs; 1 means that the file is parsed in the main process).
+    WEB_INDEX_LOADING_PROCESSES: Optional[int] = None
+    WEB_INDEX_LOADING_CHUNK_SIZE: int = 8000000
+
+    # If set, the rows appended to this file (in the same format as the rows of the web index file) are applied to the
+    #  loaded web index without reloading it: each row adds a document, or replaces the document with the same final
+    #  URL. The file is checked every WEB_INDEX_DELTA_POLL_INTERVAL seconds, and at most WEB_INDEX_DELTA_BATCH_SIZE rows
+    #  are published at once as a new web index generation. The whole file is merged into the web index whenever it is
+    #  (re)loaded, so it should be emptied once its rows are merged into the web index file. In the pre-forked mode
+    #  (see SERVER_WORKER_PROCESSES), the file is only applied when the web index is (re)loaded by the main process -
+    #  the worker processes share the web index inherited from it, and applying the updates in each of them would
+    #  duplicate the updated parts of it in every process.
+    WEB_INDEX_DELTA_FILE_PATH: Optional[str] = None
+    WEB_INDEX_DELTA_POLL_INTERVAL: float = 1.0
+    WEB_INDEX_DELTA_BATCH_SIZE: int = 1000
+
     SERVER_SOCKET_PATH: str = "spideriment_search_server.sock"
     SERVER_SOCKET_PERMISSIONS: Optional[int] = 0o777
 
+    # The clients can send multiple requests over one connection; the connection is closed if the client doesn't send
+    #  anything for this number of seconds (None means no timeout).
+    CLIENT_IDLE_TIMEOUT: Optional[float] = 10.0
+
+    # If enabled, the client connections are served by an asyncio event loop instead of a thread per connection, so
+    #  a large number of idle or slow connections doesn't consume many resources.
+    USE_ASYNCIO_SERVER: bool = False
+
+    # The searches are performed by a fixed number of search worker threads (in each process handling client
+    #  connections), which take the requests from a queue. If the queue is full, or if a request has been waiting in it
+    #  for more than SEARCH_MAX_QUEUE_DELAY seconds, the client receives an OverloadedResponse message immediately, so
+    #  the requests which are admitted don't get slower under overload (None means no limit on the queue delay).
+    SEARCH_WORKER_THREADS: int = 4
+    SEARCH_QUEUE_SIZE: int = 1000
+    SEARCH_MAX_QUEUE_DELAY: Optional[float] = 1.0
+
+    # The time budget of a search in seconds, which starts once a search worker starts handling the request; the clients
+    #  can set a different one in the request's "deadline_ms" item (see ClientRequest). Once the budget runs out, no more
+    #  documents are scored, and the best results found so far are returned, marked as partial; the partial results are
+    #  neither cached nor stored in cursors (None means no time budget).
+    SEARCH_DEFAULT_DEADLINE: Optional[float] = 2.0
+
+    # The web index can be reloaded without restarting the server by sending the SIGHUP signal to the server's (main)
+    #  process. If enabled, the clients can also request a reload by sending a message of the ReloadRequest class.
+    #  The searches are performed in the old web index until the new one is loaded.
+    ALLOW_RELOAD_REQUESTS: bool = False
+
+    # The maximum number of searches the clients can request in a single BatchRequest message.
+    MAX_BATCH_REQUEST_SEARCHES: int = 32
+
     MINIMAL_SCORE: float = 1.0
 
+    # If enabled, a trigram index of all the searchable fields is built when the web index is loaded. Only the documents
+    #  which contain all the search query's trigrams are then scored, instead of all the documents in the web index.
+    #  This makes the searches a lot faster, but the index consumes an additional amount of memory.
+    USE_TRIGRAM_INDEX: bool = True
+
+    # If enabled, the searchable fields are split into terms (words) when the web index is loaded, and an inverted index
+    #  of them is built, so the clients can request term-based searches (see the ClientRequest class), which match the
+    #  documents containing all or any of the search query's terms instead of the whole query as a substring. The index
+    #  consumes an additional amount of memory and time to build, so it's disabled by default; if it's disabled, the
+    #  term-based searches are refused.
+    USE_TERM_POSTINGS_INDEX: bool = False
+
+    # If enabled, the per-field scores are combined into the final document scores using vectorized NumPy operations
+    #  (the NumPy library must be installed). The rankings are exactly the same as with the default scoring algorithms.
+    USE_COLUMNAR_SCORING_ENGINE: bool = False
+
+    # If enabled, the distinct titles and headings of the documents are indexed when the web index is loaded, so the
+    #  clients can request the completions of a typed prefix (see the AutocompleteRequest class). Each phrase is weighted
+    #  by the sum of the scores of its occurrences (see SCORE_TITLE and SCORE_HEADING), and the heaviest completions are
+    #  precomputed for the prefixes shared by many phrases, so the lookups take about the same time regardless of the
+    #  size of the web index. The phrases longer than AUTOCOMPLETE_MAX_PHRASE_LENGTH characters aren't indexed. The
+    #  index is not affected by the delta file updates (see WEB_INDEX_DELTA_FILE_PATH) - it is rebuilt when the web
+    #  index is reloaded. If it's disabled, the autocomplete requests are refused. The number of completions returned
+    #  for a request is limited to AUTOCOMPLETE_MAX_COMPLETIONS. The coordinator doesn't use this setting (see
+    #  COORDINATOR_AUTOCOMPLETE_BACKEND_COMPLETIONS).
+    USE_AUTOCOMPLETE_INDEX: bool = False
+    AUTOCOMPLETE_MAX_COMPLETIONS: int = 10
+    AUTOCOMPLETE_MAX_PHRASE_LENGTH: int = 100
+
+    # If greater than zero, the web index is split into this number of shards, each of which is searched by a separate
+    #  worker process (forked after the web index is loaded). Each search is then performed by all the worker processes
+    #  in parallel, which makes it possible to utilize more CPU cores. If zero, the searches are performed by the
+    #  client handler threads.
+    SEARCH_SHARD_COUNT: int = 0
+
+    # If greater than zero, this number of worker processes is forked after the web index is loaded; each of them accepts
+    #  and handles client connections on the shared server socket, and they are restarted by the main process if they
+    #  crash. If zero, the client connections are handled by the main process.
+    SERVER_WORKER_PROCESSES: int = 0
+
+    # If not empty, the server runs as a coordinator: it doesn't load any web index, and each search is forwarded to all
+    #  the backend search servers listening on these Unix sockets, whose results are merged. Each backend is supposed to
+    #  search one partition of the web index, created using the PartitionWebIndex.py program (the partitions are
+    #  written to WEB_INDEX_PARTITION_FILE_PATH_FORMAT, formatted with the partition index, which must be the same as
+    #  the index of the backend's socket path). The coordinator keeps up to COORDINATOR_MAX_IDLE_CONNECTIONS idle
+    #  connections to each backend. If a backend doesn't respond within COORDINATOR_BACKEND_TIMEOUT seconds (which
+    #  should be longer than the backends' SEARCH_DEFAULT_DEADLINE), the results of the other backends are returned as
+    #  partial results. The searches wait for the backends in the search worker threads, so the coordinator usually
+    #  needs more of them than a server searching its own web index. The merged results are ordered exactly as a single
+    #  server would order them, except for the ties between the documents updated by the backends' delta files (see
+    #  CoordinatorMessageHandler).
+    COORDINATOR_BACKEND_SOCKET_PATHS: Tuple[str, ...] = ()
+    COORDINATOR_MAX_IDLE_CONNECTIONS: int = 16
+    COORDINATOR_BACKEND_TIMEOUT: float = 5.0
+    WEB_INDEX_PARTITION_FILE_PATH_FORMAT: str = "web_index.part{}.csv"
+
+    # If greater than zero, the coordinator accepts autocomplete requests and forwards them to the backends (which must
+    #  have USE_AUTOCOMPLETE_INDEX enabled); if zero, the autocomplete requests are refused. The coordinator merges the
+    #  completions of the backends by summing up the weights of the same phrases, so a phrase which is not among a
+    #  backend's top completions misses that backend's part of its weight. Each backend is therefore asked for this many
+    #  completions (e.g. 100); the higher it is, the more accurate the merged completions are. The backends return at
+    #  most AUTOCOMPLETE_MAX_COMPLETIONS completions, so the setting should be raised accordingly on the backends - the
+    #  coordinator logs a warning for each backend which caps the number of completions. The number of the merged
+    #  completions returned to the clients is limited by the coordinator's own AUTOCOMPLETE_MAX_COMPLETIONS setting.
+    COORDINATOR_AUTOCOMPLETE_BACKEND_COMPLETIONS: int = 0
+
+    # The results of recent searches are cached (in each process handling client connections), so repeated queries
+    #  don't have to be searched for again. The cache holds at most SEARCH_RESULT_CACHE_SIZE search queries (the least
+    #  recently used ones are evicted first), and the top SEARCH_RESULT_CACHE_DEPTH results are cached for each of them;
+    #  requests for more results bypass the cache. The cache is emptied whenever the web index is reloaded.
+    #  If the size is zero, the cache is disabled.
+    SEARCH_RESULT_CACHE_SIZE: int = 1000
+    SEARCH_RESULT_CACHE_DEPTH: int = 100
+
+    # The clients can request the results to be stored under a cursor, so the subsequent pages of the results are
+    #  sliced from them instead of being searched for again (see the ClientRequest class). Up to
+    #  RESULT_CURSOR_MAX_RESULTS results are stored for each cursor; a cursor expires after it hasn't been used for
+    #  RESULT_CURSOR_TIME_TO_LIVE seconds, or once the web index is reloaded. If the results stored in all the cursors
+    #  (in each process handling client connections) exceed RESULT_CURSOR_STORE_CAPACITY, the least recently used
+    #  cursors are discarded. If the capacity is zero, the cursors are disabled.
+    RESULT_CURSOR_TIME_TO_LIVE: float = 300.0
+    RESULT_CURSOR_MAX_RESULTS: int = 1000
+    RESULT_CURSOR_STORE_CAPACITY: int = 1000000
+
+    # The paginated requests can skip at most SEARCH_MAX_OFFSET results (see the ClientRequest class), since all the
+    #  skipped results have to be ranked too (and, in the coordinator mode, sent by each of the backends); the requests
+    #  with a larger offset are refused.
+    SEARCH_MAX_OFFSET: int = 1000
+
     # These are the scoring coefficients for the result ranking algorithm.
     SCORE_URL: int = 2000
     SCORE_TITLE: int = 20000
@@ -46,6 +203,43 @@ class Settings:
     SCORE_IMAGE_ALT: int = 200
     SCORE_LINK_TEXT: int = 100
 
+    # All the programs using these settings accept the "--settings <file>" option: the file is a Python file whose
+    #  top-level assignments override the settings of the same names (e.g. WEB_INDEX_FILE_PATH = "web_index.part0.csv").
+    #  This way, multiple instances of the server with different settings can be run from the same directory, e.g. the
+    #  backend servers and their coordinator (see COORDINATOR_BACKEND_SOCKET_PATHS). The file is read before the working
+    #  directory is entered, so its path is relative to the directory the program is started in. The programs with
+    #  options of their own pass their argument parser, and get the parsed arguments back.
+    @staticmethod
+    def apply_command_line_overrides(argument_parser: Optional[argparse.ArgumentParser] = None) -> argparse.Namespace:
+        if argument_parser is None:
+            argument_parser = argparse.ArgumentParser()
+
+        argument_parser.add_argument("--settings", metavar="FILE", help="a Python file overriding some of the settings in Settings.py")
+        arguments = argument_parser.parse_args()
+        if arguments.settings is None:
+            return arguments
+
+        overridden_settings = {name: value for name, value in runpy.run_path(arguments.settings).items() if name.isupper()}
+
+        # A misspelled setting would otherwise be ignored silently.
+        unknown_names = [name for name in overridden_settings.keys() if not hasattr(Settings, name)]
+        if unknown_names:
+            argument_parser.error("The settings file \"{}\" overrides unknown settings: {}".format(arguments.settings, ", ".join(unknown_names)))
+
+        for name, value in overridden_settings.items():
+            setattr(Settings, name, value)
+
+        return arguments
+
+    # All the programs enter their working directory (creating it if necessary) before they do anything else, so the
+    #  relative paths in the settings are resolved against it.
+    @staticmethod
+    def enter_working_directory(working_directory: Optional[str]) -> None:
+        if working_directory is not None:
+            os.makedirs(working_directory, exist_ok=True)
+
+            os.chdir(working_directory)
+
     @staticmethod
     def get_logger() -> logging.Logger:
         logging.basicConfig(stream=sys.stderr, level=logging.DEBUG)
@@ -0,0 +1,260 @@
+# SPDX-License-Identifier: BSD-3-Clause
+#
+# Copyright (c) 2021 Vít Labuda. All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without modification, are permitted provided that the
+# following conditions are met:
+#  1. Redistributions of source code must retain the above copyright notice, this list of conditions and the following
+#     disclaimer.
+#  2. Redistributions in binary form must reproduce the above copyright notice, this list of conditions and the
+#     following disclaimer in the documentation and/or other materials provided with the distribution.
+#  3. Neither the name of the copyright holder nor the names of its contributors may be used to endorse or promote
+#     products derived from this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES,
+# INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+# SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+# SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY,
+# WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+
+from __future__ import annotations
+from typing import List, Dict, Tuple, Union, Optional, AbstractSet
+import heapq
+import signal
+import itertools
+import logging
+import threading
+import multiprocessing
+import multiprocessing.connection
+import concurrent.futures
+from WebIndex import WebIndex
+from WebIndexItem import WebIndexItem
+from ClientRequest import ClientRequest
+from SearchPerformer import SearchPerformer
+from BatchSearchPerformer import BatchSearchPerformer
+from SpiderimentSearchServerRuntimeError import SpiderimentSearchServerRuntimeError
+
+
+class ShardedSearchPool:
+    # The web index is split into shards, each of which is searched by a long-lived worker process. The worker
+    #  processes are forked after the web index is loaded, so they share its memory with the parent process
+    #  (copy-on-write) - each of them has access to the whole web index, but it searches only the documents whose ID
+    #  modulo the shard count is equal to its shard index.
+    class _Shard:
+        def __init__(self, shard_index: int, process: multiprocessing.Process, connection: multiprocessing.connection.Connection):
+            self.shard_index: int = shard_index
+            self.process: multiprocessing.Process = process
+            self.connection: multiprocessing.connection.Connection = connection
+            self.send_lock: threading.Lock = threading.Lock()
+            self.pending_requests: Dict[int, concurrent.futures.Future] = {}
+            self.pending_requests_lock: threading.Lock = threading.Lock()
+            self.is_alive: bool = True
+
+    # Set on the pending requests of a shard whose worker process has exited (see _collect_shard_results()).
+    class _ShardUnavailableException(Exception):
+        pass
+
+    # Sent to all the shards to update their copies of the web index (see apply_update()).
+    class _WebIndexUpdate:
+        def __init__(self, added_items: List[WebIndexItem], removed_document_ids: AbstractSet[int]):
+            self.added_items: List[WebIndexItem] = added_items
+            self.removed_document_ids: AbstractSet[int] = removed_document_ids
+
+    def __init__(self, web_index: WebIndex, shard_count: int, logger: logging.Logger):
+        self._web_index: WebIndex = web_index
+        self._logger: logging.Logger = logger
+        self._request_id_counter: itertools.count = itertools.count()
+        self._is_closing: bool = False
+
+        # The requests are sent to all the shards at once, so that each search is performed in the same version of the
+        #  web index by all of them, even if an update is being sent at the same time.
+        self._broadcast_lock: threading.Lock = threading.Lock()
+
+        context = multiprocessing.get_context("fork")
+        self._shards: List[ShardedSearchPool._Shard] = []
+        for shard_index in range(shard_count):
+            parent_connection, child_connection = context.Pipe()
+
+            process = context.Process(target=self._shard_worker_main, args=(child_connection, parent_connection, shard_index, shard_count), name="SearchShard-{}".format(shard_index), daemon=True)
+            process.start()
+            child_connection.close()
+
+            self._shards.append(ShardedSearchPool._Shard(shard_index, process, parent_connection))
+
+        for shard in self._shards:
+            threading.Thread(target=self._shard_response_reader_main, args=(shard,), daemon=True).start()
+
+    def _shard_worker_main(self, connection: multiprocessing.connection.Connection, parent_connection: multiprocessing.connection.Connection, shard_index: int, shard_count: int) -> None:
+        # The parent's ends of the connections are inherited by the forked process; unless they are closed, the workers
+        #  wouldn't notice that the parent process has closed its ends of them.
+        parent_connection.close()
+        for shard in self._shards:
+            shard.connection.close()
+
+        # The worker exits when the parent process closes the connection, not when the user interrupts the server.
+        signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+        while True:
+            try:
+                message = connection.recv()
+            except (EOFError, OSError):
+                break  # The parent process has died
+
+            if message is None:
+                break  # The pool is being closed
+            request_id, request = message
+
+            try:
+                if isinstance(request, ShardedSearchPool._WebIndexUpdate):
+                    self._web_index = self._web_index.create_updated_index(request.added_items, request.removed_document_ids)
+                    connection.send((request_id, None, None))
+                    continue
+
+                connection.send((request_id, self._search_shard(request, shard_index, shard_count), None))
+            except Exception as e:
+                connection.send((request_id, None, "{}: {}".format(e.__class__.__name__, e)))
+
+    # A list of requests is a batch of searches (see rank_documents_batch()). The scanned fractions are returned together
+    #  with the rankings.
+    def _search_shard(self, request: Union[ClientRequest, List[ClientRequest]], shard_index: int, shard_count: int) -> tuple:
+        if isinstance(request, list):
+            batch_search_performer = BatchSearchPerformer(self._web_index, request, (shard_index, shard_count))
+            return batch_search_performer.rank_documents(), batch_search_performer.get_scanned_fractions()
+
+        search_performer = SearchPerformer(self._web_index, request, (shard_index, shard_count))
+        return search_performer.rank_documents(), search_performer.get_scanned_fraction()
+
+    def _shard_response_reader_main(self, shard: ShardedSearchPool._Shard) -> None:
+        while True:
+            try:
+                request_id, result, error = shard.connection.recv()
+            except (EOFError, OSError):
+                break
+
+            with shard.pending_requests_lock:
+                future = shard.pending_requests.pop(request_id)
+
+            if error is not None:
+                future.set_exception(SpiderimentSearchServerRuntimeError("The search shard #{} has failed to perform a search! ({})".format(shard.shard_index, error)))
+            else:
+                future.set_result(result)
+
+        # The worker process has exited (either because the pool is being closed, or because it has died), so no more
+        #  responses will arrive from the shard.
+        shard.connection.close()
+        with shard.pending_requests_lock:
+            shard.is_alive = False
+            pending_requests, shard.pending_requests = shard.pending_requests, {}
+
+        if not self._is_closing:
+            self._logger.error("The search shard #{} has exited unexpectedly; its documents are searched by the server process until the web index is reloaded!".format(shard.shard_index))
+
+        for future in pending_requests.values():
+            future.set_exception(ShardedSearchPool._ShardUnavailableException())
+
+    # See SearchPerformer.rank_documents(); the ranked documents are returned together with the scanned fraction (see
+    #  SearchPerformer.get_scanned_fraction()), which is averaged over the shards, as they are of about the same size.
+    def rank_documents(self, request: ClientRequest) -> Tuple[List[Tuple[int, float]], float]:
+        if not request.canonical_search_query:
+            return [], 1.0  # If the search query is empty, don't return any results
+
+        shard_results = self._collect_shard_results(request, self._send_request_to_all_shards(request))
+
+        # Each shard returns its local top results ordered by (score descending, document ID ascending), so merging
+        #  them in the same order produces exactly the same results as if the whole web index was searched at once.
+        merged_results = heapq.merge(*(ranked_documents for ranked_documents, _ in shard_results), key=lambda ranked_document: (-ranked_document[1], ranked_document[0]))
+        scanned_fraction = sum(shard_scanned_fraction for _, shard_scanned_fraction in shard_results) / len(shard_results)
+
+        return list(itertools.islice(merged_results, request.max_results)), scanned_fraction
+
+    # See BatchSearchPerformer.rank_documents(); each shard performs all the searches of the batch in a single pass. The
+    #  scanned fractions are returned in the same way as by rank_documents().
+    def rank_documents_batch(self, requests: List[ClientRequest]) -> Tuple[List[List[Tuple[int, float]]], List[float]]:
+        shard_results = self._collect_shard_results(requests, self._send_request_to_all_shards(requests))
+
+        batch_results, scanned_fractions = [], []
+        for request_index, request in enumerate(requests):
+            merged_results = heapq.merge(*(rankings[request_index] for rankings, _ in shard_results), key=lambda ranked_document: (-ranked_document[1], ranked_document[0]))
+            batch_results.append(list(itertools.islice(merged_results, request.max_results)))
+            scanned_fractions.append(sum(shard_scanned_fractions[request_index] for _, shard_scanned_fractions in shard_results) / len(shard_results))
+
+        return batch_results, scanned_fractions
+
+    # Applies the update to the web index copies of all the shards (see WebIndex.create_updated_index()) and returns once
+    #  all of them have applied it, so the searches sent to the shards afterwards are performed in the updated web index.
+    #  The pool is shared by the web index generations created by the updates, so the searches of an older generation
+    #  which are sent afterwards are performed in the updated web index too.
+    def apply_update(self, web_index: WebIndex, added_items: List[WebIndexItem], removed_document_ids: AbstractSet[int]) -> None:
+        # The shards which are no longer available don't have any copy to update (see _collect_shard_results()).
+        for future in self._send_request_to_all_shards(ShardedSearchPool._WebIndexUpdate(added_items, removed_document_ids)):
+            try:
+                if future is not None:
+                    future.result()
+            except ShardedSearchPool._ShardUnavailableException:
+                pass
+
+        self._web_index = web_index
+
+    # The worker processes are not restarted when they die, as they can only be forked while the process is not in the
+    #  middle of anything (see WebIndexManager._start_search_shard_pool()); instead, the documents of the shards which
+    #  are no longer available are searched by the calling thread, so the searches keep returning complete results (at
+    #  the cost of a part of the parallelism) until the web index is reloaded with a new pool.
+    def _collect_shard_results(self, request: Union[ClientRequest, List[ClientRequest]], futures: List[Optional[concurrent.futures.Future]]) -> List[tuple]:
+        shard_results = []
+        for shard, future in zip(self._shards, futures):
+            if future is not None:
+                try:
+                    shard_results.append(future.result())
+                    continue
+                except ShardedSearchPool._ShardUnavailableException:
+                    pass
+
+            shard_results.append(self._search_shard(request, shard.shard_index, len(self._shards)))
+
+        return shard_results
+
+    # Returns None instead of the future of each shard which is no longer available.
+    def _send_request_to_all_shards(self, request: Union[ClientRequest, List[ClientRequest], ShardedSearchPool._WebIndexUpdate]) -> List[Optional[concurrent.futures.Future]]:
+        with self._broadcast_lock:
+            request_id = next(self._request_id_counter)
+            return [self._send_request_to_shard(shard, request_id, request) for shard in self._shards]
+
+    def _send_request_to_shard(self, shard: ShardedSearchPool._Shard, request_id: int, request: Union[ClientRequest, List[ClientRequest], ShardedSearchPool._WebIndexUpdate]) -> Optional[concurrent.futures.Future]:
+        future = concurrent.futures.Future()
+
+        with shard.pending_requests_lock:
+            if not shard.is_alive:
+                return None
+            shard.pending_requests[request_id] = future
+
+        # If the request can't be sent, the worker process has died (its response reader thread will notice it soon).
+        try:
+            with shard.send_lock:
+                shard.connection.send((request_id, request))
+        except OSError:
+            with shard.pending_requests_lock:
+                shard.pending_requests.pop(request_id, None)
+            return None
+
+        return future
+
+    def close(self) -> None:
+        self._is_closing = True
+
+        # Closing the connections wouldn't wake up the threads blocked in reading from them, so the workers are asked to
+        #  exit instead; their connections are then closed by the response reader threads once the workers exit.
+        for shard in self._shards:
+            try:
+                with shard.send_lock:
+                    shard.connection.send(None)
+            except OSError:
+                pass
+
+        for shard in self._shards:
+            shard.process.join(timeout=5)
+            if shard.process.is_alive():
+                self._logger.warning("The search shard #{} hasn't exited in time, terminating it...".format(shard.shard_index))
+                shard.process.terminate()
@@ -21,8 +21,11 @@
 
 
 if __name__ == '__main__':
+    from Settings import Settings
     from SearchServerMain import SearchServerMain
 
+    Settings.apply_command_line_overrides()
+
     server = SearchServerMain()
     server.on_server_start()
     server.server_loop()
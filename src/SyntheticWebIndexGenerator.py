@@ -0,0 +1,113 @@
+# SPDX-License-Identifier: BSD-3-Clause
+#
+# Copyright (c) 2021 Vít Labuda. All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without modification, are permitted provided that the
+# following conditions are met:
+#  1. Redistributions of source code must retain the above copyright notice, this list of conditions and the following
+#     disclaimer.
+#  2. Redistributions in binary form must reproduce the above copyright notice, this list of conditions and the
+#     following disclaimer in the documentation and/or other materials provided with the distribution.
+#  3. Neither the name of the copyright holder nor the names of its contributors may be used to endorse or promote
+#     products derived from this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES,
+# INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+# SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+# SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY,
+# WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+
+from typing import List, Tuple, Dict, Any, Optional
+import os
+import csv
+import json
+import random
+import string
+import itertools
+from BenchmarkSettings import BenchmarkSettings
+
+
+# Generates a synthetic web index in the same format as the one Spideriment creates (each line of the CSV file
+#  contains a single column with a JSON object describing one page), so the server can be benchmarked without a real
+#  web index. The generated web index depends only on the settings, so it is the same for every run.
+class SyntheticWebIndexGenerator:
+    _WORD_LENGTH_RANGE: Tuple[int, int] = (2, 10)
+    _CONTENT_SNIPPET_QUALITIES: Tuple[float, ...] = (0.0, 0.25, 0.5, 0.75, 1.0)
+
+    def __init__(self):
+        self._random: random.Random = random.Random(BenchmarkSettings.SYNTHETIC_RANDOM_SEED)
+
+        self._vocabulary: List[str] = SyntheticWebIndexGenerator.generate_vocabulary()
+        self._cumulative_word_weights: List[float] = list(itertools.accumulate(1.0 / rank for rank in range(1, len(self._vocabulary) + 1)))
+
+        self._authors: List[str] = [self._make_text(2).title() for _ in range(BenchmarkSettings.SYNTHETIC_AUTHOR_COUNT)]
+        self._domains: List[str] = ["{}.example".format(self._make_text(1)) for _ in range(BenchmarkSettings.SYNTHETIC_AUTHOR_COUNT)]
+
+    # The vocabulary (ordered from the most common word to the least common one) is generated with its own random
+    #  number generator, so the load generator can reproduce it without generating the whole web index.
+    @staticmethod
+    def generate_vocabulary() -> List[str]:
+        random_ = random.Random(BenchmarkSettings.SYNTHETIC_RANDOM_SEED)
+
+        vocabulary = set()
+        while len(vocabulary) < BenchmarkSettings.SYNTHETIC_VOCABULARY_SIZE:
+            vocabulary.add("".join(random_.choices(string.ascii_lowercase, k=random_.randint(*SyntheticWebIndexGenerator._WORD_LENGTH_RANGE))))
+
+        vocabulary = sorted(vocabulary)
+        random_.shuffle(vocabulary)
+
+        return vocabulary
+
+    def generate(self, file_path: str) -> None:
+        # The web index is written into a temporary file first, so an interrupted run doesn't leave an incomplete web
+        #  index behind (which would be used by the next run).
+        temporary_path = file_path + ".tmp"
+        with open(temporary_path, "w", newline="") as file:
+            writer = csv.writer(file)
+            for document_number in range(BenchmarkSettings.SYNTHETIC_DOCUMENT_COUNT):
+                writer.writerow([json.dumps(self._generate_document(document_number))])
+
+        os.replace(temporary_path, file_path)
+
+    def _generate_document(self, document_number: int) -> Dict[str, Any]:
+        website_number = self._random.randrange(len(self._domains))
+        url_path = "/".join(self._pick_words(*BenchmarkSettings.SYNTHETIC_URL_PATH_WORDS))
+
+        if self._random.random() < BenchmarkSettings.SYNTHETIC_EMPTY_AUTHOR_PROBABILITY:
+            author = ""
+        else:
+            author = self._authors[website_number]
+
+        return {
+            "final_url": "https://{}/{}/{}".format(self._domains[website_number], document_number, url_path),
+            "title": self._make_text(*BenchmarkSettings.SYNTHETIC_TITLE_WORDS).capitalize(),
+            "headings": self._generate_headings(),
+            "description": self._make_text(*BenchmarkSettings.SYNTHETIC_DESCRIPTION_WORDS).capitalize(),
+            "keywords": ", ".join(self._pick_words(*BenchmarkSettings.SYNTHETIC_KEYWORDS_WORDS)),
+            "author": author,
+            "content_snippet": self._make_text(*BenchmarkSettings.SYNTHETIC_CONTENT_SNIPPET_WORDS).capitalize(),
+            "content_snippet_quality": self._random.choice(SyntheticWebIndexGenerator._CONTENT_SNIPPET_QUALITIES),
+            "image_alts": self._make_text(*BenchmarkSettings.SYNTHETIC_IMAGE_ALTS_WORDS),
+            "link_texts": self._make_text(*BenchmarkSettings.SYNTHETIC_LINK_TEXTS_WORDS)
+        }
+
+    def _generate_headings(self) -> Dict[str, List[str]]:
+        headings = {}
+
+        for level, average_count in enumerate(BenchmarkSettings.SYNTHETIC_HEADINGS_PER_LEVEL, start=1):
+            count = (round(self._random.expovariate(1.0 / average_count)) if average_count > 0 else 0)
+            if count > 0:
+                headings["h{}".format(level)] = [self._make_text(*BenchmarkSettings.SYNTHETIC_HEADING_WORDS).capitalize() for _ in range(count)]
+
+        return headings
+
+    def _make_text(self, min_words: int, max_words: Optional[int] = None) -> str:
+        return " ".join(self._pick_words(min_words, max_words))
+
+    def _pick_words(self, min_words: int, max_words: Optional[int] = None) -> List[str]:
+        word_count = (min_words if max_words is None else self._random.randint(min_words, max_words))
+
+        return self._random.choices(self._vocabulary, cum_weights=self._cumulative_word_weights, k=word_count)
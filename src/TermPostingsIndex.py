@@ -0,0 +1,212 @@
+# SPDX-License-Identifier: BSD-3-Clause
+#
+# Copyright (c) 2021 Vít Labuda. All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without modification, are permitted provided that the
+# following conditions are met:
+#  1. Redistributions of source code must retain the above copyright notice, this list of conditions and the following
+#     disclaimer.
+#  2. Redistributions in binary form must reproduce the above copyright notice, this list of conditions and the
+#     following disclaimer in the documentation and/or other materials provided with the distribution.
+#  3. Neither the name of the copyright holder nor the names of its contributors may be used to endorse or promote
+#     products derived from this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES,
+# INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+# SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+# SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY,
+# WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+
+from __future__ import annotations
+from typing import List, Dict, Tuple, Optional, Iterator, Callable
+import re
+import array
+import heapq
+import bisect
+import collections
+from Settings import Settings
+from WebIndexItem import WebIndexItem
+
+
+# An inverted index of the terms (words) of the searchable fields, used by the term-based searches (see
+#  ClientRequest.term_mode). Each field has its own postings, so the documents are scored with the same per-field
+#  coefficients as the substring searches - a term's score in a field is its frequency multiplied by the field's
+#  coefficient (or, with quotient-based scoring, its frequency divided by the number of terms in the field and
+#  multiplied by the coefficient), and a document's score is the sum of its terms' scores.
+class TermPostingsIndex:
+    _TERM_REGEX: re.Pattern = re.compile(r'\w+')
+    _MAX_HEADING_LEVEL: int = 6
+
+    class _Field:
+        def __init__(self, coefficient: float, document_count: int, has_document_weights: bool):
+            self.coefficient: float = coefficient
+
+            # term -> (the sorted IDs of the documents containing the term in this field, the term's frequencies)
+            self.postings: Dict[str, Tuple[array.array, array.array]] = {}
+
+            # The number of terms in the field of each document.
+            self.lengths: array.array = array.array("I", bytes(4 * document_count))
+
+            # The per-document multipliers of the coefficient (only the content snippet field has them - its coefficient
+            #  is multiplied by the snippet's quality).
+            self.document_weights: Optional[array.array] = (array.array("d", bytes(8 * document_count)) if has_document_weights else None)
+
+    def __init__(self, web_index_items: List[WebIndexItem]):
+        document_count = len(web_index_items)
+
+        self._url_field: TermPostingsIndex._Field = TermPostingsIndex._Field(Settings.SCORE_URL, document_count, False)
+        self._title_field: TermPostingsIndex._Field = TermPostingsIndex._Field(Settings.SCORE_TITLE, document_count, False)
+        # All the headings of the same level are indexed as one field.
+        self._heading_fields: List[TermPostingsIndex._Field] = [TermPostingsIndex._Field(Settings.SCORE_HEADING / level, document_count, False) for level in range(1, TermPostingsIndex._MAX_HEADING_LEVEL + 1)]
+        self._description_field: TermPostingsIndex._Field = TermPostingsIndex._Field(Settings.SCORE_DESCRIPTION, document_count, False)
+        self._keywords_field: TermPostingsIndex._Field = TermPostingsIndex._Field(Settings.SCORE_KEYWORD, document_count, False)
+        self._author_field: TermPostingsIndex._Field = TermPostingsIndex._Field(Settings.SCORE_AUTHOR, document_count, False)
+        self._content_snippet_field: TermPostingsIndex._Field = TermPostingsIndex._Field(Settings.SCORE_CONTENT_SNIPPET, document_count, True)
+        self._image_alts_field: TermPostingsIndex._Field = TermPostingsIndex._Field(Settings.SCORE_IMAGE_ALT, document_count, False)
+        self._link_texts_field: TermPostingsIndex._Field = TermPostingsIndex._Field(Settings.SCORE_LINK_TEXT, document_count, False)
+
+        self._fields: List[TermPostingsIndex._Field] = [self._url_field, self._title_field] + self._heading_fields + [self._description_field, self._keywords_field, self._author_field, self._content_snippet_field, self._image_alts_field, self._link_texts_field]
+
+        self._add_documents(0, web_index_items)
+
+    # See TrigramIndex.add_documents() - the same applies to the postings here; the per-document arrays are extended
+    #  in place too, as the searches only read the items of the documents they can see.
+    def add_documents(self, first_document_id: int, web_index_items: List[WebIndexItem]) -> None:
+        for field in self._fields:
+            field.lengths.frombytes(bytes(4 * len(web_index_items)))
+            if field.document_weights is not None:
+                field.document_weights.frombytes(bytes(8 * len(web_index_items)))
+
+        self._add_documents(first_document_id, web_index_items)
+
+    def _add_documents(self, first_document_id: int, web_index_items: List[WebIndexItem]) -> None:
+        # The documents are added in ascending order of their IDs, so each posting list ends up being sorted.
+        for document_id, web_index_item in enumerate(web_index_items, first_document_id):
+            for field, text_lc in self._get_document_fields(web_index_item):
+                self._add_field_text(field, document_id, text_lc)
+
+            self._content_snippet_field.document_weights[document_id] = web_index_item.content_snippet_quality
+
+    def _get_document_fields(self, web_index_item: WebIndexItem) -> Iterator[Tuple[TermPostingsIndex._Field, str]]:
+        yield self._url_field, web_index_item.url_lc
+        yield self._title_field, web_index_item.title_lc
+
+        heading_texts_lc = collections.defaultdict(list)
+        for heading_level, heading_text_lc in web_index_item.get_headings_lc():
+            heading_texts_lc[heading_level].append(heading_text_lc)
+        for level, texts_lc in heading_texts_lc.items():
+            yield self._heading_fields[level - 1], " ".join(texts_lc)
+
+        yield self._description_field, web_index_item.description_lc
+        yield self._keywords_field, web_index_item.keywords_lc
+        yield self._author_field, web_index_item.author_lc
+        yield self._content_snippet_field, web_index_item.content_snippet_lc
+        yield self._image_alts_field, web_index_item.image_alts_lc
+        yield self._link_texts_field, web_index_item.link_texts_lc
+
+    def _add_field_text(self, field: TermPostingsIndex._Field, document_id: int, text_lc: str) -> None:
+        terms = TermPostingsIndex.get_terms(text_lc)
+        field.lengths[document_id] = len(terms)
+
+        for term, term_frequency in collections.Counter(terms).items():
+            posting = field.postings.get(term)
+            if posting is None:
+                posting = field.postings[term] = (array.array("I"), array.array("I"))
+            posting[0].append(document_id)
+            posting[1].append(term_frequency)
+
+    # Splits the (lowercased) text into terms; the search queries are split in the same way as the indexed fields.
+    @staticmethod
+    def get_terms(text_lc: str) -> List[str]:
+        return TermPostingsIndex._TERM_REGEX.findall(text_lc)
+
+    # Returns the (document ID, score) pairs of the documents containing all (if match_all_terms is true) or any of the
+    #  query's terms, ordered in the same way as SearchPerformer.rank_documents() orders them. If a shard is specified,
+    #  only the documents belonging to it are searched (see SearchPerformer). Only the documents with IDs lower than
+    #  the document count which are not removed (if is_document_removed is specified, see WebIndex) are searched.
+    def rank_documents(self, canonical_search_query: str, match_all_terms: bool, use_quotient_based_scoring: bool, max_results: int, document_count: int, is_document_removed: Optional[Callable[[int], bool]], shard: Optional[Tuple[int, int]] = None) -> List[Tuple[int, float]]:
+        terms = list(dict.fromkeys(TermPostingsIndex.get_terms(canonical_search_query)))
+        if not terms:
+            return []
+
+        # The terms with the shortest posting lists are processed first; when all the terms have to match, the
+        #  documents not containing them are dropped early, so the longer posting lists are only probed for the
+        #  remaining documents.
+        terms.sort(key=self._get_posting_count)
+
+        scores = self._get_term_scores(terms[0], use_quotient_based_scoring, None, document_count, shard)
+        for term in terms[1:]:
+            if match_all_terms:
+                if not scores:
+                    break
+                term_scores = self._get_term_scores(term, use_quotient_based_scoring, scores, document_count, shard)
+                scores = {document_id: score + term_scores[document_id] for document_id, score in scores.items() if document_id in term_scores}
+            else:
+                for document_id, term_score in self._get_term_scores(term, use_quotient_based_scoring, None, document_count, shard).items():
+                    scores[document_id] = scores.get(document_id, 0.0) + term_score
+
+        ranked_documents = ((document_id, score) for document_id, score in scores.items() if score >= Settings.MINIMAL_SCORE)
+        if is_document_removed is not None:
+            ranked_documents = ((document_id, score) for document_id, score in ranked_documents if not is_document_removed(document_id))
+
+        return heapq.nsmallest(max_results, ranked_documents, key=lambda item: (-item[1], item[0]))
+
+    def _get_posting_count(self, term: str) -> int:
+        return sum(len(field.postings[term][0]) for field in self._fields if term in field.postings)
+
+    # If candidate document IDs are specified, only their scores are computed.
+    def _get_term_scores(self, term: str, use_quotient_based_scoring: bool, candidate_document_ids: Optional[Dict[int, float]], document_count: int, shard: Optional[Tuple[int, int]]) -> Dict[int, float]:
+        scores = {}
+        sorted_candidate_document_ids = None
+
+        for field in self._fields:
+            posting = field.postings.get(term)
+            if posting is None:
+                continue
+
+            # If there are only a few candidates compared to the length of the posting list, they are looked up in it by
+            #  binary searches instead of walking the whole list. The candidates are already limited to the documents
+            #  the search can see.
+            if (candidate_document_ids is not None) and (len(candidate_document_ids) * len(posting[0]).bit_length() < len(posting[0])):
+                if sorted_candidate_document_ids is None:
+                    sorted_candidate_document_ids = sorted(candidate_document_ids)
+                matching_postings = self._look_up_postings(posting, sorted_candidate_document_ids)
+            else:
+                matching_postings = self._walk_postings(posting, candidate_document_ids, document_count, shard)
+
+            for document_id, term_frequency in matching_postings:
+                score = ((term_frequency / field.lengths[document_id]) if use_quotient_based_scoring else term_frequency)
+                if field.document_weights is not None:
+                    score *= field.document_weights[document_id]
+                score *= field.coefficient
+
+                scores[document_id] = scores.get(document_id, 0.0) + score
+
+        return scores
+
+    def _walk_postings(self, posting: Tuple[array.array, array.array], candidate_document_ids: Optional[Dict[int, float]], document_count: int, shard: Optional[Tuple[int, int]]) -> Iterator[Tuple[int, int]]:
+        for document_id, term_frequency in zip(*posting):
+            if document_id >= document_count:
+                break  # The posting lists are sorted
+            if (candidate_document_ids is not None) and (document_id not in candidate_document_ids):
+                continue
+            if (shard is not None) and (document_id % shard[1] != shard[0]):
+                continue
+
+            yield document_id, term_frequency
+
+    def _look_up_postings(self, posting: Tuple[array.array, array.array], sorted_candidate_document_ids: List[int]) -> Iterator[Tuple[int, int]]:
+        document_ids, term_frequencies = posting
+
+        # The candidates are sorted too, so each binary search starts where the previous one has ended.
+        position = 0
+        for document_id in sorted_candidate_document_ids:
+            position = bisect.bisect_left(document_ids, document_id, position)
+            if position == len(document_ids):
+                break
+
+            if document_ids[position] == document_id:
+                yield document_id, term_frequencies[position]
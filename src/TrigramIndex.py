@@ -0,0 +1,84 @@
+# SPDX-License-Identifier: BSD-3-Clause
+#
+# Copyright (c) 2021 Vít Labuda. All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without modification, are permitted provided that the
+# following conditions are met:
+#  1. Redistributions of source code must retain the above copyright notice, this list of conditions and the following
+#     disclaimer.
+#  2. Redistributions in binary form must reproduce the above copyright notice, this list of conditions and the
+#     following disclaimer in the documentation and/or other materials provided with the distribution.
+#  3. Neither the name of the copyright holder nor the names of its contributors may be used to endorse or promote
+#     products derived from this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES,
+# INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+# SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+# SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY,
+# WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+
+from typing import List, Dict, Set, Iterable, Optional
+import array
+from WebIndexItem import WebIndexItem
+
+
+class TrigramIndex:
+    # The queries shorter than this cannot be looked up in the index, so all the documents are candidates for them.
+    TRIGRAM_LENGTH: int = 3
+
+    def __init__(self, web_index_items: List[WebIndexItem]):
+        self._postings: Dict[str, array.array] = {}
+        self.add_documents(0, web_index_items)
+
+    # The documents are added in ascending order of their IDs, so each posting list ends up being sorted. The documents
+    #  added later (see WebIndex.create_updated_index()) must have higher IDs than the ones already in the index; the
+    #  posting lists are only appended to, so the searches which are running meanwhile just get candidates they can't
+    #  see yet, and drop them.
+    def add_documents(self, first_document_id: int, web_index_items: List[WebIndexItem]) -> None:
+        postings = self._postings
+
+        for document_id, web_index_item in enumerate(web_index_items, first_document_id):
+            for trigram in self._get_document_trigrams(web_index_item.get_searchable_texts_lc()):
+                posting_list = postings.get(trigram)
+                if posting_list is None:
+                    posting_list = postings[trigram] = array.array("I")
+                posting_list.append(document_id)
+
+    def _get_document_trigrams(self, texts_lc: Iterable[str]) -> Set[str]:
+        trigrams = set()
+
+        # The trigrams are extracted from each field separately - a trigram spanning two fields would never match anything.
+        for text_lc in texts_lc:
+            trigrams.update(self._get_text_trigrams(text_lc))
+
+        return trigrams
+
+    def _get_text_trigrams(self, text_lc: str) -> Set[str]:
+        return {text_lc[i:i + TrigramIndex.TRIGRAM_LENGTH] for i in range(len(text_lc) - TrigramIndex.TRIGRAM_LENGTH + 1)}
+
+    # Returns the sorted IDs of the documents containing all the query's trigrams, or None if the query is too short
+    #  to be looked up in the index. Every document containing the query is guaranteed to be among the candidates.
+    def get_candidate_document_ids(self, canonical_search_query: str) -> Optional[List[int]]:
+        query_trigrams = self._get_text_trigrams(canonical_search_query)
+        if not query_trigrams:
+            return None
+
+        posting_lists = []
+        for trigram in query_trigrams:
+            posting_list = self._postings.get(trigram)
+            if posting_list is None:
+                return []  # If any of the trigrams isn't in the index, no document can contain the query
+            posting_lists.append(posting_list)
+
+        # Intersecting the shortest posting lists first keeps the intermediate candidate set as small as possible.
+        posting_lists.sort(key=len)
+        candidates = set(posting_lists[0])
+        for posting_list in posting_lists[1:]:
+            if not candidates:
+                break
+            candidates.intersection_update(posting_list)
+
+        return sorted(candidates)
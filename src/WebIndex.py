@@ -0,0 +1,154 @@
+# SPDX-License-Identifier: BSD-3-Clause
+#
+# Copyright (c) 2021 Vít Labuda. All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without modification, are permitted provided that the
+# following conditions are met:
+#  1. Redistributions of source code must retain the above copyright notice, this list of conditions and the following
+#     disclaimer.
+#  2. Redistributions in binary form must reproduce the above copyright notice, this list of conditions and the
+#     following disclaimer in the documentation and/or other materials provided with the distribution.
+#  3. Neither the name of the copyright holder nor the names of its contributors may be used to endorse or promote
+#     products derived from this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES,
+# INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+# SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+# SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY,
+# WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+
+from __future__ import annotations
+from typing import List, Sequence, Optional, Tuple, Iterable
+import copy
+import array
+import bisect
+from Settings import Settings
+from WebIndexItem import WebIndexItem
+from TrigramIndex import TrigramIndex
+from TermPostingsIndex import TermPostingsIndex
+from ScoreUpperBounds import ScoreUpperBounds
+from ColumnarScoringEngine import ColumnarScoringEngine
+from AutocompleteIndex import AutocompleteIndex
+from DocumentStore import DocumentStore
+from SpiderimentSearchServerRuntimeError import SpiderimentSearchServerRuntimeError
+
+
+class WebIndex:
+    def __init__(self, items: List[WebIndexItem], document_store: Optional[DocumentStore] = None):
+        # The position of an item in the list serves as its document ID in the auxiliary search structures.
+        self.items: List[WebIndexItem] = items
+
+        # The items list and the auxiliary search structures are shared by the updated copies of the web index (see
+        #  create_updated_index()), which append the added documents to them; each copy only sees the documents with IDs
+        #  lower than its document count, except for the ones it has removed. The removed documents are flagged by a
+        #  non-zero byte at the index of their ID (the documents beyond the end of the flags are not removed); the flags
+        #  are None until a document is removed. The removed documents are only reclaimed when the web index is
+        #  reloaded, as the delta file is merged into the loaded items then (see WebIndexDeltaUpdater).
+        self.document_count: int = len(items)
+        self.removed_document_count: int = 0
+        self.removed_document_flags: Optional[bytearray] = None
+
+        # The IDs of the documents which are not removed, built the first time a query which cannot be narrowed down by
+        #  the trigram index is searched (see get_candidate_document_ids()).
+        self._live_document_ids: Optional[array.array] = None
+
+        # If set, the display fields of the items it contains have been released (see
+        #  WebIndexLoader.create_document_store()).
+        self.document_store: Optional[DocumentStore] = document_store
+
+        self.trigram_index: Optional[TrigramIndex] = (TrigramIndex(items) if Settings.USE_TRIGRAM_INDEX else None)
+        self.term_postings_index: Optional[TermPostingsIndex] = (TermPostingsIndex(items) if Settings.USE_TERM_POSTINGS_INDEX else None)
+        self.score_upper_bounds: ScoreUpperBounds = ScoreUpperBounds(items)
+        self.columnar_scoring_engine: Optional[ColumnarScoringEngine] = (ColumnarScoringEngine(items, self.score_upper_bounds) if Settings.USE_COLUMNAR_SCORING_ENGINE else None)
+        self.autocomplete_index: Optional[AutocompleteIndex] = (AutocompleteIndex(items, Settings.AUTOCOMPLETE_MAX_COMPLETIONS, Settings.AUTOCOMPLETE_MAX_PHRASE_LENGTH) if Settings.USE_AUTOCOMPLETE_INDEX else None)
+
+    # Returns the number of documents which can be found in the web index.
+    def get_live_document_count(self) -> int:
+        return self.document_count - self.removed_document_count
+
+    def is_document_removed(self, document_id: int) -> bool:
+        removed_document_flags = self.removed_document_flags
+
+        return (removed_document_flags is not None) and (document_id < len(removed_document_flags)) and (removed_document_flags[document_id] != 0)
+
+    # Returns a copy of the web index with the specified documents added to it and removed from it; the added documents
+    #  get consecutive IDs following the existing ones (a replaced document is removed and added again under a new ID).
+    #  The auxiliary search structures are updated in place where they are only appended to, and copied otherwise, so
+    #  the searches which are still running in this web index are not affected. The autocomplete index is shared as it
+    #  is, so it only reflects the updates once the web index is reloaded. The web indexes must be updated in a chain,
+    #  i.e. this method must not be called on an index which has already been updated.
+    def create_updated_index(self, added_items: List[WebIndexItem], removed_document_ids: Iterable[int]) -> WebIndex:
+        if self.document_count != len(self.items):
+            raise SpiderimentSearchServerRuntimeError("An outdated web index cannot be updated!")
+
+        first_added_document_id = self.document_count
+        document_count = first_added_document_id + len(added_items)
+
+        # The flags are only copied if the update removes any documents.
+        removed_document_ids = list(removed_document_ids)
+        removed_document_flags = self.removed_document_flags
+        if removed_document_ids:
+            removed_document_flags = bytearray(first_added_document_id)
+            if self.removed_document_flags is not None:
+                removed_document_flags[:len(self.removed_document_flags)] = self.removed_document_flags
+            for document_id in removed_document_ids:
+                removed_document_flags[document_id] = 1
+        removed_document_count = self.removed_document_count + len(removed_document_ids)
+
+        if self.trigram_index is not None:
+            self.trigram_index.add_documents(first_added_document_id, added_items)
+        if self.term_postings_index is not None:
+            self.term_postings_index.add_documents(first_added_document_id, added_items)
+        score_upper_bounds = self.score_upper_bounds.create_updated(added_items, document_count - removed_document_count, removed_document_flags)
+        columnar_scoring_engine = (self.columnar_scoring_engine.create_updated(added_items, score_upper_bounds) if self.columnar_scoring_engine is not None else None)
+
+        # The items are published last, once the structures contain everything the new documents need.
+        self.items.extend(added_items)
+
+        updated_index = copy.copy(self)
+        updated_index.document_count = document_count
+        updated_index.removed_document_count = removed_document_count
+        updated_index.removed_document_flags = removed_document_flags
+        updated_index._live_document_ids = None
+        updated_index.score_upper_bounds = score_upper_bounds
+        updated_index.columnar_scoring_engine = columnar_scoring_engine
+
+        return updated_index
+
+    # Returns the sorted IDs of the documents which have to be scored for the specified query.
+    def get_candidate_document_ids(self, canonical_search_query: str) -> Sequence[int]:
+        if self.trigram_index is not None:
+            candidate_document_ids = self.trigram_index.get_candidate_document_ids(canonical_search_query)
+            if candidate_document_ids is not None:
+                # The candidates added to the shared trigram index after this web index was created are dropped.
+                del candidate_document_ids[bisect.bisect_left(candidate_document_ids, self.document_count):]
+                if self.removed_document_count > 0:
+                    return [document_id for document_id in candidate_document_ids if not self.is_document_removed(document_id)]
+                return candidate_document_ids
+
+        if self.removed_document_count > 0:
+            return self._get_live_document_ids()
+
+        return range(self.document_count)
+
+    def _get_live_document_ids(self) -> array.array:
+        # If multiple threads build the IDs at once, they just build the same array.
+        if self._live_document_ids is None:
+            removed_document_flags = self.removed_document_flags
+            live_document_ids = array.array("I", (document_id for document_id, is_removed in enumerate(removed_document_flags) if not is_removed))
+            live_document_ids.extend(range(len(removed_document_flags), self.document_count))
+            self._live_document_ids = live_document_ids
+
+        return self._live_document_ids
+
+    # Returns the original URL, title and content snippet of the document.
+    def get_display_fields(self, document_id: int) -> Tuple[str, str, str]:
+        # The documents added by updates keep their display fields (see create_updated_index()).
+        if (self.document_store is not None) and (document_id < self.document_store.get_document_count()):
+            return self.document_store.get_display_fields(document_id)
+
+        web_index_item = self.items[document_id]
+        return web_index_item.url, web_index_item.title, web_index_item.content_snippet
@@ -0,0 +1,154 @@
+# SPDX-License-Identifier: BSD-3-Clause
+#
+# Copyright (c) 2021 Vít Labuda. All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without modification, are permitted provided that the
+# following conditions are met:
+#  1. Redistributions of source code must retain the above copyright notice, this list of conditions and the following
+#     disclaimer.
+#  2. Redistributions in binary form must reproduce the above copyright notice, this list of conditions and the
+#     following disclaimer in the documentation and/or other materials provided with the distribution.
+#  3. Neither the name of the copyright holder nor the names of its contributors may be used to endorse or promote
+#     products derived from this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES,
+# INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+# SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+# SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY,
+# WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+
+from __future__ import annotations
+from typing import List, Dict, Tuple, Set, Optional, BinaryIO
+import os
+import logging
+from Settings import Settings
+from WebIndexItem import WebIndexItem
+from WebIndexIngestionPipeline import WebIndexIngestionPipeline
+
+
+# Tails the append-only delta file, whose rows have the same format as the ones in the web index file. Each row adds a
+#  document to the web index, or replaces the document with the same final URL if there is one. The updater belongs to
+#  a single base web index: the whole delta file is merged into its items when it is loaded (see merge_into_items()),
+#  and the rows appended to the file later are applied to it as updates (see read_update()). Once the web index is
+#  reloaded, a new updater merges the whole delta file into the new one.
+class WebIndexDeltaUpdater:
+    def __init__(self, logger: logging.Logger, file_path: str):
+        self._logger: logging.Logger = logger
+        self._file_path: str = file_path
+
+        # The position up to which the file has been applied, and the (device, inode) pair of the file it belongs to. If
+        #  the file is replaced or truncated, it is read from the beginning again - the rows replace the documents by
+        #  their URL, so reapplying the rows which have already been applied is harmless.
+        self._file_offset: int = 0
+        self._file_identity: Optional[Tuple[int, int]] = None
+
+        # These are filled in by merge_into_items().
+        self._next_document_id: int = 0
+        self._document_ids_by_url: Dict[str, int] = {}
+
+    # Returns None if the delta file is disabled in the settings.
+    @staticmethod
+    def create_from_settings(logger: logging.Logger) -> Optional[WebIndexDeltaUpdater]:
+        if Settings.WEB_INDEX_DELTA_FILE_PATH is None:
+            return None
+
+        return WebIndexDeltaUpdater(logger, Settings.WEB_INDEX_DELTA_FILE_PATH)
+
+    # Merges all the rows of the delta file into the items loaded from the web index file, before the web index is built
+    #  from them (and before their display fields are released): each row replacing a document takes its place (and
+    #  ID), and the other rows are appended. This way, the documents replaced by the delta file don't stay in the web
+    #  index as removed documents after it is (re)loaded. Returns the number of added and replaced documents.
+    def merge_into_items(self, web_index_items: List[WebIndexItem]) -> Tuple[int, int]:
+        self._document_ids_by_url = self._map_document_urls(web_index_items)
+
+        added_document_count, replaced_document_count = 0, 0
+        for url, web_index_item in self._read_rows(None).items():
+            document_id = self._document_ids_by_url.get(url)
+            if document_id is None:
+                self._document_ids_by_url[url] = len(web_index_items)
+                web_index_items.append(web_index_item)
+                added_document_count += 1
+            else:
+                web_index_items[document_id] = web_index_item
+                replaced_document_count += 1
+
+        self._next_document_id = len(web_index_items)
+
+        return added_document_count, replaced_document_count
+
+    def _map_document_urls(self, web_index_items: List[WebIndexItem]) -> Dict[str, int]:
+        document_ids_by_url = {}
+
+        for document_id, web_index_item in enumerate(web_index_items):
+            # Most URLs are lowercase, so the item's lowercased URL can be used instead of another copy of the string.
+            document_ids_by_url[(web_index_item.url_lc if web_index_item.url == web_index_item.url_lc else web_index_item.url)] = document_id
+
+        return document_ids_by_url
+
+    # Returns the items of the rows appended to the delta file since the last call (at most max_rows of them, if set),
+    #  and the IDs of the documents they replace; the items are expected to be added to the web index with consecutive
+    #  IDs following the existing ones, in the returned order.
+    def read_update(self, max_rows: Optional[int]) -> Tuple[List[WebIndexItem], Set[int]]:
+        items_by_url = self._read_rows(max_rows)
+
+        added_items = list(items_by_url.values())
+        removed_document_ids = {self._document_ids_by_url[url] for url in items_by_url.keys() if url in self._document_ids_by_url}
+
+        for document_id, url in enumerate(items_by_url.keys(), self._next_document_id):
+            self._document_ids_by_url[url] = document_id
+        self._next_document_id += len(added_items)
+
+        return added_items, removed_document_ids
+
+    # Returns the items of the rows appended since the last call by their URL; only the last row of each URL is kept.
+    #  The incomplete last row is left for the next call, as the writer might not have finished writing it yet.
+    def _read_rows(self, max_rows: Optional[int]) -> Dict[str, WebIndexItem]:
+        items_by_url: Dict[str, WebIndexItem] = {}
+
+        try:
+            file = open(self._file_path, "rb")
+        except FileNotFoundError:
+            return items_by_url  # The file might not have been created yet
+
+        with file:
+            self._check_file_identity(file)
+            file.seek(self._file_offset)
+
+            row_count = 0
+            while (max_rows is None) or (row_count < max_rows):
+                line = file.readline()
+                if not line.endswith(b"\n"):
+                    break
+
+                row_count += 1
+                self._parse_row(line, items_by_url)
+                self._file_offset += len(line)
+
+        return items_by_url
+
+    def _check_file_identity(self, file: BinaryIO) -> None:
+        file_stat = os.fstat(file.fileno())
+        file_identity = (file_stat.st_dev, file_stat.st_ino)
+
+        if (file_identity != self._file_identity) or (file_stat.st_size < self._file_offset):
+            if self._file_identity is not None:
+                self._logger.info("The delta file \"{}\" has been replaced or truncated; it will be read from the beginning.".format(self._file_path))
+
+            self._file_offset = 0
+            self._file_identity = file_identity
+
+    def _parse_row(self, line: bytes, items_by_url: Dict[str, WebIndexItem]) -> None:
+        # An invalid row is skipped, so that it doesn't stop the rows after it from being applied.
+        try:
+            web_index_items, _ = WebIndexIngestionPipeline.parse_chunk(line)
+        except Exception as e:
+            self._logger.warning("Skipping an invalid row at offset {} of the delta file \"{}\"! ({}: {})".format(self._file_offset, self._file_path, e.__class__.__name__, e))
+            return
+
+        for web_index_item in web_index_items:
+            # Moving the item to the end of the dictionary keeps the items in the order of their last rows.
+            items_by_url.pop(web_index_item.url, None)
+            items_by_url[web_index_item.url] = web_index_item
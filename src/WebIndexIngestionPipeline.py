@@ -0,0 +1,213 @@
+# SPDX-License-Identifier: BSD-3-Clause
+#
+# Copyright (c) 2021 Vít Labuda. All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without modification, are permitted provided that the
+# following conditions are met:
+#  1. Redistributions of source code must retain the above copyright notice, this list of conditions and the following
+#     disclaimer.
+#  2. Redistributions in binary form must reproduce the above copyright notice, this list of conditions and the
+#     following disclaimer in the documentation and/or other materials provided with the distribution.
+#  3. Neither the name of the copyright holder nor the names of its contributors may be used to endorse or promote
+#     products derived from this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES,
+# INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+# SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+# SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY,
+# WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+
+from typing import List, Tuple, Iterator, Optional, BinaryIO
+import os
+import io
+import csv
+import gzip
+import json
+import time
+import logging
+import threading
+import collections
+import multiprocessing
+import concurrent.futures
+from WebIndexItem import WebIndexItem
+from SpiderimentSearchServerRuntimeError import SpiderimentSearchServerRuntimeError
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+
+class WebIndexIngestionPipeline:
+    # The web index file is split into chunks which are parsed in parallel by a pool of worker processes. The chunks are
+    #  split at line boundaries - each record of the web index is a single line, as the JSON it contains never has any
+    #  raw line breaks in it (the crawler escapes them). At most _IN_FLIGHT_CHUNKS_PER_PROCESS chunks per process are
+    #  being parsed or waiting to be collected at any time, so the peak memory usage is bounded by the chunk size plus
+    #  the final web index, and not by the size of the file.
+    _IN_FLIGHT_CHUNKS_PER_PROCESS: int = 2
+    _PROGRESS_LOGGING_INTERVAL: float = 5.0  # in seconds
+
+    _GZIP_MAGIC: bytes = b"\x1f\x8b"
+    _ZSTD_MAGIC: bytes = b"\x28\xb5\x2f\xfd"
+
+    def __init__(self, logger: logging.Logger, process_count: int, chunk_size: int):
+        self._logger: logging.Logger = logger
+        self._process_count: int = max(1, process_count)
+        self._chunk_size: int = max(1, chunk_size)
+
+        self._processed_rows: int = 0
+        self._processed_bytes: int = 0
+        self._start_time: float = 0.0
+        self._last_progress_log_time: float = 0.0
+
+    def load_items(self, file_path: str) -> List[WebIndexItem]:
+        self._processed_rows, self._processed_bytes = 0, 0
+        self._start_time = self._last_progress_log_time = time.perf_counter()
+
+        compression = self._detect_compression(file_path)
+        if compression is None:
+            chunk_jobs = ((WebIndexIngestionPipeline._parse_file_range, file_path, start, end) for start, end in self._split_file_into_ranges(file_path))
+        else:
+            self._logger.debug("The web index file is {}-compressed; it will be decompressed while being loaded.".format(compression))
+            chunk_jobs = ((WebIndexIngestionPipeline.parse_chunk, chunk) for chunk in self._read_decompressed_chunks(file_path, compression))
+
+        web_index_items = []
+        for chunk_items, chunk_size in self._run_chunk_jobs(chunk_jobs):
+            web_index_items += chunk_items
+            self._report_progress(len(chunk_items), chunk_size)
+
+        self._log_progress("Finished loading the web index")
+
+        return web_index_items
+
+    # Opens the web index file for reading; if it is compressed, it is decompressed while being read.
+    def open_file(self, file_path: str) -> BinaryIO:
+        compression = self._detect_compression(file_path)
+        if compression is None:
+            return open(file_path, "rb")
+
+        return self._open_decompressed_file(file_path, compression)
+
+    def _detect_compression(self, file_path: str) -> Optional[str]:
+        with open(file_path, "rb") as file:
+            magic = file.read(4)
+
+        if magic.startswith(WebIndexIngestionPipeline._GZIP_MAGIC):
+            return "gzip"
+
+        if magic.startswith(WebIndexIngestionPipeline._ZSTD_MAGIC):
+            if zstandard is None:
+                raise SpiderimentSearchServerRuntimeError("The web index file is zstd-compressed, but the 'zstandard' library is not installed!")
+            return "zstd"
+
+        return None
+
+    def _split_file_into_ranges(self, file_path: str) -> Iterator[Tuple[int, int]]:
+        file_size = os.path.getsize(file_path)
+
+        with open(file_path, "rb") as file:
+            start = 0
+            while start < file_size:
+                # Each range is extended up to the end of the line it would otherwise end in the middle of.
+                file.seek(min(start + self._chunk_size, file_size))
+                file.readline()
+                end = file.tell()
+
+                yield start, end
+                start = end
+
+    def _read_decompressed_chunks(self, file_path: str, compression: str) -> Iterator[bytes]:
+        with self._open_decompressed_file(file_path, compression) as file:
+            incomplete_line = b""
+
+            while True:
+                data = file.read(self._chunk_size)
+                if not data:
+                    break
+
+                # The part after the last line break is prepended to the next chunk.
+                last_line_break = data.rfind(b"\n")
+                if last_line_break == -1:
+                    incomplete_line += data
+                    continue
+
+                yield incomplete_line + data[:last_line_break + 1]
+                incomplete_line = data[last_line_break + 1:]
+
+            if incomplete_line:
+                yield incomplete_line
+
+    def _open_decompressed_file(self, file_path: str, compression: str) -> BinaryIO:
+        if compression == "gzip":
+            return gzip.open(file_path, "rb")
+
+        # The stream reader closes the underlying file when it is closed.
+        return zstandard.ZstdDecompressor().stream_reader(open(file_path, "rb"), read_across_frames=True, closefd=True)
+
+    def _run_chunk_jobs(self, chunk_jobs: Iterator[tuple]) -> Iterator[Tuple[List[WebIndexItem], int]]:
+        if self._process_count == 1:
+            for function, *arguments in chunk_jobs:
+                yield function(*arguments)
+            return
+
+        max_in_flight_chunks = self._process_count * WebIndexIngestionPipeline._IN_FLIGHT_CHUNKS_PER_PROCESS
+
+        # The chunks' results are collected in the order the chunks were submitted, so the items end up in the same order
+        #  as in the file (the order of the items determines the order of the results with the same score).
+        with concurrent.futures.ProcessPoolExecutor(max_workers=self._process_count, mp_context=self._get_multiprocessing_context()) as executor:
+            in_flight_chunks = collections.deque()
+
+            for function, *arguments in chunk_jobs:
+                in_flight_chunks.append(executor.submit(function, *arguments))
+
+                if len(in_flight_chunks) >= max_in_flight_chunks:
+                    yield in_flight_chunks.popleft().result()
+
+            while in_flight_chunks:
+                yield in_flight_chunks.popleft().result()
+
+    # The parsing processes are forked if the process is single-threaded (i.e. when the web index is loaded at startup or
+    #  by the supervising process of the pre-forked mode), as it's the fastest way to start them. When the web index is
+    #  reloaded in a server whose threads are serving the clients, one of the other threads might hold a lock the
+    #  forked processes would need (e.g. one of the logging module), so the processes are spawned as new interpreters;
+    #  the parsing doesn't depend on anything in the parent's memory.
+    def _get_multiprocessing_context(self) -> multiprocessing.context.BaseContext:
+        if threading.active_count() == 1:
+            return multiprocessing.get_context("fork")
+
+        return multiprocessing.get_context("spawn")
+
+    @staticmethod
+    def _parse_file_range(file_path: str, start: int, end: int) -> Tuple[List[WebIndexItem], int]:
+        with open(file_path, "rb") as file:
+            file.seek(start)
+            chunk = file.read(end - start)
+
+        return WebIndexIngestionPipeline.parse_chunk(chunk)
+
+    # Also used to parse the rows of the delta file (see WebIndexDeltaUpdater).
+    @staticmethod
+    def parse_chunk(chunk: bytes) -> Tuple[List[WebIndexItem], int]:
+        reader = csv.reader(io.StringIO(chunk.decode("utf-8"), newline=""))
+        web_index_items = [WebIndexItem.from_parsed_json(json.loads(csv_line[0])) for csv_line in reader]
+
+        return web_index_items, len(chunk)
+
+    def _report_progress(self, row_count: int, byte_count: int) -> None:
+        self._processed_rows += row_count
+        self._processed_bytes += byte_count
+
+        if (time.perf_counter() - self._last_progress_log_time) >= WebIndexIngestionPipeline._PROGRESS_LOGGING_INTERVAL:
+            self._log_progress("Loading the web index")
+            self._last_progress_log_time = time.perf_counter()
+
+    def _log_progress(self, message: str) -> None:
+        elapsed_time = max(time.perf_counter() - self._start_time, 1e-9)
+        processed_megabytes = self._processed_bytes / 1000000
+
+        self._logger.debug("{}: {} rows ({:.1f} MB) in {:.1f} s; {:.0f} rows/s, {:.1f} MB/s".format(
+            message, self._processed_rows, processed_megabytes, elapsed_time, self._processed_rows / elapsed_time, processed_megabytes / elapsed_time
+        ))
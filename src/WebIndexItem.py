@@ -21,37 +21,108 @@
 
 
 from __future__ import annotations
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Iterator, Tuple, Union, Optional
 import re
+import array
 from SpiderimentSearchServerRuntimeError import SpiderimentSearchServerRuntimeError
 
 
 class WebIndexItem:
     _HEADING_LEVEL_PARSER_REGEX: re.Pattern = re.compile(r'^h([1-6])$')
 
-    class PageHeading:
-        def __init__(self, level: int, text_lc: str):
-            self.level: int = level
-            self.text_lc: str = text_lc
-
-    def __init__(self, parsed_json: Dict[str, Any]):
-        self.url: str = str(parsed_json["final_url"])
+    # There are lots of items in the web index, so they don't have the per-instance __dict__ (which would take more
+    #  memory than most of the fields' values).
+    __slots__ = ("url", "url_lc", "title", "title_lc", "heading_levels", "headings_lc", "description_lc", "keywords_lc", "author_lc", "content_snippet", "content_snippet_lc", "content_snippet_quality", "image_alts_lc", "link_texts_lc")
 
+    def __init__(self, url: str, title: str, heading_levels: array.array, headings_lc: Tuple[str, ...], description_lc: str, keywords_lc: str, author_lc: str, content_snippet: str, content_snippet_quality: float, image_alts_lc: str, link_texts_lc: str):
         # Converting the string metadata to lowercase makes the search faster, because they are already canonicalized.
         # However, it's not possible to lowercase the items, that are copied to the search result which is then sent to the client (the client should receive the original text).
-        self.title: str = str(parsed_json["title"])
-        self.headings_lc: List[WebIndexItem.PageHeading] = self._parse_headings(parsed_json["headings"])
-        self.description_lc: str = str(parsed_json["description"]).lower()
-        self.keywords_lc: str = str(parsed_json["keywords"]).lower()
-        self.author_lc: str = str(parsed_json["author"]).lower()
+        # Therefore, both the original and the lowercased versions of these are kept (if they differ).
+        # The original URL, title and content snippet are None if they are kept in the document store (see
+        #  release_display_fields()).
+        self.url: Optional[str] = url
+        self.url_lc: str = WebIndexItem._lowercase(url)
+        self.title: Optional[str] = title
+        self.title_lc: str = WebIndexItem._lowercase(title)
+
+        # The level of the heading N is stored at the index N of the heading levels array.
+        self.heading_levels: array.array = heading_levels
+        self.headings_lc: Tuple[str, ...] = headings_lc
+
+        self.description_lc: str = description_lc
+        self.keywords_lc: str = keywords_lc
+        self.author_lc: str = author_lc
+
+        self.content_snippet: Optional[str] = content_snippet
+        self.content_snippet_lc: str = WebIndexItem._lowercase(content_snippet)
+        self.content_snippet_quality: float = content_snippet_quality
+        self.image_alts_lc: str = image_alts_lc
+        self.link_texts_lc: str = link_texts_lc
+
+    @staticmethod
+    def _lowercase(text: str) -> str:
+        # If the text is already lowercase, the lowercased copy would just waste memory.
+        text_lc = text.lower()
+
+        return (text if text_lc == text else text_lc)
+
+    @staticmethod
+    def from_parsed_json(parsed_json: Dict[str, Any]) -> WebIndexItem:
+        heading_levels, headings_lc = WebIndexItem._parse_headings(parsed_json["headings"])
+
+        return WebIndexItem(
+            url=str(parsed_json["final_url"]),
+            title=str(parsed_json["title"]),
+            heading_levels=heading_levels,
+            headings_lc=headings_lc,
+            description_lc=str(parsed_json["description"]).lower(),
+            keywords_lc=str(parsed_json["keywords"]).lower(),
+            author_lc=str(parsed_json["author"]).lower(),
+            content_snippet=str(parsed_json["content_snippet"]),
+            content_snippet_quality=float(parsed_json["content_snippet_quality"]),
+            image_alts_lc=str(parsed_json["image_alts"]).lower(),
+            link_texts_lc=str(parsed_json["link_texts"]).lower()
+        )
+
+    # Yields the (heading level, lowercased heading text) pairs of the page's headings.
+    def get_headings_lc(self) -> Iterator[Tuple[int, str]]:
+        return zip(self.heading_levels, self.headings_lc)
+
+    # Yields the lowercased contents of all the fields the search is performed in.
+    def get_searchable_texts_lc(self) -> Iterator[str]:
+        yield self.url_lc
+        yield self.title_lc
+        yield from self.headings_lc
+        yield self.description_lc
+        yield self.keywords_lc
+        yield self.author_lc
+        yield self.content_snippet_lc
+        yield self.image_alts_lc
+        yield self.link_texts_lc
+
+    # The fields which are only displayed to the clients are released once they are written into the document store.
+    #  The lowercased versions are kept, as the search is performed in them.
+    def release_display_fields(self) -> None:
+        self.url, self.title, self.content_snippet = None, None, None
 
-        self.content_snippet: str = str(parsed_json["content_snippet"])
-        self.content_snippet_quality: float = float(parsed_json["content_snippet_quality"])
-        self.image_alts_lc: str = str(parsed_json["image_alts"]).lower()
-        self.link_texts_lc: str = str(parsed_json["link_texts"]).lower()
+    # Many pages share the same values of some fields (e.g. the pages of the same website often have the same author,
+    #  keywords or navigation link texts), but each item loaded from the web index has its own copies of them. The
+    #  values are replaced by the equal ones already present in the pool (which is shared by all the items), so that
+    #  each distinct value is kept in memory only once. The heading level arrays are shared too, so they must never be
+    #  modified.
+    def deduplicate_values(self, value_pool: Dict[Union[str, float, bytes], Union[str, float, array.array]]) -> None:
+        self.heading_levels = value_pool.setdefault(self.heading_levels.tobytes(), self.heading_levels)
+        self.description_lc = value_pool.setdefault(self.description_lc, self.description_lc)
+        self.keywords_lc = value_pool.setdefault(self.keywords_lc, self.keywords_lc)
+        self.author_lc = value_pool.setdefault(self.author_lc, self.author_lc)
+        self.content_snippet_quality = value_pool.setdefault(self.content_snippet_quality, self.content_snippet_quality)
+        self.image_alts_lc = value_pool.setdefault(self.image_alts_lc, self.image_alts_lc)
+        self.link_texts_lc = value_pool.setdefault(self.link_texts_lc, self.link_texts_lc)
+        self.headings_lc = tuple(value_pool.setdefault(text_lc, text_lc) for text_lc in self.headings_lc)
 
-    def _parse_headings(self, headings_json: Dict[str, List[str]]) -> List[WebIndexItem.PageHeading]:
-        headings = []
+    @staticmethod
+    def _parse_headings(headings_json: Dict[str, List[str]]) -> Tuple[array.array, Tuple[str, ...]]:
+        heading_levels, headings_lc = array.array("B"), []
 
         for level_str, level_headings in headings_json.items():
             level = WebIndexItem._HEADING_LEVEL_PARSER_REGEX.match(level_str)
@@ -60,7 +131,7 @@ class WebIndexItem:
             level = int(level[1])
 
             for text in level_headings:
-                heading = WebIndexItem.PageHeading(level, str(text).lower())
-                headings.append(heading)
+                heading_levels.append(level)
+                headings_lc.append(str(text).lower())
 
-        return headings
+        return heading_levels, tuple(headings_lc)
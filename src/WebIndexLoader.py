@@ -20,37 +20,96 @@
 # OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
 
 
-from typing import List
+from typing import List, Optional
+import os
+import time
 import logging
-import csv
-import json
 from Settings import Settings
 from WebIndexItem import WebIndexItem
+from WebIndex import WebIndex
+from DocumentStore import DocumentStore
+from WebIndexSnapshot import WebIndexSnapshot
+from WebIndexIngestionPipeline import WebIndexIngestionPipeline
+from WebIndexDeltaUpdater import WebIndexDeltaUpdater
+from ProcessMemoryUsage import ProcessMemoryUsage
 
 
 class WebIndexLoader:
     def __init__(self, logger: logging.Logger):
         self._logger: logging.Logger = logger
 
-    def load_index(self) -> List[WebIndexItem]:
-        self._logger.debug("Loading the web index from \"{}\"...".format(Settings.WEB_INDEX_FILE_PATH))
-        web_index_items = self._load_index_from_file()
-        self._logger.debug("The web index was loaded successfully! ({} items)".format(len(web_index_items)))
+    # If a delta updater is passed, the delta file is merged into the web index (see
+    #  WebIndexDeltaUpdater.merge_into_items()); the updater can then apply the rows appended to the file later.
+    def load_index(self, delta_updater: Optional[WebIndexDeltaUpdater] = None) -> WebIndex:
+        start_time = time.perf_counter()
 
-        return web_index_items
+        with ProcessMemoryUsage.sample_peak_rss() as rss_sample:
+            web_index_items = self.load_index_items()
+            self._logger.debug("The web index was loaded successfully! ({} items)".format(len(web_index_items)))
+
+            if delta_updater is not None:
+                added_document_count, replaced_document_count = delta_updater.merge_into_items(web_index_items)
+                self._logger.info("{} documents from the delta file \"{}\" have been merged into the web index ({} of them replaced older documents).".format(added_document_count + replaced_document_count, Settings.WEB_INDEX_DELTA_FILE_PATH, replaced_document_count))
+
+            document_store = self.create_document_store(web_index_items)
+
+            self._logger.debug("Building the auxiliary search structures...")
+            web_index = WebIndex(web_index_items, document_store)
+            self._logger.debug("The auxiliary search structures were built successfully!")
+
+        self._logger.info("The web index has been loaded in {:.1f} seconds; {}.".format(time.perf_counter() - start_time, self._format_peak_memory_usage(rss_sample.peak_rss)))
+
+        return web_index
+
+    def _format_peak_memory_usage(self, peak_rss: Optional[int]) -> str:
+        if peak_rss is None:
+            return "the peak memory usage is unknown"
+
+        # The process's memory usage is sampled (see ProcessMemoryUsage.sample_peak_rss()), so a very short-lived peak
+        #  might not be included.
+        return "the peak memory usage was {:.1f} MB".format(peak_rss / 1000000)
 
-    def _load_index_from_file(self) -> List[WebIndexItem]:
-        web_index_items = []
+    # The deduplication of the values can be turned off only to measure its effect (see WebIndexMemoryReport).
+    def load_index_items(self, deduplicate_values: bool = True) -> List[WebIndexItem]:
+        web_index_items = self._load_index_items_from_snapshot_or_file()
+        if not deduplicate_values:
+            return web_index_items
 
-        with open(Settings.WEB_INDEX_FILE_PATH) as file:
-            reader = csv.reader(file)
-            for csv_line in reader:
-                parsed_web_index_item = self._parse_index_csv_line(csv_line)
-                web_index_items.append(parsed_web_index_item)
+        # The values are deduplicated in the main process, as the items parsed by different worker processes (or read
+        #  from the snapshot) never share them.
+        value_pool = {}
+        for web_index_item in web_index_items:
+            web_index_item.deduplicate_values(value_pool)
 
         return web_index_items
 
-    def _parse_index_csv_line(self, csv_line: List[str]) -> WebIndexItem:
-        parsed_json = json.loads(csv_line[0])
+    # If the document store is enabled, the items' display fields are moved into it.
+    def create_document_store(self, web_index_items: List[WebIndexItem]) -> Optional[DocumentStore]:
+        if not Settings.USE_DOCUMENT_STORE:
+            return None
+
+        self._logger.debug("Writing the display fields into a document store next to \"{}\"...".format(Settings.DOCUMENT_STORE_FILE_PATH))
+        document_store = DocumentStore(Settings.DOCUMENT_STORE_FILE_PATH, web_index_items, Settings.DOCUMENT_STORE_CACHE_SIZE)
+
+        for web_index_item in web_index_items:
+            web_index_item.release_display_fields()
+
+        return document_store
+
+    def _load_index_items_from_snapshot_or_file(self) -> List[WebIndexItem]:
+        if Settings.WEB_INDEX_SNAPSHOT_FILE_PATH is not None:
+            snapshot = WebIndexSnapshot(Settings.WEB_INDEX_SNAPSHOT_FILE_PATH)
+            if snapshot.is_up_to_date(Settings.WEB_INDEX_FILE_PATH):
+                self._logger.debug("Loading the web index from the snapshot \"{}\"...".format(Settings.WEB_INDEX_SNAPSHOT_FILE_PATH))
+                return snapshot.read_items()
+
+        return self.load_index_items_from_file()
+
+    def load_index_items_from_file(self) -> List[WebIndexItem]:
+        self._logger.debug("Loading the web index from \"{}\"...".format(Settings.WEB_INDEX_FILE_PATH))
+
+        process_count = Settings.WEB_INDEX_LOADING_PROCESSES
+        if process_count is None:
+            process_count = (os.cpu_count() or 1)
 
-        return WebIndexItem(parsed_json)
+        return WebIndexIngestionPipeline(self._logger, process_count, Settings.WEB_INDEX_LOADING_CHUNK_SIZE).load_items(Settings.WEB_INDEX_FILE_PATH)
@@ -0,0 +1,260 @@
+# SPDX-License-Identifier: BSD-3-Clause
+#
+# Copyright (c) 2021 Vít Labuda. All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without modification, are permitted provided that the
+# following conditions are met:
+#  1. Redistributions of source code must retain the above copyright notice, this list of conditions and the following
+#     disclaimer.
+#  2. Redistributions in binary form must reproduce the above copyright notice, this list of conditions and the
+#     following disclaimer in the documentation and/or other materials provided with the distribution.
+#  3. Neither the name of the copyright holder nor the names of its contributors may be used to endorse or promote
+#     products derived from this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES,
+# INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+# SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+# SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY,
+# WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+
+from __future__ import annotations
+from typing import Optional, Iterator, Dict, Callable, Any
+import gc
+import os
+import queue
+import signal
+import logging
+import threading
+import functools
+import contextlib
+from Settings import Settings
+from WebIndex import WebIndex
+from WebIndexLoader import WebIndexLoader
+from WebIndexDeltaUpdater import WebIndexDeltaUpdater
+from ShardedSearchPool import ShardedSearchPool
+from SearchResultCache import SearchResultCache
+from ResultCursorStore import ResultCursorStore
+
+
+class WebIndexManager:
+    # A generation is a web index together with the search shard pool searching it. The searches acquire the current
+    #  generation and release it once they are done; after a new generation is published, the old one is released once
+    #  its last reader is done with it. The generations created by the delta file updates share the search shard pool
+    #  of the generation they update (see ShardedSearchPool.apply_update()).
+    class Generation:
+        def __init__(self, number: int, web_index: WebIndex, search_shard_pool: Optional[ShardedSearchPool]):
+            self.number: int = number
+            self.web_index: WebIndex = web_index
+            self.search_shard_pool: Optional[ShardedSearchPool] = search_shard_pool
+
+            # These are protected by the manager's lock.
+            self.reader_count: int = 0
+            self.is_retired: bool = False
+
+        def release(self) -> None:
+            if self.search_shard_pool is not None:
+                self.search_shard_pool.close()
+
+    def __init__(self, logger: logging.Logger, web_index: WebIndex, delta_updater: Optional[WebIndexDeltaUpdater], generation_number: int, delegate_reloads_to_parent_process: bool, run_in_main_thread: Callable[[Callable[[], Any]], Any]):
+        self._logger: logging.Logger = logger
+
+        # Performs a function in the main thread (see _start_search_shard_pool()).
+        self._run_in_main_thread: Callable[[Callable[[], Any]], Any] = run_in_main_thread
+
+        # In the pre-forked mode, the web index is reloaded by the parent process, which then replaces the worker
+        #  processes with new ones.
+        self._delegate_reloads_to_parent_process: bool = delegate_reloads_to_parent_process
+
+        self._search_result_cache: Optional[SearchResultCache] = None
+        if Settings.SEARCH_RESULT_CACHE_SIZE > 0:
+            self._search_result_cache = SearchResultCache(Settings.SEARCH_RESULT_CACHE_SIZE, Settings.SEARCH_RESULT_CACHE_DEPTH)
+
+        self._result_cursor_store: Optional[ResultCursorStore] = None
+        if Settings.RESULT_CURSOR_STORE_CAPACITY > 0:
+            self._result_cursor_store = ResultCursorStore(Settings.RESULT_CURSOR_TIME_TO_LIVE, Settings.RESULT_CURSOR_MAX_RESULTS, Settings.RESULT_CURSOR_STORE_CAPACITY)
+
+        self._lock: threading.Lock = threading.Lock()
+        self._current_generation: Optional[WebIndexManager.Generation] = None
+        self._last_generation_number: int = generation_number - 1
+
+        # The number of unreleased generations using each search shard pool (protected by the lock); a generation is
+        #  released together with its pool only if it is the last one using it.
+        self._search_shard_pool_generation_counts: Dict[ShardedSearchPool, int] = {}
+
+        # The delta file updates and the reloads are serialized by this lock, as each update is applied to the current
+        #  generation's web index (see WebIndex.create_updated_index()). The delta updater is the one which has merged the
+        #  delta file into the web index when it was loaded, so it applies the rows appended to the file since then; it is
+        #  not passed in the pre-forked mode (see Settings.WEB_INDEX_DELTA_FILE_PATH).
+        self._update_lock: threading.Lock = threading.Lock()
+        self._delta_updater: Optional[WebIndexDeltaUpdater] = delta_updater
+        self._is_closed: threading.Event = threading.Event()
+
+        self._publish_generation(web_index, self._start_search_shard_pool(web_index, is_reload=False))
+
+        # The reload requests are put into a simple queue, since its put() method (unlike the methods of the locks and
+        #  events) can safely be called from a signal handler, even if the handler interrupted a call of the same method.
+        self._reload_requests: queue.SimpleQueue = queue.SimpleQueue()
+        if not delegate_reloads_to_parent_process:
+            threading.Thread(target=self._reload_thread_main, name="WebIndexReloader", daemon=True).start()
+
+        if self._delta_updater is not None:
+            threading.Thread(target=self._delta_update_thread_main, name="WebIndexDeltaUpdater", daemon=True).start()
+
+    @contextlib.contextmanager
+    def acquire_current_generation(self) -> Iterator[WebIndexManager.Generation]:
+        with self._lock:
+            generation = self._current_generation
+            generation.reader_count += 1
+
+        try:
+            yield generation
+        finally:
+            with self._lock:
+                generation.reader_count -= 1
+                should_be_released = (generation.is_retired and generation.reader_count == 0)
+
+            if should_be_released:
+                self._release_generation(generation)
+
+    # The cached results are bound to the generation they were searched in, so they are invalidated automatically
+    #  once a search is performed in a newer generation.
+    def get_search_result_cache(self) -> Optional[SearchResultCache]:
+        return self._search_result_cache
+
+    # The same as with the search result cache, the cursors are invalidated once a newer generation is used.
+    def get_result_cursor_store(self) -> Optional[ResultCursorStore]:
+        return self._result_cursor_store
+
+    # Can be called from a signal handler (see the reload requests queue).
+    def request_reload(self) -> None:
+        if self._delegate_reloads_to_parent_process:
+            os.kill(os.getppid(), signal.SIGHUP)
+        else:
+            self._reload_requests.put(None)
+
+    def _reload_thread_main(self) -> None:
+        while True:
+            # The requests which have arrived in the meantime are all handled by a single reload.
+            self._reload_requests.get()
+            while not self._reload_requests.empty():
+                self._reload_requests.get_nowait()
+
+            # The queries keep being served from the current generation while the new web index is being loaded.
+            self._logger.info("Reloading the web index...")
+            try:
+                delta_updater = WebIndexDeltaUpdater.create_from_settings(self._logger)
+                web_index = WebIndexLoader(self._logger).load_index(delta_updater)
+                search_shard_pool = self._start_search_shard_pool(web_index, is_reload=True)
+            except Exception:
+                self._logger.exception("Failed to reload the web index; the searches are still performed in the old one!")
+                continue
+
+            # The rows appended to the delta file meanwhile are applied by the new updater after the reloaded web index
+            #  is published.
+            with self._update_lock:
+                self._publish_generation(web_index, search_shard_pool)
+                self._delta_updater = delta_updater
+            self._logger.info("The reloaded web index has been published as generation {}.".format(self._last_generation_number))
+
+    def _delta_update_thread_main(self) -> None:
+        while not self._is_closed.wait(Settings.WEB_INDEX_DELTA_POLL_INTERVAL):
+            with self._update_lock:
+                if self._is_closed.is_set() or (self._delta_updater is None):
+                    continue
+
+                try:
+                    # The rows which have been appended since the last check are published in batches.
+                    while self._apply_delta_file_batch():
+                        pass
+                except Exception:
+                    # The updater's state might not match the web index anymore.
+                    self._logger.exception("Failed to apply the delta file to the web index; it won't be updated until it is reloaded!")
+                    self._delta_updater = None
+
+    # Returns False if there were no rows to apply.
+    def _apply_delta_file_batch(self) -> bool:
+        added_items, removed_document_ids = self._delta_updater.read_update(Settings.WEB_INDEX_DELTA_BATCH_SIZE)
+        if not added_items:
+            return False
+
+        # The update is applied to a copy of the web index (and to the copies held by the search shards) which is only
+        #  published once it is complete, so the searches never see a partially applied batch.
+        generation = self._current_generation
+        web_index = generation.web_index.create_updated_index(added_items, removed_document_ids)
+        if generation.search_shard_pool is not None:
+            generation.search_shard_pool.apply_update(web_index, added_items, removed_document_ids)
+
+        self._publish_generation(web_index, generation.search_shard_pool)
+        self._logger.debug("{} documents from the delta file have been published as generation {} ({} of them replaced older documents).".format(len(added_items), self._last_generation_number, len(removed_document_ids)))
+
+        return True
+
+    def _start_search_shard_pool(self, web_index: WebIndex, is_reload: bool) -> Optional[ShardedSearchPool]:
+        if Settings.SEARCH_SHARD_COUNT == 0:
+            return None
+
+        # The shard worker processes are forked by the main thread, at a point where it's not in the middle of anything
+        #  (see SearchServerMain._run_in_main_thread()). The other threads might hold some locks at that moment (e.g. the
+        #  ones of the logging module), which would stay locked in the workers forever, so the workers must not use
+        #  anything they share with them - they only search their copy of the web index and communicate through their
+        #  pipes.
+        return self._run_in_main_thread(functools.partial(self._fork_search_shard_pool, web_index, is_reload))
+
+    def _fork_search_shard_pool(self, web_index: WebIndex, is_reload: bool) -> ShardedSearchPool:
+        # See SearchServerMain._freeze_loaded_objects().
+        if is_reload:
+            gc.unfreeze()
+        gc.collect()
+        gc.freeze()
+
+        self._logger.debug("Starting {} search shard worker processes...".format(Settings.SEARCH_SHARD_COUNT))
+        return ShardedSearchPool(web_index, Settings.SEARCH_SHARD_COUNT, self._logger)
+
+    def _publish_generation(self, web_index: WebIndex, search_shard_pool: Optional[ShardedSearchPool]) -> None:
+        with self._lock:
+            self._last_generation_number += 1
+            new_generation = WebIndexManager.Generation(self._last_generation_number, web_index, search_shard_pool)
+            if search_shard_pool is not None:
+                self._search_shard_pool_generation_counts[search_shard_pool] = self._search_shard_pool_generation_counts.get(search_shard_pool, 0) + 1
+
+            old_generation, self._current_generation = self._current_generation, new_generation
+
+            should_old_generation_be_released = False
+            if old_generation is not None:
+                old_generation.is_retired = True
+                should_old_generation_be_released = (old_generation.reader_count == 0)
+
+        if should_old_generation_be_released:
+            self._release_generation(old_generation)
+
+    def _release_generation(self, generation: WebIndexManager.Generation) -> None:
+        self._logger.debug("Releasing the web index generation {}...".format(generation.number))
+
+        with self._lock:
+            is_search_shard_pool_unused = True
+            if generation.search_shard_pool is not None:
+                self._search_shard_pool_generation_counts[generation.search_shard_pool] -= 1
+                is_search_shard_pool_unused = (self._search_shard_pool_generation_counts[generation.search_shard_pool] == 0)
+                if is_search_shard_pool_unused:
+                    del self._search_shard_pool_generation_counts[generation.search_shard_pool]
+
+        if is_search_shard_pool_unused:
+            generation.release()
+
+    def close(self) -> None:
+        self._is_closed.set()
+
+        # Waits for the delta file update which might be in progress.
+        with self._update_lock:
+            pass
+
+        with self._lock:
+            generation, self._current_generation = self._current_generation, None
+            generation.is_retired = True
+            should_be_released = (generation.reader_count == 0)
+
+        if should_be_released:
+            self._release_generation(generation)
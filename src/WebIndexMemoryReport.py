@@ -0,0 +1,105 @@
+# SPDX-License-Identifier: BSD-3-Clause
+#
+# Copyright (c) 2021 Vít Labuda. All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without modification, are permitted provided that the
+# following conditions are met:
+#  1. Redistributions of source code must retain the above copyright notice, this list of conditions and the following
+#     disclaimer.
+#  2. Redistributions in binary form must reproduce the above copyright notice, this list of conditions and the
+#     following disclaimer in the documentation and/or other materials provided with the distribution.
+#  3. Neither the name of the copyright holder nor the names of its contributors may be used to endorse or promote
+#     products derived from this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES,
+# INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+# SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+# SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY,
+# WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+
+import gc
+import types
+import logging
+import tracemalloc
+from Settings import Settings
+from WebIndex import WebIndex
+from WebIndexItem import WebIndexItem
+from WebIndexLoader import WebIndexLoader
+from ProcessMemoryUsage import ProcessMemoryUsage
+
+
+# Loads the web index and reports how much memory its documents and the auxiliary search structures occupy, or how much
+#  memory the documents occupy in different layouts of the items. The sizes are measured by tracing the memory
+#  allocations made while they are being built, so they include all the objects they consist of (but not the memory
+#  shared with or freed back from the worker processes used to load them).
+class WebIndexMemoryReport:
+    def __init__(self):
+        Settings.enter_working_directory(Settings.WORKING_DIRECTORY)
+
+        self._logger: logging.Logger = Settings.get_logger()
+
+    def report(self) -> None:
+        tracemalloc.start()
+
+        web_index_loader = WebIndexLoader(self._logger)
+        web_index_items = web_index_loader.load_index_items()
+        document_store = web_index_loader.create_document_store(web_index_items)
+        gc.collect()
+        document_bytes = tracemalloc.get_traced_memory()[0]
+
+        web_index = WebIndex(web_index_items, document_store)
+        gc.collect()
+        auxiliary_structure_bytes = tracemalloc.get_traced_memory()[0] - document_bytes
+
+        tracemalloc.stop()
+
+        document_count = max(len(web_index.items), 1)
+        self._logger.info("The web index contains {} documents.".format(len(web_index.items)))
+        self._log_size("Documents", document_bytes, document_count)
+        self._log_size("Auxiliary search structures", auxiliary_structure_bytes, document_count)
+        self._log_size("Total", document_bytes + auxiliary_structure_bytes, document_count)
+
+        current_rss = ProcessMemoryUsage.get_current_rss()
+        if current_rss is not None:
+            self._logger.info("The resident set size of the process is {:.1f} MB.".format(current_rss / 1000000))
+
+    # Reports the sizes of the documents (without a document store) in the compact layout of the items and in the
+    #  layouts without its parts: with the values not deduplicated (see WebIndexItem.deduplicate_values()), and
+    #  additionally with a __dict__ instead of the __slots__ in each item. The dict-based items have the same fields as
+    #  the compact ones, so their size only approximates the layout used before the items were made compact.
+    def compare_item_layouts(self) -> None:
+        web_index_loader = WebIndexLoader(self._logger)
+
+        tracemalloc.start()
+
+        web_index_items = web_index_loader.load_index_items(deduplicate_values=False)
+        gc.collect()
+        slots_bytes = tracemalloc.get_traced_memory()[0]
+
+        # The values are shared with the original items, which are released then, so only the items themselves differ.
+        dict_based_items = [types.SimpleNamespace(**{name: getattr(web_index_item, name) for name in WebIndexItem.__slots__}) for web_index_item in web_index_items]
+        document_count = max(len(web_index_items), 1)
+        del web_index_items
+        gc.collect()
+        dict_bytes = tracemalloc.get_traced_memory()[0]
+
+        del dict_based_items
+        gc.collect()
+        base_bytes = tracemalloc.get_traced_memory()[0]
+
+        web_index_items = web_index_loader.load_index_items()
+        gc.collect()
+        compact_bytes = tracemalloc.get_traced_memory()[0] - base_bytes
+
+        tracemalloc.stop()
+
+        self._logger.info("The web index contains {} documents.".format(len(web_index_items)))
+        self._log_size("Documents in dict-based items, not deduplicated", dict_bytes, document_count)
+        self._log_size("Documents in slotted items, not deduplicated", slots_bytes, document_count)
+        self._log_size("Documents in slotted items, deduplicated (the layout used by the server)", compact_bytes, document_count)
+
+    def _log_size(self, name: str, size: int, document_count: int) -> None:
+        self._logger.info("{}: {:.1f} MB ({:.0f} bytes per document)".format(name, size / 1000000, size / document_count))
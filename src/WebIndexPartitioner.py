@@ -0,0 +1,66 @@
+# SPDX-License-Identifier: BSD-3-Clause
+#
+# Copyright (c) 2021 Vít Labuda. All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without modification, are permitted provided that the
+# following conditions are met:
+#  1. Redistributions of source code must retain the above copyright notice, this list of conditions and the following
+#     disclaimer.
+#  2. Redistributions in binary form must reproduce the above copyright notice, this list of conditions and the
+#     following disclaimer in the documentation and/or other materials provided with the distribution.
+#  3. Neither the name of the copyright holder nor the names of its contributors may be used to endorse or promote
+#     products derived from this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES,
+# INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+# SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+# SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY,
+# WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+
+import os
+import time
+import logging
+import contextlib
+from Settings import Settings
+from WebIndexIngestionPipeline import WebIndexIngestionPipeline
+from SpiderimentSearchServerRuntimeError import SpiderimentSearchServerRuntimeError
+
+
+# Splits the web index file into one partition per backend server of the coordinator (see
+#  Settings.COORDINATOR_BACKEND_SOCKET_PATHS). The rows are assigned to the partitions in a round-robin fashion, which
+#  both balances the partitions and makes it possible for the coordinator to derive the documents' IDs in the whole web
+#  index from their IDs in the partitions (see CoordinatorMessageHandler).
+class WebIndexPartitioner:
+    def __init__(self):
+        Settings.enter_working_directory(Settings.WORKING_DIRECTORY)
+
+        self._logger: logging.Logger = Settings.get_logger()
+
+    def partition(self) -> None:
+        partition_count = len(Settings.COORDINATOR_BACKEND_SOCKET_PATHS)
+        if partition_count == 0:
+            raise SpiderimentSearchServerRuntimeError("There are no backend servers in the settings, so the web index can't be partitioned!")
+
+        start_time = time.perf_counter()
+        partition_file_paths = [Settings.WEB_INDEX_PARTITION_FILE_PATH_FORMAT.format(partition_index) for partition_index in range(partition_count)]
+
+        self._logger.debug("Partitioning the web index \"{}\" into {} partitions...".format(Settings.WEB_INDEX_FILE_PATH, partition_count))
+        row_count = 0
+        with contextlib.ExitStack() as exit_stack:
+            web_index_file = exit_stack.enter_context(WebIndexIngestionPipeline(self._logger, 1, Settings.WEB_INDEX_LOADING_CHUNK_SIZE).open_file(Settings.WEB_INDEX_FILE_PATH))
+            partition_files = [exit_stack.enter_context(open(file_path + ".tmp", "wb")) for file_path in partition_file_paths]
+
+            # Each row of the web index is a single line (see WebIndexIngestionPipeline).
+            for row_count, line in enumerate(web_index_file, 1):
+                if not line.endswith(b"\n"):
+                    line += b"\n"
+                partition_files[(row_count - 1) % partition_count].write(line)
+
+        # The partitions replace the old ones only once all of them have been written.
+        for file_path in partition_file_paths:
+            os.replace(file_path + ".tmp", file_path)
+
+        self._logger.info("The web index ({} rows) was partitioned into {} in {:.1f} seconds.".format(row_count, ", ".join("\"{}\"".format(file_path) for file_path in partition_file_paths), time.perf_counter() - start_time))
@@ -0,0 +1,205 @@
+# SPDX-License-Identifier: BSD-3-Clause
+#
+# Copyright (c) 2021 Vít Labuda. All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without modification, are permitted provided that the
+# following conditions are met:
+#  1. Redistributions of source code must retain the above copyright notice, this list of conditions and the following
+#     disclaimer.
+#  2. Redistributions in binary form must reproduce the above copyright notice, this list of conditions and the
+#     following disclaimer in the documentation and/or other materials provided with the distribution.
+#  3. Neither the name of the copyright holder nor the names of its contributors may be used to endorse or promote
+#     products derived from this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES,
+# INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+# SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+# SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY,
+# WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+
+from typing import List, Tuple, Iterable, BinaryIO
+import os
+import mmap
+import array
+import struct
+from WebIndexItem import WebIndexItem
+from SpiderimentSearchServerRuntimeError import SpiderimentSearchServerRuntimeError
+
+
+# A pre-parsed copy of the web index file, which can be read a lot faster than the CSV file can be parsed. It is only a
+#  faster replacement of the parser, though: the documents are still decoded into WebIndexItem objects in the memory of
+#  the loading process (the mapping of the file is closed once they are read), and the auxiliary search structures are
+#  still built from them, so the startup time still grows with the size of the web index, and the processes loading
+#  the web index on their own don't share any of it through the page cache.
+class WebIndexSnapshot:
+    # The snapshot is a binary file which consists of a header followed by these sections (each of them starts at an
+    #  8-byte boundary):
+    #  - for each string field (see _STRING_FIELDS) - a string table (see below),
+    #  - the documents' content snippet qualities as 64-bit floats,
+    #  - a table of (document count + 1) 64-bit offsets into the heading sections,
+    #  - the headings' levels as 8-bit integers,
+    #  - a string table of the headings' texts.
+    # A string table consists of (string count + 1) 64-bit offsets of the strings in the decoded text (in code points),
+    #  the 64-bit length of the encoded text (in bytes) and the UTF-8 encoded text; the whole text is decoded at once
+    #  when loading the snapshot, and the strings are sliced out of it, which is much faster than decoding each of them.
+    # The numbers are stored in the native byte order, so a snapshot can be used only on machines with the same byte
+    #  order as the one where it was created.
+    _MAGIC: bytes = b"SPDRSNAP"
+    _FORMAT_VERSION: int = 1
+    _BYTE_ORDER_MARK: int = 0x01020304
+    # magic, format version, byte order mark, document count, heading count, source file size, source file mtime (ns)
+    _HEADER_FORMAT: struct.Struct = struct.Struct("=8sIIQQQq")
+    _ALIGNMENT: int = 8
+
+    _STRING_FIELDS: Tuple[str, ...] = ("url", "title", "description_lc", "keywords_lc", "author_lc", "content_snippet", "image_alts_lc", "link_texts_lc")
+
+    # The strings loaded from JSON may contain lone surrogates, which have to survive the round trip.
+    _STRING_ENCODING: str = "utf-8"
+    _STRING_ENCODING_ERRORS: str = "surrogatepass"
+
+    def __init__(self, snapshot_path: str):
+        self._snapshot_path: str = snapshot_path
+
+    # A snapshot is up to date if it was created from the current version of the source web index file. If the source
+    #  file doesn't exist, the snapshot is used as the only available copy of the web index.
+    def is_up_to_date(self, source_path: str) -> bool:
+        try:
+            with open(self._snapshot_path, "rb") as file:
+                header = file.read(WebIndexSnapshot._HEADER_FORMAT.size)
+        except OSError:
+            return False
+
+        if len(header) != WebIndexSnapshot._HEADER_FORMAT.size:
+            return False
+
+        magic, format_version, byte_order_mark, _, _, source_size, source_mtime_ns = WebIndexSnapshot._HEADER_FORMAT.unpack(header)
+        if magic != WebIndexSnapshot._MAGIC or format_version != WebIndexSnapshot._FORMAT_VERSION or byte_order_mark != WebIndexSnapshot._BYTE_ORDER_MARK:
+            return False
+
+        try:
+            source_stat = os.stat(source_path)
+        except FileNotFoundError:
+            return True
+
+        return source_stat.st_size == source_size and source_stat.st_mtime_ns == source_mtime_ns
+
+    def write_items(self, web_index_items: List[WebIndexItem], source_path: str) -> None:
+        source_stat = os.stat(source_path)
+        heading_count = sum(len(item.headings_lc) for item in web_index_items)
+
+        # The snapshot is written into a temporary file which then atomically replaces the old snapshot, so that a server
+        #  starting in the meantime never sees an incomplete snapshot.
+        temporary_path = self._snapshot_path + ".tmp"
+        with open(temporary_path, "wb") as file:
+            file.write(WebIndexSnapshot._HEADER_FORMAT.pack(WebIndexSnapshot._MAGIC, WebIndexSnapshot._FORMAT_VERSION, WebIndexSnapshot._BYTE_ORDER_MARK, len(web_index_items), heading_count, source_stat.st_size, source_stat.st_mtime_ns))
+            self._write_padding(file)
+
+            for field_name in WebIndexSnapshot._STRING_FIELDS:
+                self._write_string_table(file, (getattr(item, field_name) for item in web_index_items), len(web_index_items))
+
+            self._write_array(file, array.array("d", (item.content_snippet_quality for item in web_index_items)))
+
+            heading_offsets = array.array("Q", [0])
+            for item in web_index_items:
+                heading_offsets.append(heading_offsets[-1] + len(item.headings_lc))
+            self._write_array(file, heading_offsets)
+
+            self._write_array(file, array.array("B", (heading_level for item in web_index_items for heading_level in item.heading_levels)))
+            self._write_string_table(file, (heading_text_lc for item in web_index_items for heading_text_lc in item.headings_lc), heading_count)
+
+        os.replace(temporary_path, self._snapshot_path)
+
+    def _write_string_table(self, file: BinaryIO, strings: Iterable[str], string_count: int) -> None:
+        strings = list(strings)
+        if len(strings) != string_count:
+            raise SpiderimentSearchServerRuntimeError("The number of strings written to the web index snapshot doesn't match!")
+
+        offsets = array.array("Q", [0])
+        for string in strings:
+            offsets.append(offsets[-1] + len(string))
+        encoded_text = "".join(strings).encode(WebIndexSnapshot._STRING_ENCODING, WebIndexSnapshot._STRING_ENCODING_ERRORS)
+
+        self._write_array(file, offsets)
+        self._write_array(file, array.array("Q", [len(encoded_text)]))
+        file.write(encoded_text)
+        self._write_padding(file)
+
+    def _write_array(self, file: BinaryIO, array_: array.array) -> None:
+        array_.tofile(file)
+        self._write_padding(file)
+
+    def _write_padding(self, file: BinaryIO) -> None:
+        file.write(bytes(-file.tell() % WebIndexSnapshot._ALIGNMENT))
+
+    def read_items(self) -> List[WebIndexItem]:
+        with open(self._snapshot_path, "rb") as file, mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mapped_file, memoryview(mapped_file) as buffer:
+            try:
+                return self._read_items_from_buffer(buffer)
+            except (struct.error, ValueError, IndexError, UnicodeDecodeError) as e:
+                raise SpiderimentSearchServerRuntimeError("The web index snapshot \"{}\" is corrupted! ({})".format(self._snapshot_path, e))
+
+    def _read_items_from_buffer(self, buffer: memoryview) -> List[WebIndexItem]:
+        magic, format_version, byte_order_mark, document_count, heading_count, _, _ = WebIndexSnapshot._HEADER_FORMAT.unpack_from(buffer)
+        if magic != WebIndexSnapshot._MAGIC or format_version != WebIndexSnapshot._FORMAT_VERSION or byte_order_mark != WebIndexSnapshot._BYTE_ORDER_MARK:
+            raise SpiderimentSearchServerRuntimeError("The web index snapshot \"{}\" has an invalid or incompatible header!".format(self._snapshot_path))
+
+        position = self._align(WebIndexSnapshot._HEADER_FORMAT.size)
+
+        string_fields = []
+        for _ in WebIndexSnapshot._STRING_FIELDS:
+            strings, position = self._read_string_table(buffer, position, document_count)
+            string_fields.append(strings)
+
+        content_snippet_qualities, position = self._read_array(buffer, position, "d", document_count)
+        heading_offsets, position = self._read_array(buffer, position, "Q", document_count + 1)
+        heading_levels, position = self._read_array(buffer, position, "B", heading_count)
+        heading_texts, position = self._read_string_table(buffer, position, heading_count)
+
+        urls, titles, descriptions_lc, keywords_lc, authors_lc, content_snippets, image_alts_lc, link_texts_lc = string_fields
+
+        return [
+            WebIndexItem(
+                url=urls[i],
+                title=titles[i],
+                heading_levels=heading_levels[heading_offsets[i]:heading_offsets[i + 1]],
+                headings_lc=tuple(heading_texts[heading_offsets[i]:heading_offsets[i + 1]]),
+                description_lc=descriptions_lc[i],
+                keywords_lc=keywords_lc[i],
+                author_lc=authors_lc[i],
+                content_snippet=content_snippets[i],
+                content_snippet_quality=content_snippet_qualities[i],
+                image_alts_lc=image_alts_lc[i],
+                link_texts_lc=link_texts_lc[i]
+            )
+            for i in range(document_count)
+        ]
+
+    def _read_string_table(self, buffer: memoryview, position: int, string_count: int) -> Tuple[List[str], int]:
+        offsets, position = self._read_array(buffer, position, "Q", string_count + 1)
+        (encoded_text_length,), position = self._read_array(buffer, position, "Q", 1)
+        if position + encoded_text_length > len(buffer):
+            raise SpiderimentSearchServerRuntimeError("The web index snapshot \"{}\" is truncated!".format(self._snapshot_path))
+
+        text = str(buffer[position:position + encoded_text_length], WebIndexSnapshot._STRING_ENCODING, WebIndexSnapshot._STRING_ENCODING_ERRORS)
+        if len(text) != offsets[string_count]:
+            raise SpiderimentSearchServerRuntimeError("The web index snapshot \"{}\" is corrupted!".format(self._snapshot_path))
+
+        strings = [text[offsets[i]:offsets[i + 1]] for i in range(string_count)]
+
+        return strings, self._align(position + encoded_text_length)
+
+    def _read_array(self, buffer: memoryview, position: int, typecode: str, length: int) -> Tuple[array.array, int]:
+        array_ = array.array(typecode)
+        end_position = position + (array_.itemsize * length)
+        if end_position > len(buffer):
+            raise SpiderimentSearchServerRuntimeError("The web index snapshot \"{}\" is truncated!".format(self._snapshot_path))
+
+        array_.frombytes(buffer[position:end_position])
+
+        return array_, self._align(end_position)
+
+    def _align(self, position: int) -> int:
+        return position + (-position % WebIndexSnapshot._ALIGNMENT)
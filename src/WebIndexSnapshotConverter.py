@@ -0,0 +1,47 @@
+# SPDX-License-Identifier: BSD-3-Clause
+#
+# Copyright (c) 2021 Vít Labuda. All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without modification, are permitted provided that the
+# following conditions are met:
+#  1. Redistributions of source code must retain the above copyright notice, this list of conditions and the following
+#     disclaimer.
+#  2. Redistributions in binary form must reproduce the above copyright notice, this list of conditions and the
+#     following disclaimer in the documentation and/or other materials provided with the distribution.
+#  3. Neither the name of the copyright holder nor the names of its contributors may be used to endorse or promote
+#     products derived from this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES,
+# INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+# SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+# SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY,
+# WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+
+import time
+import logging
+from Settings import Settings
+from WebIndexLoader import WebIndexLoader
+from WebIndexSnapshot import WebIndexSnapshot
+from SpiderimentSearchServerRuntimeError import SpiderimentSearchServerRuntimeError
+
+
+class WebIndexSnapshotConverter:
+    def __init__(self):
+        Settings.enter_working_directory(Settings.WORKING_DIRECTORY)
+
+        self._logger: logging.Logger = Settings.get_logger()
+
+    def convert(self) -> None:
+        if Settings.WEB_INDEX_SNAPSHOT_FILE_PATH is None:
+            raise SpiderimentSearchServerRuntimeError("The web index snapshot is disabled in the settings!")
+
+        start_time = time.perf_counter()
+        web_index_items = WebIndexLoader(self._logger).load_index_items_from_file()
+
+        self._logger.debug("Writing {} items into the web index snapshot \"{}\"...".format(len(web_index_items), Settings.WEB_INDEX_SNAPSHOT_FILE_PATH))
+        WebIndexSnapshot(Settings.WEB_INDEX_SNAPSHOT_FILE_PATH).write_items(web_index_items, Settings.WEB_INDEX_FILE_PATH)
+
+        self._logger.info("The web index snapshot was created successfully in {:.1f} seconds.".format(time.perf_counter() - start_time))
@@ -0,0 +1,207 @@
+#!/usr/bin/python3
+# SPDX-License-Identifier: BSD-3-Clause
+#
+# Copyright (c) 2021 Vít Labuda. All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without modification, are permitted provided that the
+# following conditions are met:
+#  1. Redistributions of source code must retain the above copyright notice, this list of conditions and the following
+#     disclaimer.
+#  2. Redistributions in binary form must reproduce the above copyright notice, this list of conditions and the
+#     following disclaimer in the documentation and/or other materials provided with the distribution.
+#  3. Neither the name of the copyright holder nor the names of its contributors may be used to endorse or promote
+#     products derived from this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES,
+# INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+# SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+# SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY,
+# WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+
+from typing import Optional, Tuple, Union
+import time
+import asyncio
+from .msgess import MsgESS
+
+
+class AsyncMsgESS:
+    """
+    An asyncio counterpart of the MsgESS class, which sends and receives the messages through a pair of asyncio streams
+    (e.g. the ones created by asyncio.start_unix_server()). The protocol is the same, so the two classes can talk to
+    each other. The exceptions raised by the methods are MsgESS.MsgESSException instances.
+    """
+
+    def __init__(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        """Initializes a new AsyncMsgESS instance.
+
+        :param reader: The stream to receive messages from.
+        :param writer: The stream to send messages to.
+        """
+
+        self._reader: asyncio.StreamReader = reader
+        self._writer: asyncio.StreamWriter = writer
+        self._compress_messages: bool = True
+        self._max_message_size: int = 25000000  # in bytes
+        self._last_message_arrival_time: Optional[float] = None
+
+    def get_streams(self) -> Tuple[asyncio.StreamReader, asyncio.StreamWriter]:
+        """Gets the streams passed to __init__.
+
+        :return: The reader and writer stream passed to __init__.
+        """
+
+        return self._reader, self._writer
+
+    def set_compress_messages(self, compress_messages: bool) -> None:
+        """Turns the message compression on or off.
+
+        :param compress_messages: Turn the message compression on or off.
+        """
+
+        self._compress_messages = compress_messages
+
+    def set_max_message_size(self, max_message_size: int) -> None:
+        """Set the maximum accepted message size while receiving.
+
+        :param max_message_size: The new maximum message size in bytes.
+        :raises: MsgESS.MsgESSException: If the specified maximum message size is negative.
+        """
+
+        if max_message_size < 0:
+            raise MsgESS.MsgESSException("The new maximum message size is invalid!")
+
+        self._max_message_size = max_message_size
+
+    def get_last_message_arrival_time(self) -> Optional[float]:
+        """Gets the time at which the header of the last received message arrived.
+
+        :return: The time.perf_counter() value taken once the header was received, or None if no message has been received yet.
+        """
+
+        return self._last_message_arrival_time
+
+    async def send_binary_data(self, binary_data: bytes, message_class: int, _data_type: int = MsgESS._MessageDataType.BINARY) -> None:
+        """Send a message with binary data in its body to the stream. Waits until the stream's buffer is drained.
+
+        :param binary_data: The data to send.
+        :param message_class: User-defined message class that can be used for multiplexing.
+        :param _data_type: Used internally - DO NOT SET!
+        :raises: MsgESS.MsgESSException: If any error is encountered during the sending process.
+        """
+
+        message_parts = MsgESS._assemble_message_parts(binary_data, message_class, _data_type, self._compress_messages)
+
+        # send message; the parts are written separately, so the message body is not copied unless the transport has to
+        #  buffer it
+        try:
+            for message_part in message_parts:
+                self._writer.write(message_part)
+            await self._writer.drain()
+        except OSError as e:
+            raise MsgESS.MsgESSException("Failed to send the message to the stream!", e)
+
+    async def receive_binary_data(self, _data_type: int = MsgESS._MessageDataType.BINARY) -> Tuple[bytes, int]:
+        """Receive a message with binary data in its body from the stream. Waits until a full message is received.
+
+        :param _data_type: Used internally - DO NOT SET!
+        :return: The received binary data and message class.
+        :raises: MsgESS.MsgESSException: If any error is encountered during the receiving process.
+        """
+
+        message, message_class = await self._receive_message(_data_type)
+
+        return bytes(message), message_class
+
+    async def send_string(self, string: str, message_class: int, _data_type: int = MsgESS._MessageDataType.STRING) -> None:
+        """Send a message with an UTF-8 string in its body to the stream.
+
+        :param string: The string to send.
+        :param message_class: User-defined message class that can be used for multiplexing.
+        :param _data_type: Used internally - DO NOT SET!
+        :raises: MsgESS.MsgESSException: If any error is encountered during the sending process.
+        """
+
+        await self.send_binary_data(MsgESS._encode_string(string), message_class, _data_type=_data_type)
+
+    async def receive_string(self, _data_type: int = MsgESS._MessageDataType.STRING) -> Tuple[str, int]:
+        """Receive a message with an UTF-8 string in its body from the stream.
+
+        :param _data_type: Used internally - DO NOT SET!
+        :return: The received string and message class.
+        :raises: MsgESS.MsgESSException: If any error is encountered during the receiving process.
+        """
+
+        message, message_class = await self._receive_message(_data_type)
+
+        return MsgESS._decode_string(message), message_class
+
+    async def send_json_array(self, json_array: list, message_class: int) -> None:
+        """Send a message with a serialized JSON array in its body to the stream.
+
+        :param json_array: The JSON array to serialize and send.
+        :param message_class: User-defined message class that can be used for multiplexing.
+        :raises: MsgESS.MsgESSException: If any error is encountered during the sending process.
+        """
+
+        message = MsgESS._serialize_json_array(json_array)
+
+        await self.send_string(message, message_class, _data_type=MsgESS._MessageDataType.JSON_ARRAY)
+
+    async def receive_json_array(self) -> Tuple[list, int]:
+        """Receive a message with a serialized JSON array in its body from the stream.
+
+        :return: The received deserialized JSON array and message class.
+        :raises: MsgESS.MsgESSException: If any error is encountered during the receiving process.
+        """
+
+        message, message_class = await self.receive_string(_data_type=MsgESS._MessageDataType.JSON_ARRAY)
+
+        return MsgESS._deserialize_json_array(message), message_class
+
+    async def send_json_object(self, json_object: dict, message_class: int) -> None:
+        """Send a message with a serialized JSON object in its body to the stream.
+
+        :param json_object: The JSON object to serialize and send.
+        :param message_class: User-defined message class that can be used for multiplexing.
+        :raises: MsgESS.MsgESSException: If any error is encountered during the sending process.
+        """
+
+        message = MsgESS._serialize_json_object(json_object)
+
+        await self.send_string(message, message_class, _data_type=MsgESS._MessageDataType.JSON_OBJECT)
+
+    async def receive_json_object(self) -> Tuple[dict, int]:
+        """Receive a message with a serialized JSON object in its body from the stream.
+
+        :return: The received deserialized JSON object and message class.
+        :raises: MsgESS.MsgESSException: If any error is encountered during the receiving process.
+        """
+
+        message, message_class = await self.receive_string(_data_type=MsgESS._MessageDataType.JSON_OBJECT)
+
+        return MsgESS._deserialize_json_object(message), message_class
+
+    async def _receive_message(self, data_type: int) -> Tuple[Union[bytes, memoryview], int]:
+        # see MsgESS._receive_message()
+        header = await self._receive_n_bytes_from_stream(MsgESS._HEADER_STRUCT.size)
+        message_length, message_class, is_message_compressed = MsgESS._parse_message_header(header, data_type, self._max_message_size)
+        self._last_message_arrival_time = time.perf_counter()
+
+        body_and_footer = await self._receive_n_bytes_from_stream(message_length + len(MsgESS._FOOTER_MAGIC))
+        message = MsgESS._split_message_body(body_and_footer, message_length)
+        message = MsgESS._unpack_message_body(message, is_message_compressed)
+
+        return message, message_class
+
+    # Unlike MsgESS._receive_n_bytes_from_socket(), nothing is allocated for the announced length up front - the stream
+    #  reader's buffer only grows as the data arrive.
+    async def _receive_n_bytes_from_stream(self, n: int) -> bytes:
+        try:
+            return await self._reader.readexactly(n)
+        except asyncio.IncompleteReadError as e:
+            raise MsgESS.MsgESSException("The stream has ended before the whole message was received - the connection is probably dead.", e)
+        except OSError as e:
+            raise MsgESS.MsgESSException("Failed to receive data from the stream!", e)
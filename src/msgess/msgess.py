@@ -24,8 +24,9 @@
 from __future__ import annotations
 from typing import Optional, Tuple, Union
 import abc
-import gc
+import time
 import socket
+import struct
 import json
 import gzip
 import zlib
@@ -70,9 +71,20 @@ class MsgESS:
         JSON_ARRAY: int = 3
         JSON_OBJECT: int = 4
 
-    LIBRARY_VERSION: int = 6
+    LIBRARY_VERSION: int = 8
     PROTOCOL_VERSION: int = 3
 
+    # message header = magic string (11b), protocol version (4b), raw bytes length (4b), user-defined message class (4b),
+    #  is message compressed? (1b), data type (1b) -> 25 bytes in total
+    # message footer = magic string (9b) -> 9 bytes in total
+    _HEADER_STRUCT: struct.Struct = struct.Struct(">11siiibb")
+    _HEADER_MAGIC: bytes = b"MsgESSbegin"
+    _FOOTER_MAGIC: bytes = b"MsgESSend"
+
+    # The length of a message is announced by its sender, so the receive buffer starts at most this large, and it grows
+    #  as the data arrive (see _receive_n_bytes_from_socket()).
+    _INITIAL_RECEIVE_BUFFER_SIZE: int = 65536  # in bytes
+
     def __init__(self, socket_: Union[socket.socket, StreamSocketLikeObject]):
         """Initializes a new MsgESS instance.
 
@@ -82,6 +94,7 @@ class MsgESS:
         self._socket: Union[socket.socket, MsgESS.StreamSocketLikeObject] = socket_
         self._compress_messages: bool = True
         self._max_message_size: int = 25000000  # in bytes
+        self._last_message_arrival_time: Optional[float] = None
 
     def get_socket(self) -> Union[socket.socket, StreamSocketLikeObject]:
         """Gets the socket or stream-socket-like object passed to __init__.
@@ -111,6 +124,14 @@ class MsgESS:
 
         self._max_message_size = max_message_size
 
+    def get_last_message_arrival_time(self) -> Optional[float]:
+        """Gets the time at which the header of the last received message arrived.
+
+        :return: The time.perf_counter() value taken once the header was received, or None if no message has been received yet.
+        """
+
+        return self._last_message_arrival_time
+
     def send_binary_data(self, binary_data: bytes, message_class: int, _data_type: int = _MessageDataType.BINARY) -> None:
         """Send a message with binary data in its body to the socket.
 
@@ -120,35 +141,11 @@ class MsgESS:
         :raises: MsgESS.MsgESSException: If any error is encountered during the sending process.
         """
 
-        if not isinstance(binary_data, bytes):
-            raise MsgESS.MsgESSException("The data sent must be of the 'bytes' type!")
-
-        # compress message, if requested
-        if self._compress_messages:
-            binary_data = gzip.compress(binary_data)
-            gc.collect()
-
-        binary_data_length = len(binary_data)
-
-        # assemble message:
-        #  message header = magic string (11b), protocol version (4b), raw bytes length (4b), user-defined message class (4b),
-        #   is message compressed? (1b), data type (1b) -> 25 bytes in total
-        #  message footer = magic string (9b) -> 9 bytes in total
-        message = b"MsgESSbegin"
-        message += self.PROTOCOL_VERSION.to_bytes(4, byteorder="big", signed=True)
-        message += binary_data_length.to_bytes(4, byteorder="big", signed=True)
-        message += message_class.to_bytes(4, byteorder="big", signed=True)
-        message += self._compress_messages.to_bytes(1, byteorder="big", signed=True)
-        message += _data_type.to_bytes(1, byteorder="big", signed=True)
-        message += binary_data
-        message += b"MsgESSend"
-
-        binary_data = None
-        gc.collect()
+        message_parts = self._assemble_message_parts(binary_data, message_class, _data_type, self._compress_messages)
 
         # send message
         try:
-            self._socket.sendall(message)
+            self._send_message_parts(message_parts)
         except OSError as e:
             raise MsgESS.MsgESSException("Failed to send the message to the socket!", e)
 
@@ -160,45 +157,9 @@ class MsgESS:
         :raises: MsgESS.MsgESSException: If any error is encountered during the receiving process.
         """
 
-        # receive, parse and check message header (see self.send_binary_data for header items and their lengths)
-        header = self._receive_n_bytes_from_socket(25)
-        if header[0:11] != b"MsgESSbegin":
-            raise MsgESS.MsgESSException("The received message has an invalid magic header string!")
-
-        if int.from_bytes(header[11:15], byteorder="big", signed=True) != self.PROTOCOL_VERSION:
-            raise MsgESS.MsgESSException("The remote host uses an incompatible protocol version!")
-
-        message_length = int.from_bytes(header[15:19], byteorder="big", signed=True)
-        if message_length < 0:
-            raise MsgESS.MsgESSException("The received message's length is invalid!")
-        if message_length > self._max_message_size:
-            raise MsgESS.MsgESSException("The received message is too big!")
-
-        message_class = int.from_bytes(header[19:23], byteorder="big", signed=True)
-        if message_class < 0:
-            raise MsgESS.MsgESSException("The received message's class is invalid!")
-
-        is_message_compressed = bool.from_bytes(header[23:24], byteorder="big", signed=True)
-
-        # check the data type
-        if int.from_bytes(header[24:25], byteorder="big", signed=True) != _data_type:
-            raise MsgESS.MsgESSException("The received message has an invalid data type!")
+        message, message_class = self._receive_message(_data_type)
 
-        # receive and possibly decompress message body
-        message = self._receive_n_bytes_from_socket(message_length)
-        if is_message_compressed:
-            try:
-                message = gzip.decompress(message)
-            except (OSError, EOFError, zlib.error) as e:
-                raise MsgESS.MsgESSException("Failed to decompress the received message's body!", e)
-            gc.collect()
-
-        # receive and check message footer
-        footer = self._receive_n_bytes_from_socket(9)
-        if footer != b"MsgESSend":
-            raise MsgESS.MsgESSException("The received message has an invalid magic footer string!")
-
-        return message, message_class
+        return bytes(message), message_class
 
     def send_string(self, string: str, message_class: int, _data_type: int = _MessageDataType.STRING) -> None:
         """Send a message with an UTF-8 string in its body to the socket.
@@ -209,15 +170,7 @@ class MsgESS:
         :raises: MsgESS.MsgESSException: If any error is encountered during the sending process.
         """
 
-        if not isinstance(string, str):
-            raise MsgESS.MsgESSException("The data sent must be of the 'str' type!")
-
-        try:
-            message = string.encode("utf-8")
-        except UnicodeEncodeError as e:
-            raise MsgESS.MsgESSException("The sent message's body has an invalid UTF-8 character in it!", e)
-
-        self.send_binary_data(message, message_class, _data_type=_data_type)
+        self.send_binary_data(self._encode_string(string), message_class, _data_type=_data_type)
 
     def receive_string(self, _data_type: int = _MessageDataType.STRING) -> Tuple[str, int]:
         """Receive a message with an UTF-8 string in its body from the socket. Blocks until a full message is received.
@@ -227,12 +180,10 @@ class MsgESS:
         :raises: MsgESS.MsgESSException: If any error is encountered during the receiving process.
         """
 
-        message, message_class = self.receive_binary_data(_data_type=_data_type)
+        # the string is decoded right from the receive buffer
+        message, message_class = self._receive_message(_data_type)
 
-        try:
-            return message.decode("utf-8"), message_class
-        except UnicodeDecodeError as e:
-            raise MsgESS.MsgESSException("The received message's body has an invalid UTF-8 character in it!", e)
+        return self._decode_string(message), message_class
 
     def send_json_array(self, json_array: list, message_class: int) -> None:
         """Send a message with a serialized JSON array in its body to the socket.
@@ -242,13 +193,7 @@ class MsgESS:
         :raises: MsgESS.MsgESSException: If any error is encountered during the sending process.
         """
 
-        if not isinstance(json_array, list):
-            raise MsgESS.MsgESSException("The data sent must be of the 'list' type!")
-
-        try:
-            message = json.dumps(json_array)
-        except TypeError as e:
-            raise MsgESS.MsgESSException("Failed to serialize the supplied list to JSON array!", e)
+        message = self._serialize_json_array(json_array)
 
         self.send_string(message, message_class, _data_type=self._MessageDataType.JSON_ARRAY)
 
@@ -262,15 +207,7 @@ class MsgESS:
 
         message, message_class = self.receive_string(_data_type=self._MessageDataType.JSON_ARRAY)
 
-        try:
-            deserialized_json = json.loads(message)
-        except json.JSONDecodeError as e:
-            raise MsgESS.MsgESSException("Failed to decode the received JSON array!", e)
-
-        if not isinstance(deserialized_json, list):
-            raise MsgESS.MsgESSException("The received message doesn't contain a JSON array!")
-
-        return deserialized_json, message_class
+        return self._deserialize_json_array(message), message_class
 
     def send_json_object(self, json_object: dict, message_class: int) -> None:
         """Send a message with a serialized JSON object in its body to the socket.
@@ -280,13 +217,7 @@ class MsgESS:
         :raises: MsgESS.MsgESSException: If any error is encountered during the sending process.
         """
 
-        if not isinstance(json_object, dict):
-            raise MsgESS.MsgESSException("The data sent must be of the 'dict' type!")
-
-        try:
-            message = json.dumps(json_object)
-        except TypeError as e:
-            raise MsgESS.MsgESSException("Failed to serialize the supplied list to JSON array!", e)
+        message = self._serialize_json_object(json_object)
 
         self.send_string(message, message_class, _data_type=self._MessageDataType.JSON_OBJECT)
 
@@ -300,33 +231,200 @@ class MsgESS:
 
         message, message_class = self.receive_string(_data_type=self._MessageDataType.JSON_OBJECT)
 
-        try:
-            deserialized_json = json.loads(message)
-        except json.JSONDecodeError as e:
-            raise MsgESS.MsgESSException("Failed to decode the received JSON object!", e)
+        return self._deserialize_json_object(message), message_class
+
+    def _send_message_parts(self, message_parts: Tuple[bytes, ...]) -> None:
+        # The stream-socket-like objects are required to implement only the sendall() method. The subclasses of
+        #  socket.socket might not support sendmsg() either (e.g. ssl.SSLSocket raises NotImplementedError), so only
+        #  the plain sockets are sent to using scatter-gather I/O.
+        if type(self._socket) is not socket.socket:
+            self._socket.sendall(b"".join(message_parts))
+            return
+
+        # The parts are sent using scatter-gather I/O, so the message body is never copied; sendmsg() might send only
+        #  a part of the data, so the sent data are skipped and the rest is sent again.
+        buffers = [memoryview(message_part) for message_part in message_parts if message_part]
+        while buffers:
+            bytes_sent = self._socket.sendmsg(buffers)
+
+            while bytes_sent > 0:
+                if bytes_sent >= buffers[0].nbytes:
+                    bytes_sent -= buffers[0].nbytes
+                    del buffers[0]
+                else:
+                    buffers[0] = buffers[0][bytes_sent:]
+                    bytes_sent = 0
+
+    def _receive_message(self, data_type: int) -> Tuple[Union[bytes, memoryview], int]:
+        # receive, parse and check message header (see self._HEADER_STRUCT for header items and their lengths)
+        header = self._receive_n_bytes_from_socket(self._HEADER_STRUCT.size)
+        message_length, message_class, is_message_compressed = self._parse_message_header(header, data_type, self._max_message_size)
+        self._last_message_arrival_time = time.perf_counter()
+
+        # receive the message body together with the footer, check the footer and possibly decompress the body
+        body_and_footer = self._receive_n_bytes_from_socket(message_length + len(self._FOOTER_MAGIC))
+        message = self._split_message_body(body_and_footer, message_length)
+        message = self._unpack_message_body(message, is_message_compressed)
 
-        if not isinstance(deserialized_json, dict):
-            raise MsgESS.MsgESSException("The received message doesn't contain a JSON object!")
+        return message, message_class
 
-        return deserialized_json, message_class
+    def _receive_n_bytes_from_socket(self, n: int) -> bytearray:
+        # The data are received right into the buffer, so they are not copied around, no matter how many recv() calls
+        #  it takes to receive them. The buffer isn't allocated for the whole announced length up front, so that a peer
+        #  announcing large messages without sending them can't make the receiver allocate the memory for them; instead,
+        #  it is doubled (up to n) whenever it's full, so the received data are copied only a few times on average.
+        buffer = bytearray(min(n, self._INITIAL_RECEIVE_BUFFER_SIZE))
+        bytes_received = 0
 
-    def _receive_n_bytes_from_socket(self, n: int) -> bytes:
-        bytes_left = n
-        data = bytes()
+        while bytes_received < n:
+            if bytes_received == len(buffer):
+                buffer.extend(bytes(min(len(buffer), n - len(buffer))))
 
-        while bytes_left > 0:
+            # The buffer can't be resized while a memoryview of it exists, so a new one is created for each recv() call.
+            buffer_view = memoryview(buffer)[bytes_received:]
             try:
-                current_data = self._socket.recv(min(16384, bytes_left))
+                current_length = self._receive_into(buffer_view)
             except OSError as e:
                 raise MsgESS.MsgESSException("Failed to receive data from the socket!", e)
+            finally:
+                buffer_view.release()
 
-            if not current_data:
+            if current_length == 0:
                 raise MsgESS.MsgESSException("The recv() call has succeeded, but no data were received - the connection is probably dead.")
 
-            data += current_data
-            bytes_left -= len(current_data)
+            bytes_received += current_length
+
+        return buffer
+
+    def _receive_into(self, buffer_view: memoryview) -> int:
+        # The stream-socket-like objects are required to implement only the recv() method.
+        if hasattr(self._socket, "recv_into"):
+            return self._socket.recv_into(buffer_view)
+
+        current_data = self._socket.recv(len(buffer_view))
+        buffer_view[:len(current_data)] = current_data
+
+        return len(current_data)
+
+    # The following methods implement the parts of the protocol which don't depend on how the data are transferred,
+    #  so they are shared with the AsyncMsgESS class.
 
-        if n != len(data):
-            raise RuntimeError("The OS has received a different number of bytes than it was requested!")
+    # Returns the message's header, body and footer.
+    @staticmethod
+    def _assemble_message_parts(binary_data: bytes, message_class: int, data_type: int, compress_message: bool) -> Tuple[bytes, bytes, bytes]:
+        if not isinstance(binary_data, bytes):
+            raise MsgESS.MsgESSException("The data sent must be of the 'bytes' type!")
+
+        # compress message, if requested
+        if compress_message:
+            binary_data = gzip.compress(binary_data)
+
+        # assemble message (see MsgESS._HEADER_STRUCT for header items and their lengths); the body is not copied
+        header = MsgESS._HEADER_STRUCT.pack(MsgESS._HEADER_MAGIC, MsgESS.PROTOCOL_VERSION, len(binary_data), message_class, compress_message, data_type)
+
+        return header, binary_data, MsgESS._FOOTER_MAGIC
+
+    @staticmethod
+    def _parse_message_header(header: Union[bytes, bytearray], data_type: int, max_message_size: int) -> Tuple[int, int, bool]:
+        magic, protocol_version, message_length, message_class, is_message_compressed, message_data_type = MsgESS._HEADER_STRUCT.unpack_from(header)
+
+        if magic != MsgESS._HEADER_MAGIC:
+            raise MsgESS.MsgESSException("The received message has an invalid magic header string!")
+
+        if protocol_version != MsgESS.PROTOCOL_VERSION:
+            raise MsgESS.MsgESSException("The remote host uses an incompatible protocol version!")
+
+        if message_length < 0:
+            raise MsgESS.MsgESSException("The received message's length is invalid!")
+        if message_length > max_message_size:
+            raise MsgESS.MsgESSException("The received message is too big!")
+
+        if message_class < 0:
+            raise MsgESS.MsgESSException("The received message's class is invalid!")
+
+        # check the data type
+        if message_data_type != data_type:
+            raise MsgESS.MsgESSException("The received message has an invalid data type!")
+
+        return message_length, message_class, bool(is_message_compressed)
+
+    # Checks the footer at the end of the buffer and returns a view of the message body which precedes it.
+    @staticmethod
+    def _split_message_body(body_and_footer: Union[bytes, bytearray], message_length: int) -> memoryview:
+        body_and_footer_view = memoryview(body_and_footer)
+
+        if body_and_footer_view[message_length:] != MsgESS._FOOTER_MAGIC:
+            raise MsgESS.MsgESSException("The received message has an invalid magic footer string!")
+
+        return body_and_footer_view[:message_length]
+
+    @staticmethod
+    def _unpack_message_body(message: memoryview, is_message_compressed: bool) -> Union[bytes, memoryview]:
+        if is_message_compressed:
+            try:
+                return gzip.decompress(message)
+            except (OSError, EOFError, zlib.error) as e:
+                raise MsgESS.MsgESSException("Failed to decompress the received message's body!", e)
+
+        return message
+
+    @staticmethod
+    def _encode_string(string: str) -> bytes:
+        if not isinstance(string, str):
+            raise MsgESS.MsgESSException("The data sent must be of the 'str' type!")
+
+        try:
+            return string.encode("utf-8")
+        except UnicodeEncodeError as e:
+            raise MsgESS.MsgESSException("The sent message's body has an invalid UTF-8 character in it!", e)
+
+    @staticmethod
+    def _decode_string(message: Union[bytes, memoryview]) -> str:
+        try:
+            return str(message, "utf-8")
+        except UnicodeDecodeError as e:
+            raise MsgESS.MsgESSException("The received message's body has an invalid UTF-8 character in it!", e)
+
+    @staticmethod
+    def _serialize_json_array(json_array: list) -> str:
+        if not isinstance(json_array, list):
+            raise MsgESS.MsgESSException("The data sent must be of the 'list' type!")
+
+        try:
+            return json.dumps(json_array)
+        except TypeError as e:
+            raise MsgESS.MsgESSException("Failed to serialize the supplied list to JSON array!", e)
+
+    @staticmethod
+    def _deserialize_json_array(message: str) -> list:
+        try:
+            deserialized_json = json.loads(message)
+        except json.JSONDecodeError as e:
+            raise MsgESS.MsgESSException("Failed to decode the received JSON array!", e)
+
+        if not isinstance(deserialized_json, list):
+            raise MsgESS.MsgESSException("The received message doesn't contain a JSON array!")
+
+        return deserialized_json
+
+    @staticmethod
+    def _serialize_json_object(json_object: dict) -> str:
+        if not isinstance(json_object, dict):
+            raise MsgESS.MsgESSException("The data sent must be of the 'dict' type!")
+
+        try:
+            return json.dumps(json_object)
+        except TypeError as e:
+            raise MsgESS.MsgESSException("Failed to serialize the supplied list to JSON array!", e)
+
+    @staticmethod
+    def _deserialize_json_object(message: str) -> dict:
+        try:
+            deserialized_json = json.loads(message)
+        except json.JSONDecodeError as e:
+            raise MsgESS.MsgESSException("Failed to decode the received JSON object!", e)
+
+        if not isinstance(deserialized_json, dict):
+            raise MsgESS.MsgESSException("The received message doesn't contain a JSON object!")
 
-        return data
+        return deserialized_json
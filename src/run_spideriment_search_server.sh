@@ -35,5 +35,6 @@ cd -- "$(dirname -- "$0")" || exit_with_error "Failed to traverse into the scrip
 
 # The program only requires the Python standard library to run, so there is no need for Python virtual environment
 
-# Run the program
-/usr/bin/env python3 ./SpiderimentSearchServer.py
+# Run the program; the arguments (e.g. "--settings <file>", see Settings.py) are passed to it, so relative paths in them
+#  are relative to this script's directory
+/usr/bin/env python3 ./SpiderimentSearchServer.py "$@"
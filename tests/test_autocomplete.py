@@ -0,0 +1,140 @@
+# SPDX-License-Identifier: BSD-3-Clause
+#
+# Copyright (c) 2021 Vít Labuda. All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without modification, are permitted provided that the
+# following conditions are met:
+#  1. Redistributions of source code must retain the above copyright notice, this list of conditions and the following
+#     disclaimer.
+#  2. Redistributions in binary form must reproduce the above copyright notice, this list of conditions and the
+#     following disclaimer in the documentation and/or other materials provided with the distribution.
+#  3. Neither the name of the copyright holder nor the names of its contributors may be used to endorse or promote
+#     products derived from this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES,
+# INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+# SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+# SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY,
+# WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+
+import logging
+import random
+import pytest
+from Settings import Settings
+from WebIndexItem import WebIndexItem
+from AutocompleteIndex import AutocompleteIndex
+from AutocompleteRequest import AutocompleteRequest
+from AutocompleteResponse import AutocompleteResponse
+from CoordinatorMessageHandler import CoordinatorMessageHandler
+from SearchWorkerPool import SearchWorkerPool
+from ServerStatistics import ServerStatistics
+from CloseConnectionException import CloseConnectionException
+
+
+_WORDS = ("the", "then", "python", "py", "spider", "search", "server", "a")
+
+
+def _make_item(title, headings):
+    return WebIndexItem.from_parsed_json({
+        "final_url": "https://example.com/",
+        "title": title,
+        "headings": headings,
+        "description": "",
+        "keywords": "",
+        "author": "",
+        "content_snippet": "",
+        "content_snippet_quality": 1.0,
+        "image_alts": "",
+        "link_texts": ""
+    })
+
+
+def _make_random_items(count):
+    generator = random.Random(1)
+
+    def make_text():
+        return " ".join(generator.choice(_WORDS) for _ in range(generator.randint(1, 3)))
+
+    return [_make_item(make_text(), {"h{}".format(generator.randint(1, 6)): [make_text() for _ in range(generator.randint(0, 2))]}) for _ in range(count)]
+
+
+def _get_expected_completions(web_index_items, canonical_prefix, max_completions):
+    phrase_weights = {}
+    for web_index_item in web_index_items:
+        phrase_weights[web_index_item.title_lc] = phrase_weights.get(web_index_item.title_lc, 0.0) + Settings.SCORE_TITLE
+        for heading_level, heading_text_lc in web_index_item.get_headings_lc():
+            phrase_weights[heading_text_lc] = phrase_weights.get(heading_text_lc, 0.0) + Settings.SCORE_HEADING / heading_level
+
+    completions = sorted(((phrase, weight) for phrase, weight in phrase_weights.items() if phrase.startswith(canonical_prefix)), key=lambda completion: (-completion[1], completion[0]))
+
+    return completions[:max_completions]
+
+
+@pytest.fixture(autouse=True)
+def settings(monkeypatch):
+    monkeypatch.setattr(Settings, "USE_AUTOCOMPLETE_INDEX", True)
+
+
+@pytest.mark.parametrize("max_completions", [1, 3, 5])
+def test_completions_are_the_heaviest_phrases_with_the_prefix(max_completions):
+    web_index_items = _make_random_items(300)
+    autocomplete_index = AutocompleteIndex(web_index_items, 5, 100)
+
+    prefixes = {phrase[:length] for web_index_item in web_index_items for phrase in (web_index_item.title_lc, *web_index_item.headings_lc) for length in range(1, len(phrase) + 1)}
+    for prefix in sorted(prefixes):
+        assert autocomplete_index.get_completions(prefix, max_completions) == _get_expected_completions(web_index_items, prefix, max_completions), prefix
+
+
+def test_phrases_are_canonicalized_and_long_ones_are_skipped():
+    autocomplete_index = AutocompleteIndex([_make_item("  Python \t Search ", {}), _make_item("python search server", {})], 10, 15)
+
+    assert autocomplete_index.get_completions("python", 10) == [("python search", Settings.SCORE_TITLE)]
+
+
+def test_empty_prefix_has_no_completions():
+    assert AutocompleteIndex(_make_random_items(10), 5, 100).get_completions("", 5) == []
+
+
+def test_request_prefix_is_canonicalized_and_max_completions_is_capped(monkeypatch):
+    monkeypatch.setattr(Settings, "AUTOCOMPLETE_MAX_COMPLETIONS", 10)
+
+    request = AutocompleteRequest({"prefix": "  The \t ", "max_completions": 50})
+
+    assert request.canonical_prefix == "the "
+    assert request.max_completions == 10
+
+
+@pytest.mark.parametrize("max_completions", [True, 0, -1, 1.0, None])
+def test_invalid_max_completions_are_refused(max_completions):
+    with pytest.raises(CloseConnectionException):
+        AutocompleteRequest({"prefix": "the", "max_completions": max_completions})
+
+
+def test_coordinator_sums_the_weights_of_the_backends_and_warns_about_capped_backends(monkeypatch, caplog):
+    monkeypatch.setattr(Settings, "USE_AUTOCOMPLETE_INDEX", False)
+    monkeypatch.setattr(Settings, "COORDINATOR_BACKEND_SOCKET_PATHS", ("backend0.sock", "backend1.sock"))
+    monkeypatch.setattr(Settings, "COORDINATOR_AUTOCOMPLETE_BACKEND_COMPLETIONS", 100)
+
+    backend_responses = [
+        AutocompleteResponse([("python", 3.0), ("py", 2.0)], 100).to_json_object(),
+        AutocompleteResponse([("py", 2.0), ("pypi", 1.0)], 10).to_json_object()
+    ]
+    coordinator = CoordinatorMessageHandler(logging.getLogger("test"), SearchWorkerPool(1, 10, None), ServerStatistics())
+    coordinator._scatter = lambda json_object, message_class, expected_response_message_class: backend_responses
+
+    for _ in range(2):
+        response = coordinator.handle_message({"prefix": "Py", "max_completions": 2}, AutocompleteRequest.MESSAGE_CLASS).to_json_object()
+        assert response["completions"] == [{"text": "py", "weight": 4.0}, {"text": "python", "weight": 3.0}]
+
+    assert [record.getMessage().startswith("The backend #1 ") for record in caplog.records if record.levelno == logging.WARNING] == [True]
+
+
+def test_coordinator_refuses_autocomplete_if_it_is_disabled(monkeypatch):
+    monkeypatch.setattr(Settings, "COORDINATOR_BACKEND_SOCKET_PATHS", ("backend0.sock",))
+    monkeypatch.setattr(Settings, "COORDINATOR_AUTOCOMPLETE_BACKEND_COMPLETIONS", 0)
+
+    with pytest.raises(CloseConnectionException):
+        AutocompleteRequest({"prefix": "the", "max_completions": 5})
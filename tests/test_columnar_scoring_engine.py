@@ -0,0 +1,83 @@
+# SPDX-License-Identifier: BSD-3-Clause
+#
+# Copyright (c) 2021 Vít Labuda. All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without modification, are permitted provided that the
+# following conditions are met:
+#  1. Redistributions of source code must retain the above copyright notice, this list of conditions and the following
+#     disclaimer.
+#  2. Redistributions in binary form must reproduce the above copyright notice, this list of conditions and the
+#     following disclaimer in the documentation and/or other materials provided with the distribution.
+#  3. Neither the name of the copyright holder nor the names of its contributors may be used to endorse or promote
+#     products derived from this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES,
+# INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+# SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+# SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY,
+# WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+
+import sys
+import importlib
+import array
+import pytest
+from WebIndexItem import WebIndexItem
+from SpiderimentSearchServerRuntimeError import SpiderimentSearchServerRuntimeError
+
+
+def _import_without_numpy(monkeypatch, module_name):
+    # A None entry in sys.modules makes the import statement raise ImportError.
+    monkeypatch.setitem(sys.modules, "numpy", None)
+    for name in (module_name, "ColumnarScoringEngine", "WebIndex"):
+        monkeypatch.delitem(sys.modules, name, raising=False)
+
+    return importlib.import_module(module_name)
+
+
+def test_module_is_importable_without_numpy(monkeypatch):
+    module = _import_without_numpy(monkeypatch, "ColumnarScoringEngine")
+
+    assert module.numpy is None
+
+
+def test_web_index_is_importable_without_numpy(monkeypatch):
+    module = _import_without_numpy(monkeypatch, "WebIndex")
+
+    assert module.WebIndex is not None
+
+
+def test_engine_refuses_to_be_created_without_numpy(monkeypatch):
+    module = _import_without_numpy(monkeypatch, "ColumnarScoringEngine")
+    items = [WebIndexItem("https://example.com/", "Example", array.array("B"), (), "", "", "", "", 0.0, "", "")]
+
+    with pytest.raises(SpiderimentSearchServerRuntimeError):
+        module.ColumnarScoringEngine(items, None)
+
+
+def test_engine_uses_the_score_coefficients_overridden_after_import(monkeypatch):
+    pytest.importorskip("numpy")
+    # The modules might have been imported without NumPy by the tests above.
+    for name in ("ColumnarScoringEngine", "WebIndex", "SearchPerformer"):
+        monkeypatch.delitem(sys.modules, name, raising=False)
+    from WebIndex import WebIndex
+    from ClientRequest import ClientRequest
+    from SearchPerformer import SearchPerformer
+    from Settings import Settings
+
+    monkeypatch.setattr(Settings, "SEARCH_DEFAULT_DEADLINE", None)
+    monkeypatch.setattr(Settings, "SCORE_TITLE", 1)
+    monkeypatch.setattr(Settings, "SCORE_URL", 3)
+    items = [WebIndexItem("https://example.com/{}/".format(index), "python " * index, array.array("B"), (), "python", "", "", "", 0.5, "", "") for index in range(5)]
+    request_object = {"search_query": "python", "max_results": 10, "use_quotient_based_scoring": False}
+
+    scores = {}
+    for use_columnar_scoring_engine in (False, True):
+        monkeypatch.setattr(Settings, "USE_COLUMNAR_SCORING_ENGINE", use_columnar_scoring_engine)
+        search_results = SearchPerformer(WebIndex(items), ClientRequest(request_object)).perform_search()
+        scores[use_columnar_scoring_engine] = [(search_result.url, search_result.score) for search_result in search_results]
+
+    assert scores[True] == scores[False]
+    assert scores[True][0][1] == 4 * Settings.SCORE_TITLE + Settings.SCORE_DESCRIPTION
@@ -0,0 +1,117 @@
+# SPDX-License-Identifier: BSD-3-Clause
+#
+# Copyright (c) 2021 Vít Labuda. All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without modification, are permitted provided that the
+# following conditions are met:
+#  1. Redistributions of source code must retain the above copyright notice, this list of conditions and the following
+#     disclaimer.
+#  2. Redistributions in binary form must reproduce the above copyright notice, this list of conditions and the
+#     following disclaimer in the documentation and/or other materials provided with the distribution.
+#  3. Neither the name of the copyright holder nor the names of its contributors may be used to endorse or promote
+#     products derived from this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES,
+# INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+# SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+# SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY,
+# WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+
+import logging
+import pytest
+from Settings import Settings
+from WebIndex import WebIndex
+from WebIndexItem import WebIndexItem
+from CoordinatorMessageHandler import CoordinatorMessageHandler
+from ClientRequest import ClientRequest
+from ClientResponse import ClientResponse
+from BatchRequest import BatchRequest
+from BatchResponse import BatchResponse
+from SearchPerformer import SearchPerformer
+from SearchWorkerPool import SearchWorkerPool
+from ServerStatistics import ServerStatistics
+
+
+_BACKEND_COUNT = 3
+
+
+def _make_item(document_id):
+    # Many of the documents share their scores, so the merged results have to keep the ties ordered by the document IDs.
+    return WebIndexItem.from_parsed_json({
+        "final_url": "https://example.com/{}/".format(document_id),
+        "title": "python " * (document_id % 3),
+        "headings": {},
+        "description": ("python" if document_id % 5 == 0 else ""),
+        "keywords": "",
+        "author": "",
+        "content_snippet": "page {}".format(document_id),
+        "content_snippet_quality": 1.0,
+        "image_alts": "",
+        "link_texts": ""
+    })
+
+
+def _search(web_index, request_object):
+    return ClientResponse(SearchPerformer(web_index, ClientRequest(request_object)).perform_search()).to_json_object()
+
+
+@pytest.fixture
+def web_index_items(monkeypatch):
+    monkeypatch.setattr(Settings, "SEARCH_DEFAULT_DEADLINE", None)
+    monkeypatch.setattr(Settings, "COORDINATOR_BACKEND_SOCKET_PATHS", tuple("backend{}.sock".format(backend_index) for backend_index in range(_BACKEND_COUNT)))
+
+    return [_make_item(document_id) for document_id in range(60)]
+
+
+# The backends search the partitions of the web index in the process, like the servers would do (see
+#  WebIndexPartitioner); the backends whose indices are passed as unavailable don't respond.
+def _make_coordinator(web_index_items, unavailable_backend_indices=()):
+    partitions = [WebIndex(web_index_items[backend_index::_BACKEND_COUNT]) for backend_index in range(_BACKEND_COUNT)]
+
+    def scatter(json_object, message_class, expected_response_message_class):
+        if message_class == BatchRequest.MESSAGE_CLASS:
+            responses = [BatchResponse([SearchPerformer(partition, ClientRequest(search_object)).perform_search() for search_object in json_object["searches"]], [1.0] * len(json_object["searches"])).to_json_object() for partition in partitions]
+        else:
+            responses = [_search(partition, json_object) for partition in partitions]
+
+        return [(response if backend_index not in unavailable_backend_indices else None) for backend_index, response in enumerate(responses)]
+
+    coordinator = CoordinatorMessageHandler(logging.getLogger("test"), SearchWorkerPool(1, 10, None), ServerStatistics())
+    coordinator._scatter = scatter
+
+    return coordinator
+
+
+@pytest.mark.parametrize("use_quotient_based_scoring", [False, True])
+@pytest.mark.parametrize("offset, max_results", [(0, 100), (0, 7), (5, 7), (19, 3)])
+def test_merged_results_are_ordered_like_a_single_server(web_index_items, use_quotient_based_scoring, offset, max_results):
+    request_object = {"search_query": "python", "max_results": max_results, "use_quotient_based_scoring": use_quotient_based_scoring, "offset": offset, "include_document_ids": True}
+
+    response = _make_coordinator(web_index_items).handle_message(request_object, ClientRequest.MESSAGE_CLASS).to_json_object()
+
+    expected_search_results = _search(WebIndex(web_index_items), dict(request_object, offset=0, max_results=offset + max_results))["search_results"][offset:]
+    assert response["search_results"] == expected_search_results
+    assert response["scanned_fraction"] == 1.0
+
+
+def test_merged_batch_results_are_ordered_like_a_single_server(web_index_items):
+    search_objects = [{"search_query": search_query, "max_results": 10, "use_quotient_based_scoring": False, "offset": 2} for search_query in ("python", "page 1")]
+
+    response = _make_coordinator(web_index_items).handle_message({"searches": search_objects}, BatchRequest.MESSAGE_CLASS).to_json_object()
+
+    web_index = WebIndex(web_index_items)
+    assert response["search_results"] == [_search(web_index, dict(search_object, offset=0, max_results=12))["search_results"][2:] for search_object in search_objects]
+
+
+def test_unavailable_backend_makes_the_results_partial(web_index_items):
+    request_object = {"search_query": "python", "max_results": 100, "use_quotient_based_scoring": False, "include_document_ids": True}
+
+    response = _make_coordinator(web_index_items, unavailable_backend_indices=(1,)).handle_message(request_object, ClientRequest.MESSAGE_CLASS).to_json_object()
+
+    expected_search_results = [search_result for search_result in _search(WebIndex(web_index_items), request_object)["search_results"] if search_result["document_id"] % _BACKEND_COUNT != 1]
+    assert response["search_results"] == expected_search_results
+    assert response["is_partial"]
+    assert response["scanned_fraction"] == pytest.approx(2 / 3)
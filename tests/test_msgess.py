@@ -0,0 +1,149 @@
+# SPDX-License-Identifier: BSD-3-Clause
+#
+# Copyright (c) 2021 Vít Labuda. All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without modification, are permitted provided that the
+# following conditions are met:
+#  1. Redistributions of source code must retain the above copyright notice, this list of conditions and the following
+#     disclaimer.
+#  2. Redistributions in binary form must reproduce the above copyright notice, this list of conditions and the
+#     following disclaimer in the documentation and/or other materials provided with the distribution.
+#  3. Neither the name of the copyright holder nor the names of its contributors may be used to endorse or promote
+#     products derived from this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES,
+# INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+# SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+# SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY,
+# WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+
+import os
+import socket
+import asyncio
+import threading
+import pytest
+from msgess.msgess import MsgESS
+from msgess.asyncmsgess import AsyncMsgESS
+
+
+# Returns the sent data in small pieces, like a socket receiving them in many TCP segments.
+class _ChunkedStream(MsgESS.StreamSocketLikeObject):
+    def __init__(self, chunk_size):
+        self.data = bytearray()
+        self._chunk_size = chunk_size
+
+    def recv(self, n):
+        chunk = bytes(self.data[:min(n, self._chunk_size)])
+        del self.data[:len(chunk)]
+
+        return chunk
+
+    def sendall(self, data):
+        self.data += data
+
+
+@pytest.mark.parametrize("compress_messages", [False, True])
+@pytest.mark.parametrize("size", [0, 1, MsgESS._INITIAL_RECEIVE_BUFFER_SIZE - 1, MsgESS._INITIAL_RECEIVE_BUFFER_SIZE, MsgESS._INITIAL_RECEIVE_BUFFER_SIZE + 1, 5 * MsgESS._INITIAL_RECEIVE_BUFFER_SIZE + 3])
+def test_messages_are_reassembled_from_small_pieces(compress_messages, size):
+    msgess = MsgESS(_ChunkedStream(4093))
+    msgess.set_compress_messages(compress_messages)
+    binary_data = os.urandom(size)
+
+    msgess.send_binary_data(binary_data, 7)
+
+    assert msgess.receive_binary_data() == (binary_data, 7)
+    assert not msgess.get_socket().data
+
+
+def test_consecutive_messages_keep_their_boundaries_and_classes():
+    msgess = MsgESS(_ChunkedStream(3))
+    msgess.send_json_object({"search_query": "python"}, 1)
+    msgess.send_string("ü" * 1000, 2)
+    msgess.send_json_array([1, 2, 3], 3)
+
+    assert msgess.receive_json_object() == ({"search_query": "python"}, 1)
+    assert msgess.receive_string() == ("ü" * 1000, 2)
+    assert msgess.receive_json_array() == ([1, 2, 3], 3)
+
+
+def test_message_of_another_data_type_is_refused():
+    msgess = MsgESS(_ChunkedStream(1000))
+    msgess.send_string("[]", 1)
+
+    with pytest.raises(MsgESS.MsgESSException):
+        msgess.receive_json_array()
+
+
+def test_message_exceeding_the_maximum_size_is_refused():
+    msgess = MsgESS(_ChunkedStream(1000))
+    msgess.set_compress_messages(False)
+    msgess.set_max_message_size(100)
+    msgess.send_binary_data(bytes(101), 1)
+
+    with pytest.raises(MsgESS.MsgESSException):
+        msgess.receive_binary_data()
+
+
+def test_message_cut_off_by_closed_connection_is_refused():
+    stream = _ChunkedStream(1000)
+    msgess = MsgESS(stream)
+    msgess.set_compress_messages(False)
+    msgess.send_binary_data(bytes(MsgESS._INITIAL_RECEIVE_BUFFER_SIZE * 3), 1)
+    del stream.data[-(MsgESS._INITIAL_RECEIVE_BUFFER_SIZE * 2):]
+
+    with pytest.raises(MsgESS.MsgESSException):
+        msgess.receive_binary_data()
+
+
+def test_large_message_through_a_socket():
+    sending_socket, receiving_socket = socket.socketpair()
+    json_object = {"search_results": [{"url": "https://example.com/{}/".format(index), "score": index} for index in range(50000)]}
+
+    with sending_socket, receiving_socket:
+        # The message is larger than the socket's buffer, so it has to be received while it is being sent.
+        sending_thread = threading.Thread(target=MsgESS(sending_socket).send_json_object, args=(json_object, 2))
+        sending_thread.start()
+        received_message = MsgESS(receiving_socket).receive_json_object()
+        sending_thread.join()
+
+    assert received_message == (json_object, 2)
+
+
+def test_messages_sent_by_the_blocking_implementation_are_received_by_the_asynchronous_one():
+    async def receive_messages(receiving_socket):
+        reader, writer = await asyncio.open_connection(sock=receiving_socket)
+        async_msgess = AsyncMsgESS(reader, writer)
+        messages = [await async_msgess.receive_json_object(), await async_msgess.receive_binary_data()]
+        writer.close()
+
+        return messages
+
+    sending_socket, receiving_socket = socket.socketpair()
+    binary_data = os.urandom(3 * MsgESS._INITIAL_RECEIVE_BUFFER_SIZE)
+
+    with sending_socket:
+        sending_thread = threading.Thread(target=lambda: (MsgESS(sending_socket).send_json_object({"prefix": "py"}, 10), MsgESS(sending_socket).send_binary_data(binary_data, 11)))
+        sending_thread.start()
+        messages = asyncio.run(receive_messages(receiving_socket))
+        sending_thread.join()
+
+    assert messages == [({"prefix": "py"}, 10), (binary_data, 11)]
+
+
+# Like ssl.SSLSocket, which is a subclass of socket.socket, but doesn't support sendmsg().
+class _SocketWithoutSendmsg(socket.socket):
+    def sendmsg(self, *args, **kwargs):
+        raise NotImplementedError("sendmsg() is not supported by this socket!")
+
+
+def test_socket_subclass_without_sendmsg_is_sent_to():
+    sending_socket, receiving_socket = socket.socketpair()
+    sending_socket = _SocketWithoutSendmsg(fileno=sending_socket.detach())
+
+    with sending_socket, receiving_socket:
+        MsgESS(sending_socket).send_json_object({"search_query": "python"}, 1)
+
+        assert MsgESS(receiving_socket).receive_json_object() == ({"search_query": "python"}, 1)
@@ -0,0 +1,116 @@
+# SPDX-License-Identifier: BSD-3-Clause
+#
+# Copyright (c) 2021 Vít Labuda. All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without modification, are permitted provided that the
+# following conditions are met:
+#  1. Redistributions of source code must retain the above copyright notice, this list of conditions and the following
+#     disclaimer.
+#  2. Redistributions in binary form must reproduce the above copyright notice, this list of conditions and the
+#     following disclaimer in the documentation and/or other materials provided with the distribution.
+#  3. Neither the name of the copyright holder nor the names of its contributors may be used to endorse or promote
+#     products derived from this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES,
+# INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+# SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+# SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY,
+# WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+
+import logging
+import pytest
+from Settings import Settings
+from WebIndex import WebIndex
+from WebIndexItem import WebIndexItem
+from WebIndexManager import WebIndexManager
+from ClientMessageHandler import ClientMessageHandler
+from ClientRequest import ClientRequest
+from SearchWorkerPool import SearchWorkerPool
+from ServerStatistics import ServerStatistics
+from CloseConnectionException import CloseConnectionException
+
+
+def _make_item(document_id):
+    # Some of the documents share their scores, so the pages have to keep the ties ordered by the document IDs.
+    return WebIndexItem.from_parsed_json({
+        "final_url": "https://example.com/{}/".format(document_id),
+        "title": "python " * (document_id % 4),
+        "headings": {},
+        "description": "python",
+        "keywords": "",
+        "author": "",
+        "content_snippet": "page {}".format(document_id),
+        "content_snippet_quality": 1.0,
+        "image_alts": "",
+        "link_texts": ""
+    })
+
+
+@pytest.fixture
+def message_handler(monkeypatch):
+    monkeypatch.setattr(Settings, "SEARCH_DEFAULT_DEADLINE", None)
+    monkeypatch.setattr(Settings, "SEARCH_SHARD_COUNT", 0)
+    monkeypatch.setattr(Settings, "SEARCH_RESULT_CACHE_SIZE", 0)  # The pages are then always sliced from the cursors
+
+    web_index_manager = WebIndexManager(logging.getLogger("test"), WebIndex([_make_item(document_id) for document_id in range(50)]), None, 1, False, lambda function: function())
+    yield ClientMessageHandler(web_index_manager, SearchWorkerPool(1, 10, None), ServerStatistics())
+    web_index_manager.close()
+
+
+def _search(message_handler, **request_items):
+    request_object = {"search_query": "python", "max_results": 10, "use_quotient_based_scoring": False}
+    request_object.update(request_items)
+
+    return message_handler.handle_message(request_object, ClientRequest.MESSAGE_CLASS).to_json_object()
+
+
+def test_pages_of_a_cursor_match_the_whole_ranking(message_handler):
+    all_results = _search(message_handler, max_results=50)["search_results"]
+
+    paged_results, cursor = [], None
+    for offset in range(0, 50, 7):
+        response = _search(message_handler, max_results=7, offset=offset, use_cursor=True, cursor=cursor)
+        assert response["cursor"] is not None
+        assert (cursor is None) or (response["cursor"] == cursor)
+
+        paged_results += response["search_results"]
+        cursor = response["cursor"]
+
+    assert paged_results == all_results
+
+
+def test_pages_are_sliced_from_the_cursor(message_handler):
+    cursor = _search(message_handler, max_results=5, use_cursor=True)["cursor"]
+    _search(message_handler, max_results=5, offset=5, cursor=cursor)
+    _search(message_handler, max_results=5, offset=10, cursor=cursor)
+
+    counters = message_handler._web_index_manager.get_result_cursor_store().get_counters()
+    assert counters["created_cursors"] == 1
+    assert counters["hits"] == 2
+
+
+def test_invalid_cursor_falls_back_to_a_new_search(message_handler):
+    expected_results = _search(message_handler, max_results=5, offset=5)["search_results"]
+
+    response = _search(message_handler, max_results=5, offset=5, cursor="no-such-cursor")
+
+    assert response["search_results"] == expected_results
+    assert response["cursor"] not in (None, "no-such-cursor")
+
+
+def test_cursor_of_another_query_is_not_used(message_handler):
+    cursor = _search(message_handler, search_query="page 1", use_cursor=True)["cursor"]
+
+    response = _search(message_handler, max_results=5, cursor=cursor)
+
+    assert response["search_results"] == _search(message_handler, max_results=5)["search_results"]
+    assert response["cursor"] != cursor
+
+
+@pytest.mark.parametrize("offset", [True, -1, 1.5, Settings.SEARCH_MAX_OFFSET + 1])
+def test_invalid_offsets_are_refused(message_handler, offset):
+    with pytest.raises(CloseConnectionException):
+        _search(message_handler, offset=offset)
@@ -0,0 +1,86 @@
+# SPDX-License-Identifier: BSD-3-Clause
+#
+# Copyright (c) 2021 Vít Labuda. All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without modification, are permitted provided that the
+# following conditions are met:
+#  1. Redistributions of source code must retain the above copyright notice, this list of conditions and the following
+#     disclaimer.
+#  2. Redistributions in binary form must reproduce the above copyright notice, this list of conditions and the
+#     following disclaimer in the documentation and/or other materials provided with the distribution.
+#  3. Neither the name of the copyright holder nor the names of its contributors may be used to endorse or promote
+#     products derived from this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES,
+# INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+# SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+# SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY,
+# WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+
+import time
+import threading
+import pytest
+from SearchWorkerPool import SearchWorkerPool
+
+
+_MAX_QUEUE_DELAY = 0.05
+
+
+@pytest.fixture
+def blocked_pool():
+    # The only worker thread is kept busy until the event is set, so the submitted tasks stay queued.
+    unblock_event = threading.Event()
+    pool = SearchWorkerPool(1, 10, _MAX_QUEUE_DELAY)
+    pool.submit(unblock_event.wait)
+
+    yield pool, unblock_event
+    unblock_event.set()
+    pool.close()
+
+
+def test_task_is_rejected_when_submitted_if_the_oldest_queued_task_waits_for_too_long(blocked_pool):
+    pool, unblock_event = blocked_pool
+    queued_future = pool.submit(lambda: "queued")
+    time.sleep(_MAX_QUEUE_DELAY * 2)
+
+    rejected_future = pool.submit(lambda: "rejected")
+    assert rejected_future.done()
+    with pytest.raises(SearchWorkerPool.OverloadedException):
+        rejected_future.result()
+    assert pool.get_counters()["rejected_tasks"] == 1
+
+    # The task which has been queued already is shed once it is dequeued.
+    unblock_event.set()
+    with pytest.raises(SearchWorkerPool.OverloadedException):
+        queued_future.result(timeout=5)
+    assert pool.get_counters()["shed_tasks"] == 1
+
+
+def test_task_is_rejected_when_submitted_if_the_queue_is_full():
+    unblock_event = threading.Event()
+    pool = SearchWorkerPool(1, 1, None)
+    pool.submit(unblock_event.wait)
+    while pool.get_counters()["queued_tasks"] > 0:  # Wait until the worker thread takes the blocking task
+        time.sleep(0.001)
+
+    queued_future = pool.submit(lambda: "queued")
+    rejected_future = pool.submit(lambda: "rejected")
+    assert rejected_future.done()
+    with pytest.raises(SearchWorkerPool.OverloadedException):
+        rejected_future.result()
+
+    unblock_event.set()
+    assert queued_future.result(timeout=5) == "queued"
+    pool.close()
+
+
+def test_task_is_performed_if_the_queue_is_not_overloaded(blocked_pool):
+    pool, unblock_event = blocked_pool
+    future = pool.submit(lambda: "performed")
+    unblock_event.set()
+
+    assert future.result(timeout=5) == "performed"
+    assert pool.get_counters()["rejected_tasks"] == 0
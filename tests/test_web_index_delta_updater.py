@@ -0,0 +1,146 @@
+# SPDX-License-Identifier: BSD-3-Clause
+#
+# Copyright (c) 2021 Vít Labuda. All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without modification, are permitted provided that the
+# following conditions are met:
+#  1. Redistributions of source code must retain the above copyright notice, this list of conditions and the following
+#     disclaimer.
+#  2. Redistributions in binary form must reproduce the above copyright notice, this list of conditions and the
+#     following disclaimer in the documentation and/or other materials provided with the distribution.
+#  3. Neither the name of the copyright holder nor the names of its contributors may be used to endorse or promote
+#     products derived from this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES,
+# INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+# SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+# SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY,
+# WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+
+import csv
+import io
+import json
+import logging
+import pytest
+from Settings import Settings
+from WebIndex import WebIndex
+from WebIndexDeltaUpdater import WebIndexDeltaUpdater
+from WebIndexIngestionPipeline import WebIndexIngestionPipeline
+from SearchPerformer import SearchPerformer
+from ClientRequest import ClientRequest
+
+
+def _make_row(url, title):
+    row = io.StringIO()
+    csv.writer(row, lineterminator="\n").writerow([json.dumps({
+        "final_url": url,
+        "title": title,
+        "headings": {},
+        "description": "",
+        "keywords": "",
+        "author": "",
+        "content_snippet": "",
+        "content_snippet_quality": 1.0,
+        "image_alts": "",
+        "link_texts": ""
+    })])
+
+    return row.getvalue().encode("utf-8")
+
+
+def _parse_rows(*rows):
+    return WebIndexIngestionPipeline.parse_chunk(b"".join(rows))[0]
+
+
+def _search(web_index, search_query):
+    request = ClientRequest({"search_query": search_query, "max_results": 100, "use_quotient_based_scoring": False})
+
+    return [search_result.to_response_object()["url"] for search_result in SearchPerformer(web_index, request).perform_search()]
+
+
+@pytest.fixture(autouse=True)
+def settings(monkeypatch):
+    monkeypatch.setattr(Settings, "SEARCH_DEFAULT_DEADLINE", None)
+
+
+@pytest.fixture
+def delta_file_path(tmp_path):
+    return str(tmp_path / "delta.csv")
+
+
+def _append(file_path, *rows):
+    with open(file_path, "ab") as file:
+        file.write(b"".join(rows))
+
+
+def test_merge_replaces_documents_in_place_and_appends_new_ones(delta_file_path):
+    _append(delta_file_path, _make_row("https://a.example/", "a new"), b"not a valid row\n", _make_row("https://c.example/", "c"), _make_row("https://a.example/", "a newest"))
+    web_index_items = _parse_rows(_make_row("https://a.example/", "a"), _make_row("https://b.example/", "b"))
+
+    added_and_replaced = WebIndexDeltaUpdater(logging.getLogger("test"), delta_file_path).merge_into_items(web_index_items)
+
+    assert added_and_replaced == (1, 1)
+    assert [(web_index_item.url, web_index_item.title) for web_index_item in web_index_items] == [("https://a.example/", "a newest"), ("https://b.example/", "b"), ("https://c.example/", "c")]
+
+
+def test_update_removes_replaced_documents_and_adds_new_ones(delta_file_path):
+    web_index_items = _parse_rows(_make_row("https://a.example/", "old title"), _make_row("https://b.example/", "old title"))
+    delta_updater = WebIndexDeltaUpdater(logging.getLogger("test"), delta_file_path)
+    delta_updater.merge_into_items(web_index_items)
+    web_index = WebIndex(web_index_items)
+
+    _append(delta_file_path, _make_row("https://a.example/", "new title"), _make_row("https://c.example/", "new title"))
+    added_items, removed_document_ids = delta_updater.read_update(None)
+    web_index = web_index.create_updated_index(added_items, removed_document_ids)
+
+    assert removed_document_ids == {0}
+    assert web_index.get_live_document_count() == 3
+    assert _search(web_index, "old title") == ["https://b.example/"]
+    assert _search(web_index, "new title") == ["https://a.example/", "https://c.example/"]
+
+    # The replaced document got a new ID, which has to be removed by its next replacement.
+    _append(delta_file_path, _make_row("https://a.example/", "newest title"))
+    added_items, removed_document_ids = delta_updater.read_update(None)
+    web_index = web_index.create_updated_index(added_items, removed_document_ids)
+
+    assert removed_document_ids == {2}
+    assert _search(web_index, "title") == ["https://b.example/", "https://c.example/", "https://a.example/"]
+
+
+def test_incomplete_row_is_left_for_the_next_update(delta_file_path):
+    delta_updater = WebIndexDeltaUpdater(logging.getLogger("test"), delta_file_path)
+    delta_updater.merge_into_items([])
+
+    row = _make_row("https://a.example/", "a")
+    _append(delta_file_path, row[:10])
+    assert delta_updater.read_update(None) == ([], set())
+
+    _append(delta_file_path, row[10:])
+    added_items, _ = delta_updater.read_update(None)
+    assert [web_index_item.url for web_index_item in added_items] == ["https://a.example/"]
+
+
+def test_update_is_limited_to_max_rows(delta_file_path):
+    delta_updater = WebIndexDeltaUpdater(logging.getLogger("test"), delta_file_path)
+    delta_updater.merge_into_items([])
+    _append(delta_file_path, *(_make_row("https://{}.example/".format(index), "title") for index in range(5)))
+
+    assert len(delta_updater.read_update(3)[0]) == 3
+    assert len(delta_updater.read_update(3)[0]) == 2
+
+
+def test_replaced_file_is_read_from_the_beginning(delta_file_path):
+    delta_updater = WebIndexDeltaUpdater(logging.getLogger("test"), delta_file_path)
+    delta_updater.merge_into_items(_parse_rows(_make_row("https://a.example/", "a")))
+    _append(delta_file_path, _make_row("https://b.example/", "b"), _make_row("https://c.example/", "c"))
+    delta_updater.read_update(None)
+
+    with open(delta_file_path, "wb") as file:
+        file.write(_make_row("https://a.example/", "a again"))
+    added_items, removed_document_ids = delta_updater.read_update(None)
+
+    assert [web_index_item.title for web_index_item in added_items] == ["a again"]
+    assert removed_document_ids == {0}